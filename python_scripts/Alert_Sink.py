@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Append-only fraud alert sink with a per-merchant index.
+
+Fraud_Detection.py used to end with df.to_csv("fraud_alert.csv"), which
+rewrote every transaction with every engineered column on each run. The
+sink keeps two date-partitioned Parquet tables instead:
+
+    <root>/alerts/date=2024-03-01/part-00004.parquet   REVIEW/BLOCK rows, all columns
+    <root>/scores/date=2024-03-01/part-00004.parquet   every row, compact scores only
+    <root>/index/part-00004.parquet                    merchant -> (file, offset, rows)
+
+Each append() writes new part files and never rewrites old ones. Only rows
+above the (transaction_timestamp, transaction_id) watermark are taken, as in
+Incremental_Ingestion, so rerunning a batch adds nothing. Alert parts are
+sorted by (merchant_id, timestamp), which makes each merchant one
+contiguous run per file. The index stores that run's offset and length,
+plus its last timestamp. manifest.json lists every file and is replaced
+atomically after the data files are written.
+
+Lookups use the in-memory index and memory-mapped part files, which are
+opened once and cached:
+
+    merchant_alerts("m_...")       zero-copy slices of the merchant's runs
+    alerts_since(ts)               only files whose max timestamp >= ts
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from Incremental_Ingestion import rows_after_watermark
+
+
+ALERTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "results", "fraud_alerts")
+MANIFEST_FILE = "manifest.json"
+
+ALERT_ACTIONS = ("REVIEW", "BLOCK")
+
+SCORE_COLUMNS = {
+    "transaction_id": None,
+    "merchant_id": None,
+    "transaction_timestamp": None,
+    "anomaly_score": np.float32,
+    "fraud_risk_score": np.int16,
+    "fraud_action": "category",
+}
+
+
+class AlertSink:
+    """Date-partitioned alert/score parts under root, with a merchant offset index."""
+
+    def __init__(self, root=ALERTS_DIR):
+        self.root = root
+        path = os.path.join(root, MANIFEST_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"next_part": 0, "watermark": None, "files": []}
+        self._index = None
+        self._tables = {}
+
+    @property
+    def watermark(self):
+        watermark = self.manifest["watermark"]
+        return None if watermark is None else (pd.Timestamp(watermark[0]), watermark[1])
+
+    # ---------- WRITE ----------
+
+    def append(self, scored_df):
+        """
+        Append the rows of a scored frame that are above the watermark.
+
+        Needs transaction_id, merchant_id, transaction_timestamp and the score
+        columns; every other column is kept on the alert rows.
+        """
+        df = rows_after_watermark(scored_df, "transactions", self.watermark)
+        if not len(df):
+            return {"part": None, "scored": 0, "alerts": 0}
+
+        part = self.manifest["next_part"]
+        day = df["transaction_timestamp"].dt.strftime("%Y-%m-%d")
+        is_alert = df["fraud_action"].astype(str).isin(ALERT_ACTIONS).to_numpy()
+
+        files, index = [], []
+        for date, rows in df.groupby(day, sort=True).indices.items():
+            files.append(self._write(part, "scores", date, _compact_scores(df.iloc[rows])))
+
+            alerts = df.iloc[rows[is_alert[rows]]]
+            if len(alerts):
+                alerts = alerts.sort_values(["merchant_id", "transaction_timestamp", "transaction_id"], kind="stable")
+                entry = self._write(part, "alerts", date, alerts)
+                files.append(entry)
+                index.append(_merchant_runs(alerts, entry["path"]))
+
+        if index:
+            index = pd.concat(index, ignore_index=True)
+            path = os.path.join(self.root, "index", f"part-{part:05d}.parquet")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            index.to_parquet(path, index=False)
+            files.append({"path": os.path.relpath(path, self.root).replace(os.sep, "/"), "table": "index",
+                          "part": part, "rows": len(index)})
+            if self._index is not None:
+                self._add_to_index(index)
+
+        last = df.iloc[-1]
+        self.manifest["files"].extend(files)
+        self.manifest["watermark"] = [str(last["transaction_timestamp"]), str(last["transaction_id"])]
+        self.manifest["next_part"] = part + 1
+        self._save_manifest()
+        return {"part": part, "scored": len(df), "alerts": int(is_alert.sum())}
+
+    def _write(self, part, table, date, df):
+        directory = os.path.join(self.root, table, f"date={date}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{part:05d}.parquet")
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path)
+        return {
+            "path": os.path.relpath(path, self.root).replace(os.sep, "/"),
+            "table": table,
+            "partition": {"date": date},
+            "part": part,
+            "rows": len(df),
+            "min_timestamp": str(df["transaction_timestamp"].min()),
+            "max_timestamp": str(df["transaction_timestamp"].max()),
+        }
+
+    def _save_manifest(self):
+        path = os.path.join(self.root, MANIFEST_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    # ---------- READ ----------
+
+    def _table(self, path):
+        table = self._tables.get(path)
+        if table is None:
+            table = self._tables[path] = pq.read_table(os.path.join(self.root, path), memory_map=True)
+        return table
+
+    def _add_to_index(self, index):
+        last_ts = index["last_timestamp"].to_numpy()
+        for merchant_id, path, offset, rows, last in zip(
+            index["merchant_id"], index["path"], index["offset"], index["rows"], last_ts
+        ):
+            self._index.setdefault(merchant_id, []).append((path, int(offset), int(rows), last))
+
+    def index(self):
+        """merchant_id -> [(alert file, offset, rows, last timestamp)], loaded once."""
+        if self._index is None:
+            self._index = {}
+            for entry in self.files("index"):
+                self._add_to_index(pq.read_table(os.path.join(self.root, entry["path"])).to_pandas())
+        return self._index
+
+    def files(self, table):
+        return [entry for entry in self.manifest["files"] if entry["table"] == table]
+
+    def merchant_alerts(self, merchant_id, since=None):
+        """All alert rows for one merchant (optionally at or after since), oldest file first."""
+        since = None if since is None else np.datetime64(pd.Timestamp(since), "ns")
+        runs = [
+            self._table(path).slice(offset, rows)
+            for path, offset, rows, last in self.index().get(merchant_id, ())
+            if since is None or last >= since
+        ]
+        if not runs:
+            return self._empty()
+        table = runs[0] if len(runs) == 1 else pa.concat_tables(runs)
+        if since is not None:
+            table = table.filter(pc.greater_equal(table["transaction_timestamp"], pa.scalar(since)))
+        return table
+
+    def alerts_since(self, since):
+        """Every alert row with transaction_timestamp >= since, in file order."""
+        since = pd.Timestamp(since)
+        tables = []
+        for entry in self.files("alerts"):
+            if pd.Timestamp(entry["max_timestamp"]) < since:
+                continue
+            table = self._table(entry["path"])
+            if pd.Timestamp(entry["min_timestamp"]) < since:
+                table = table.filter(pc.greater_equal(table["transaction_timestamp"], pa.scalar(since.to_datetime64())))
+            tables.append(table)
+        if not tables:
+            return self._empty()
+        return tables[0] if len(tables) == 1 else pa.concat_tables(tables)
+
+    def scores(self, dates=None):
+        """Compact scores for the requested dates (all by default) as a DataFrame."""
+        dates = None if dates is None else {str(pd.Timestamp(d).date()) for d in dates}
+        frames = [
+            self._table(entry["path"]).to_pandas()
+            for entry in self.files("scores")
+            if dates is None or entry["partition"]["date"] in dates
+        ]
+        if not frames:
+            return pd.DataFrame(columns=list(SCORE_COLUMNS))
+        return pd.concat(frames, ignore_index=True)
+
+    def _empty(self):
+        alerts = self.files("alerts")
+        return self._table(alerts[0]["path"]).slice(0, 0) if alerts else pa.table({})
+
+
+def _compact_scores(df):
+    out = pd.DataFrame({name: df[name].to_numpy() for name in SCORE_COLUMNS})
+    for name, dtype in SCORE_COLUMNS.items():
+        if dtype is not None:
+            out[name] = out[name].astype(dtype)
+    return out
+
+
+def _merchant_runs(alerts, path):
+    """One index row per merchant run in a file sorted by merchant_id."""
+    merchants = alerts["merchant_id"].to_numpy()
+    starts = np.flatnonzero(np.r_[True, merchants[1:] != merchants[:-1]])
+    ends = np.r_[starts[1:], len(merchants)]
+    return pd.DataFrame({
+        "merchant_id": merchants[starts],
+        "path": path,
+        "offset": starts.astype(np.int64),
+        "rows": (ends - starts).astype(np.int64),
+        "last_timestamp": alerts["transaction_timestamp"].to_numpy()[ends - 1],
+    })
+
+
+def _lookup_us(fn, args, repeat=5):
+    """Median microseconds per call over args."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for arg in args:
+            fn(arg)
+        times.append((time.perf_counter() - started) / len(args))
+    return round(float(np.median(times)) * 1e6, 1)
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    from Data_Loader import load_dataset
+    from Fraud_Features import build_fraud_features
+    from Fraud_Model import FraudModel
+
+    parser = argparse.ArgumentParser(description="Append scored transactions to the alert sink and time lookups")
+    parser.add_argument("--batches", type=int, default=12, help="appends, one per month of data")
+    args = parser.parse_args()
+
+    features = build_fraud_features(load_dataset("transactions"), load_dataset("merchants"))
+    scored = features.copy()
+    for name, values in FraudModel().fit(features).score(features).items():
+        scored[name] = values
+    scored["fraud_action"] = pd.Categorical(scored["fraud_action"])
+    scored = scored.sort_values(["transaction_timestamp", "transaction_id"], kind="stable")
+
+    with tempfile.TemporaryDirectory() as root:
+        sink = AlertSink(root)
+        started = time.perf_counter()
+        for batch in np.array_split(np.arange(len(scored)), args.batches):
+            sink.append(scored.iloc[batch])
+        print(f"{len(scored):,} scored rows in {args.batches} appends: {time.perf_counter() - started:.2f}s")
+        print("rerun of the last batch:", sink.append(scored.iloc[batch]))
+
+        sink = AlertSink(root)
+        alerts = scored[scored["fraud_action"].astype(str).isin(ALERT_ACTIONS)]
+        merchants = alerts["merchant_id"].unique()
+        since = alerts["transaction_timestamp"].quantile(0.5)   # half the alerts are newer
+        print(f"alerts stored: {sum(e['rows'] for e in sink.files('alerts')):,} of {len(alerts):,}; "
+              f"merchants with alerts: {len(merchants):,}")
+
+        started = time.perf_counter()
+        sink.index()
+        for merchant_id in merchants:
+            sink.merchant_alerts(merchant_id)
+        print(f"cold: index + first lookup of every merchant {(time.perf_counter() - started) * 1000:.1f}ms")
+        print(f"merchant_alerts: {_lookup_us(sink.merchant_alerts, merchants):.1f}us per lookup")
+        print(f"merchant_alerts(since=): {_lookup_us(lambda m: sink.merchant_alerts(m, since), merchants):.1f}us")
+        print(f"alerts_since: {_lookup_us(sink.alerts_since, [since] * 100):.1f}us "
+              f"({sink.alerts_since(since).num_rows} rows)")
+
+        scan = os.path.join(root, "fraud_alert.csv")
+        scored.to_csv(scan, index=False)
+        started = time.perf_counter()
+        full = pd.read_csv(scan)
+        full[full["merchant_id"] == merchants[0]]
+        print(f"full CSV scan for one merchant: {(time.perf_counter() - started) * 1000:.1f}ms")
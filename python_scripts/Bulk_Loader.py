@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Bulk loader for the merchants / api_keys / transactions tables.
+
+Takes columnar batches (pandas DataFrame or pyarrow Table/RecordBatch) and
+binds whole parameter arrays per executemany call instead of one
+cursor.execute per iterrows() row:
+
+- pyodbc: cursor.fast_executemany = True (array-bound parameters)
+- SQLite: executemany on a local stand-in database, so the path can be
+  benchmarked without SQL Server
+
+Batch size and the number of batches per commit are tunable, and every
+load reports rows/sec. write_bulk_file() + bulk_load_file() give the
+CSV / BULK INSERT (bcp-style) path for the largest loads.
+"""
+
+import csv
+import os
+import sqlite3
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+from Transaction_Simulator import (
+    API_KEY_COLUMNS,
+    MERCHANT_COLUMNS,
+    TRANSACTION_COLUMNS,
+)
+
+
+TABLE_COLUMNS = {
+    "merchants": MERCHANT_COLUMNS,
+    "api_keys": API_KEY_COLUMNS,
+    "transactions": TRANSACTION_COLUMNS,
+}
+
+BATCH_SIZE = 10_000
+COMMIT_EVERY = 10   # batches per commit window
+
+SQLITE_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# SQLite stand-in for sql_scripts/Tables.sql
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS merchants (
+    merchant_id        VARCHAR(50) PRIMARY KEY,
+    signup_timestamp   DATETIME2 NOT NULL,
+    country            VARCHAR(50) NOT NULL,
+    industry           VARCHAR(100) NOT NULL,
+    business_type      VARCHAR(50),
+    signup_channel     VARCHAR(50)
+);
+
+CREATE TABLE IF NOT EXISTS api_keys (
+    api_key_id         VARCHAR(50) PRIMARY KEY,
+    merchant_id        VARCHAR(50) NOT NULL REFERENCES merchants (merchant_id),
+    created_timestamp  DATETIME2 NOT NULL,
+    environment        VARCHAR(10) NOT NULL CHECK (environment IN ('TEST', 'LIVE')),
+    key_type           VARCHAR(20)
+);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id        VARCHAR(50) PRIMARY KEY,
+    merchant_id           VARCHAR(50) NOT NULL REFERENCES merchants (merchant_id),
+    transaction_timestamp DATETIME2 NOT NULL,
+    environment           VARCHAR(10) NOT NULL CHECK (environment IN ('TEST', 'LIVE')),
+    status                VARCHAR(20) NOT NULL CHECK (status IN ('SUCCESS', 'FAILED')),
+    amount                DECIMAL(18, 2),
+    currency              VARCHAR(10),
+    payment_method        VARCHAR(50),
+    failure_reason        VARCHAR(255)
+);
+"""
+
+
+# ---------- CONNECTIONS ----------
+
+def connect_sqlite(path=":memory:", create_schema=True, check_same_thread=True):
+    """Local SQLite stand-in for PaystackFintechDB."""
+    conn = sqlite3.connect(path, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    if create_schema:
+        conn.executescript(SQLITE_SCHEMA)
+    return conn
+
+
+def is_sqlite(conn):
+    return isinstance(conn, sqlite3.Connection)
+
+
+def insert_sql(table, columns=None):
+    columns = columns or TABLE_COLUMNS[table]
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)})"
+    )
+
+
+# ---------- PARAMETER BATCHES ----------
+
+def _column_params(series, timestamps_as_text):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if timestamps_as_text:
+            values = series.dt.strftime(SQLITE_TIMESTAMP_FORMAT)
+        else:
+            values = pd.Series(series.dt.to_pydatetime(), index=series.index, dtype=object)
+    else:
+        values = series.astype(object)
+    return values.where(series.notna(), None).tolist()
+
+
+def _arrow_params(column, timestamps_as_text):
+    values = column.to_pylist()
+    if timestamps_as_text and pa.types.is_timestamp(column.type):
+        return [None if v is None else v.strftime(SQLITE_TIMESTAMP_FORMAT) for v in values]
+    return values
+
+
+def iter_param_batches(data, columns, batch_size=BATCH_SIZE, timestamps_as_text=False):
+    """Yield lists of parameter tuples, built column-at-a-time, batch_size rows each."""
+    if isinstance(data, (pa.Table, pa.RecordBatch)):
+        if isinstance(data, pa.RecordBatch):
+            data = pa.Table.from_batches([data])
+        for batch in data.select(columns).to_batches(max_chunksize=batch_size):
+            yield list(zip(*(
+                _arrow_params(batch.column(i), timestamps_as_text)
+                for i in range(batch.num_columns)
+            )))
+        return
+
+    for start in range(0, len(data), batch_size):
+        chunk = data.iloc[start:start + batch_size]
+        yield list(zip(*(
+            _column_params(chunk[c], timestamps_as_text) for c in columns
+        )))
+
+
+# ---------- LOADING ----------
+
+def load_table(conn, table, data, batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY, columns=None):
+    """
+    Insert a DataFrame / Arrow table (or an iterable of them) into `table`.
+
+    Commits every `commit_every` batches and once at the end. Returns a
+    stats dict with rows, batches, seconds and rows_per_sec.
+    """
+    columns = columns or TABLE_COLUMNS[table]
+    query = insert_sql(table, columns)
+    sqlite = is_sqlite(conn)
+
+    cursor = conn.cursor()
+    if not sqlite:
+        cursor.fast_executemany = True
+
+    if isinstance(data, (pd.DataFrame, pa.Table, pa.RecordBatch)):
+        data = [data]
+
+    started = time.perf_counter()
+    rows = batches = 0
+    for frame in data:
+        for params in iter_param_batches(frame, columns, batch_size, timestamps_as_text=sqlite):
+            cursor.executemany(query, params)
+            rows += len(params)
+            batches += 1
+            if batches % commit_every == 0:
+                conn.commit()
+    conn.commit()
+
+    return _stats(table, rows, batches, time.perf_counter() - started)
+
+
+def _stats(table, rows, batches, seconds):
+    return {
+        "table": table,
+        "rows": rows,
+        "batches": batches,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(rows / seconds) if seconds > 0 else None,
+    }
+
+
+def load_all(conn, merchants_df, api_keys_df, transactions_df, **kwargs):
+    """Load the three tables parent-first; returns one stats dict per table."""
+    return [
+        load_table(conn, "merchants", merchants_df, **kwargs),
+        load_table(conn, "api_keys", api_keys_df, **kwargs),
+        load_table(conn, "transactions", transactions_df, **kwargs),
+    ]
+
+
+# ---------- BULK FILE PATH ----------
+
+def write_bulk_file(data, path, columns):
+    """Write a headerless CSV in column order for BULK INSERT / bcp (NULLs as empty fields)."""
+    if isinstance(data, (pa.Table, pa.RecordBatch)):
+        data = data.select(columns).to_pandas()
+    data[columns].to_csv(
+        path,
+        index=False,
+        header=False,
+        date_format=SQLITE_TIMESTAMP_FORMAT,
+        lineterminator="\n"
+    )
+    return path
+
+
+def bulk_insert_sql(table, path):
+    """SQL Server BULK INSERT for a file written by write_bulk_file (path as seen by the server)."""
+    return (
+        f"BULK INSERT {table} FROM '{path}' WITH ("
+        "FORMAT = 'CSV', FIELDTERMINATOR = ',', ROWTERMINATOR = '0x0a', "
+        "TABLOCK, KEEPNULLS)"
+    )
+
+
+def bulk_load_file(conn, table, data, path, batch_size=BATCH_SIZE, columns=None):
+    """
+    Stage `data` as a CSV file and load it in one bulk operation.
+
+    SQL Server runs BULK INSERT on the file. SQLite has no server-side bulk
+    loader, so the stand-in streams the file back through executemany.
+    """
+    columns = columns or TABLE_COLUMNS[table]
+    started = time.perf_counter()
+    write_bulk_file(data, path, columns)
+
+    cursor = conn.cursor()
+    if is_sqlite(conn):
+        query = insert_sql(table, columns)
+        rows = batches = 0
+        with open(path, newline="") as f:
+            reader = csv.reader(f)
+            while True:
+                params = [
+                    tuple(v if v != "" else None for v in row)
+                    for _, row in zip(range(batch_size), reader)
+                ]
+                if not params:
+                    break
+                cursor.executemany(query, params)
+                rows += len(params)
+                batches += 1
+    else:
+        cursor.execute(bulk_insert_sql(table, os.path.abspath(path)))
+        rows, batches = cursor.rowcount, 1
+    conn.commit()
+
+    return _stats(table, rows, batches, time.perf_counter() - started)
+
+
+def print_stats(stats):
+    for s in stats:
+        print(f"{s['table']:<14} {s['rows']:>10,} rows  {s['seconds']:>8.2f}s  "
+              f"{s['rows_per_sec'] or 0:>10,} rows/sec")
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    from Transaction_Simulator import simulate
+
+    parser = argparse.ArgumentParser(description="Benchmark the bulk loader against SQLite")
+    parser.add_argument("--merchants", type=int, default=5_000)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--commit-every", type=int, default=COMMIT_EVERY)
+    args = parser.parse_args()
+
+    merchants_df, api_keys_df, transactions_df = simulate(args.merchants)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Baseline: one execute per iterrows() row, as in Data_Ingestion.py
+        conn = connect_sqlite(os.path.join(tmp, "rowwise.db"))
+        load_table(conn, "merchants", merchants_df)
+        cursor = conn.cursor()
+        query = insert_sql("transactions")
+        started = time.perf_counter()
+        for _, row in transactions_df.iterrows():
+            cursor.execute(query, (
+                row.transaction_id,
+                row.merchant_id,
+                row.transaction_timestamp.strftime(SQLITE_TIMESTAMP_FORMAT),
+                row.environment,
+                row.status,
+                row.amount,
+                row.currency,
+                row.payment_method,
+                None if pd.isna(row.failure_reason) else row.failure_reason
+            ))
+        conn.commit()
+        print("Row-by-row baseline")
+        print_stats([_stats("transactions", len(transactions_df), len(transactions_df),
+                            time.perf_counter() - started)])
+        conn.close()
+
+        conn = connect_sqlite(os.path.join(tmp, "batched.db"))
+        print("\nArray-bound executemany")
+        print_stats(load_all(
+            conn, merchants_df, api_keys_df, transactions_df,
+            batch_size=args.batch_size, commit_every=args.commit_every
+        ))
+        conn.close()
+
+        conn = connect_sqlite(os.path.join(tmp, "arrow.db"))
+        print("\nArrow batches")
+        print_stats(load_all(
+            conn,
+            pa.Table.from_pandas(merchants_df, preserve_index=False),
+            pa.Table.from_pandas(api_keys_df, preserve_index=False),
+            pa.Table.from_pandas(transactions_df, preserve_index=False),
+            batch_size=args.batch_size, commit_every=args.commit_every
+        ))
+        conn.close()
+
+        conn = connect_sqlite(os.path.join(tmp, "bulk.db"))
+        print("\nBulk file path")
+        print_stats([
+            bulk_load_file(conn, table, frame, os.path.join(tmp, f"{table}.csv"), args.batch_size)
+            for table, frame in [
+                ("merchants", merchants_df),
+                ("api_keys", api_keys_df),
+                ("transactions", transactions_df),
+            ]
+        ])
+        conn.close()
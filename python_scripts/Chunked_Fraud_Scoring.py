@@ -0,0 +1,402 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Out-of-core fraud scoring for feature files larger than memory.
+
+Fraud_Detection.py loads the whole Fraud Model export into one DataFrame,
+so its peak memory grows with the number of transactions. This mode makes
+two passes over the file (a CSV export or a Parquet file) and never holds
+more than one fixed-size chunk:
+
+1. Sample pass: a reservoir sample (Algorithm R, vectorized per chunk) of
+   SAMPLE_ROWS feature rows. FraudModel (scaler + IsolationForest, and the
+   time_since_last_tx_sec median fill) is fitted on the sample.
+2. Scoring pass: each chunk of CHUNK_ROWS rows gets the derived features,
+   is scaled column by column into one float32 model-input buffer allocated
+   once and reused for every chunk, then goes through the flattened forest
+   and the rule engine. Scored rows are appended to a Parquet file.
+
+Per-merchant totals (transactions, flagged, REVIEW/BLOCK counts, amounts)
+and the notebook's summary numbers are carried across chunks. Their size
+grows with the number of merchants, not with rows. merchant_fraud_flag
+needs every chunk, so it is written once at the end to a merchant table
+instead of onto each scored row.
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from Data_Loader import FRAUD_MODEL_SCHEMA, iter_batches, iter_table_chunks
+from Fraud_Features import FRAUD_MODEL_COLUMNS
+from Fraud_Model import FRAUD_FEATURES, FraudModel
+from Id_Dictionary import IdDictionary
+
+
+CHUNK_ROWS = 100_000
+SAMPLE_ROWS = 200_000
+TOP_TRANSACTIONS = 10
+
+ID_COLUMNS = ["transaction_id", "merchant_id", "transaction_timestamp"]
+FEATURE_COLUMNS = [c for c in FRAUD_MODEL_COLUMNS if c not in ID_COLUMNS]
+
+SCORED_FILE = "scored_transactions.parquet"
+MERCHANTS_FILE = "merchant_fraud.parquet"
+SUMMARY_FILE = "summary.json"
+
+
+# ---------- READING ----------
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS, columns=FRAUD_MODEL_COLUMNS):
+    """Arrow tables of exactly chunk_rows rows (the last one may be shorter)."""
+    return iter_table_chunks(path, FRAUD_MODEL_SCHEMA, chunk_rows, columns)
+
+
+def read_features(path):
+    """Whole file as one Arrow table, from a typed CSV export or a Parquet file."""
+    if path.endswith(".parquet"):
+        return pq.read_table(path)
+    return pa.Table.from_batches(list(iter_batches(path, FRAUD_MODEL_SCHEMA)))
+
+
+def chunk_columns(table, columns):
+    """Arrow columns -> numpy (NULL -> NaN, dictionary strings -> object)."""
+    return {name: table.column(name).to_numpy() for name in columns}
+
+
+# ---------- SAMPLE PASS ----------
+
+def reservoir_sample(chunks, size=SAMPLE_ROWS, columns=FEATURE_COLUMNS, seed=42):
+    """
+    Uniform sample of size rows from a stream of chunks, as a dict of columns.
+
+    Row i (0-based, over the whole stream) replaces slot j = randint(0, i)
+    when j < size. Within a chunk the later of two rows drawing the same
+    slot wins, as in the row-by-row algorithm.
+    """
+    rng = np.random.default_rng(seed)
+    sample, seen = None, 0
+    for table in chunks:
+        values = chunk_columns(table, columns)
+        n = table.num_rows
+        if sample is None:
+            sample = {name: np.empty(size, dtype=v.dtype) for name, v in values.items()}
+
+        # Fill the empty slots first
+        fill = min(max(size - seen, 0), n)
+        for name, v in values.items():
+            sample[name][seen:seen + fill] = v[:fill]
+
+        rows = np.arange(fill, n)
+        slots = rng.integers(0, seen + rows + 1)
+        keep = slots < size
+        rows, slots = rows[keep], slots[keep]
+        # Last writer per slot
+        last = len(slots) - 1 - np.unique(slots[::-1], return_index=True)[1]
+        rows, slots = rows[last], slots[last]
+        for name, v in values.items():
+            sample[name][slots] = v[rows]
+        seen += n
+
+    if sample is None:
+        raise ValueError("No rows to sample")
+    return {name: v[:min(seen, size)] for name, v in sample.items()}, seen
+
+
+# ---------- SCORING PASS ----------
+
+class ChunkScorer:
+    """Scores chunks of up to chunk_rows rows through buffers allocated once."""
+
+    def __init__(self, model, chunk_rows=CHUNK_ROWS):
+        self.model = model
+        self.X = np.empty((chunk_rows, len(FRAUD_FEATURES)), dtype=np.float32)
+        self.column = np.empty(chunk_rows, dtype=np.float64)
+
+    def score(self, features):
+        """Same outputs as FraudModel.score, plus the action codes."""
+        prepared = self.model.prepare(features)
+        n = len(prepared["transaction_amount"])
+        X, column = self.X[:n], self.column[:n]
+
+        # Scale in float64 and round once to float32, which is what the forest compares
+        for j, name in enumerate(FRAUD_FEATURES):
+            np.subtract(prepared[name], self.model.mean[j], out=column)
+            np.divide(column, self.model.scale[j], out=column)
+            X[:, j] = column
+
+        anomaly = self.model.forest.decision_function(X)
+        is_fraud = anomaly < 0
+        risk = self.model.rules.score(prepared, where=is_fraud)
+        return {
+            "anomaly_score": anomaly,
+            "is_fraud": is_fraud.astype(np.int8),
+            "fraud_risk_score": risk,
+            "action_code": self.model.rules.action_codes(risk),
+        }
+
+
+class MerchantAggregates:
+    """Per-merchant running totals; merchants get a slot when first seen."""
+
+    def __init__(self, action_names):
+        self.action_names = action_names
+        self.ids = IdDictionary([])
+        self.totals = {name: np.zeros(0) for name in self.columns()}
+
+    def columns(self):
+        actions = [f"{name.lower()}_count" for name in self.action_names[1:]]
+        return ["transactions", "amount", "flagged", "flagged_amount"] + actions
+
+    def update(self, merchant_ids, amount, is_fraud, action_codes):
+        codes = self.ids.encode(merchant_ids, add_missing=True)
+        n = len(self.ids)
+        flagged = is_fraud.astype(bool)
+
+        counts = {
+            "transactions": np.bincount(codes, minlength=n),
+            "amount": np.bincount(codes, weights=amount, minlength=n),
+            "flagged": np.bincount(codes[flagged], minlength=n),
+            "flagged_amount": np.bincount(codes[flagged], weights=amount[flagged], minlength=n),
+        }
+        for code, name in enumerate(self.action_names[1:], start=1):
+            counts[f"{name.lower()}_count"] = np.bincount(codes[action_codes == code], minlength=n)
+
+        for name, values in counts.items():
+            totals = self.totals[name]
+            if len(totals) < n:
+                totals = self.totals[name] = np.concatenate([totals, np.zeros(n - len(totals))])
+            totals += values
+
+    def frame(self):
+        out = pd.DataFrame({"merchant_id": self.ids.ids.values})
+        for name, values in self.totals.items():
+            out[name] = values if "amount" in name else values.astype(np.int64)
+        out["merchant_fraud_flag"] = (out["flagged"] > 0).astype(np.int8)
+        return out
+
+
+class RunningSummary:
+    """Fraud_Detection.py's summary cells, accumulated chunk by chunk."""
+
+    def __init__(self, top=TOP_TRANSACTIONS):
+        self.top = top
+        self.rows = np.zeros(2, dtype=np.int64)            # [normal, fraud]
+        self.amount = np.zeros(2)
+        self.weekend = np.zeros(2, dtype=np.int64)
+        self.hours = np.zeros((2, 24), dtype=np.int64)
+        self.top_rows = pd.DataFrame()
+
+    def update(self, table, features, is_fraud):
+        self.rows += np.bincount(is_fraud, minlength=2)
+        self.amount += np.bincount(is_fraud, weights=features["transaction_amount"], minlength=2)
+        self.weekend += np.bincount(is_fraud, weights=features["is_weekend"], minlength=2).astype(np.int64)
+        self.hours += np.bincount(is_fraud.astype(np.int64) * 24 + features["hour_of_day"].astype(np.int64), minlength=48).reshape(2, 24)
+
+        flagged = np.flatnonzero(is_fraud)
+        if len(flagged):
+            # Only this chunk's own top rows can enter the overall top
+            amount = features["transaction_amount"][flagged]
+            best = flagged[np.argsort(-amount, kind="stable")[:self.top]]
+            candidates = pd.DataFrame({
+                "transaction_id": table.column("transaction_id").take(best).to_numpy(),
+                "merchant_id": table.column("merchant_id").take(best).to_numpy(),
+                "transaction_amount": features["transaction_amount"][best],
+                "hour_of_day": features["hour_of_day"][best],
+            })
+            self.top_rows = (
+                pd.concat([self.top_rows, candidates], ignore_index=True)
+                .sort_values("transaction_amount", ascending=False, kind="stable")
+                .head(self.top)
+                .reset_index(drop=True)
+            )
+
+    def report(self):
+        total = int(self.rows.sum())
+        return {
+            "transactions": total,
+            "flagged": int(self.rows[1]),
+            "flagged_share": float(self.rows[1] / total) if total else 0.0,
+            "fraud_avg_amount": float(self.amount[1] / self.rows[1]) if self.rows[1] else None,
+            "normal_avg_amount": float(self.amount[0] / self.rows[0]) if self.rows[0] else None,
+            "fraud_weekend_share": float(self.weekend[1] / self.rows[1]) if self.rows[1] else None,
+            "weekend_share": float(self.weekend.sum() / total) if total else None,
+            "hour_normal": self.hours[0].tolist(),
+            "hour_fraud": self.hours[1].tolist(),
+        }
+
+
+def _scored_table(table, scores, action_names):
+    return pa.table({
+        "transaction_id": table.column("transaction_id"),
+        "merchant_id": table.column("merchant_id"),
+        "transaction_timestamp": table.column("transaction_timestamp"),
+        "transaction_amount": table.column("transaction_amount"),
+        "anomaly_score": scores["anomaly_score"],
+        "is_fraud": scores["is_fraud"],
+        "fraud_risk_score": scores["fraud_risk_score"],
+        "fraud_action": pa.DictionaryArray.from_arrays(
+            scores["action_code"], pa.array(action_names, type=pa.string())
+        ),
+    })
+
+
+def fit_on_sample(path, sample_rows=SAMPLE_ROWS, chunk_rows=CHUNK_ROWS, seed=42):
+    """FraudModel fitted on a reservoir sample of the file; returns (model, rows in file)."""
+    sample, seen = reservoir_sample(iter_chunks(path, chunk_rows, FEATURE_COLUMNS), sample_rows, seed=seed)
+    return FraudModel().fit(sample), seen
+
+
+def score_file(path, out_dir, model=None, chunk_rows=CHUNK_ROWS, sample_rows=SAMPLE_ROWS, seed=42):
+    """
+    Score a Fraud Model file chunk by chunk into out_dir.
+
+    Writes SCORED_FILE (one row per transaction), MERCHANTS_FILE (per-merchant
+    totals and merchant_fraud_flag) and SUMMARY_FILE. Fits a model on a
+    reservoir sample when none is given. Returns (summary, merchants, model).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+    sample_rows_used = None
+    if model is None:
+        model, seen = fit_on_sample(path, sample_rows, chunk_rows, seed)
+        sample_rows_used = min(seen, sample_rows)
+    fitted = time.perf_counter()
+
+    scorer = ChunkScorer(model, chunk_rows)
+    action_names = model.rules.action_names
+    merchants = MerchantAggregates(action_names)
+    summary = RunningSummary()
+    writer = None
+    try:
+        for table in iter_chunks(path, chunk_rows):
+            features = chunk_columns(table, FEATURE_COLUMNS)
+            scores = scorer.score(features)
+            merchants.update(
+                table.column("merchant_id").to_numpy(), features["transaction_amount"],
+                scores["is_fraud"], scores["action_code"]
+            )
+            summary.update(table, features, scores["is_fraud"])
+
+            scored = _scored_table(table, scores, action_names)
+            if writer is None:
+                writer = pq.ParquetWriter(os.path.join(out_dir, SCORED_FILE), scored.schema)
+            writer.write_table(scored)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    merchant_frame = merchants.frame()
+    merchant_frame.to_parquet(os.path.join(out_dir, MERCHANTS_FILE), index=False)
+
+    report = summary.report()
+    report.update(
+        flagged_merchants=int(merchant_frame["merchant_fraud_flag"].sum()),
+        top_transactions=summary.top_rows.to_dict(orient="records"),
+        sample_rows=sample_rows_used,
+        chunk_rows=chunk_rows,
+        fit_sec=round(fitted - started, 3),
+        score_sec=round(time.perf_counter() - fitted, 3),
+        rule_hits=model.rules.hit_report().to_dict(orient="records"),
+    )
+    with open(os.path.join(out_dir, SUMMARY_FILE), "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    return report, merchant_frame, model
+
+
+# ---------- BENCHMARK ----------
+
+def write_tiled_features(source, path, rows, chunk_rows=CHUNK_ROWS):
+    """Parquet file of rows feature rows, repeating source with suffixed ids (built chunk by chunk)."""
+    base = read_features(source)
+    writer = pq.ParquetWriter(path, base.schema)
+    try:
+        written, repeat = 0, 0
+        while written < rows:
+            for start in range(0, base.num_rows, chunk_rows):
+                part = base.slice(start, min(chunk_rows, rows - written))
+                ids = pc.binary_join_element_wise(part.column("transaction_id"), f"r{repeat}", "_")
+                writer.write_table(part.set_column(0, "transaction_id", ids))
+                written += part.num_rows
+                if written >= rows:
+                    break
+            repeat += 1
+    finally:
+        writer.close()
+    return path
+
+
+def _peak_rss_mb():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024 / (1024 if os.uname().sysname == "Darwin" else 1), 1)
+
+
+def score_in_memory(path, sample_rows=SAMPLE_ROWS, seed=42):
+    """The notebook's way: whole file in one DataFrame, same sample-fitted model."""
+    model, _ = fit_on_sample(path, sample_rows, seed=seed)
+    df = read_features(path).to_pandas()
+    scores = model.score(df)
+    df["is_fraud"] = scores["is_fraud"]
+    df["merchant_fraud_flag"] = df.groupby("merchant_id")["is_fraud"].transform("max")
+    return {"transactions": len(df), "flagged": int(df["is_fraud"].sum())}
+
+
+if __name__ == "__main__":
+    import argparse
+    import subprocess
+    import sys
+    import tempfile
+
+    from Data_Loader import DATASETS, DATA_DIR
+
+    parser = argparse.ArgumentParser(description="Chunked out-of-core fraud scoring")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    score = sub.add_parser("score", help="score one file")
+    score.add_argument("path", nargs="?", default=os.path.join(DATA_DIR, DATASETS["fraud_model"][0]))
+    score.add_argument("--out", default=os.path.join(DATA_DIR, "processed", "fraud_scored"))
+    score.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    score.add_argument("--sample-rows", type=int, default=SAMPLE_ROWS)
+    score.add_argument("--in-memory", action="store_true", help="load the whole file instead (for comparison)")
+
+    bench = sub.add_parser("bench", help="peak RSS and time as the input grows")
+    bench.add_argument("--rows", type=int, nargs="+", default=[2_000_000, 8_000_000, 20_000_000])
+    bench.add_argument("--in-memory-limit", type=int, default=4_000_000,
+                       help="largest input also run through the in-memory path")
+    args = parser.parse_args()
+
+    if args.command == "score":
+        started = time.perf_counter()
+        if args.in_memory:
+            report = score_in_memory(args.path, args.sample_rows)
+        else:
+            report, _, _ = score_file(args.path, args.out, chunk_rows=args.chunk_rows, sample_rows=args.sample_rows)
+        print(json.dumps({
+            "transactions": report["transactions"],
+            "flagged": report["flagged"],
+            "seconds": round(time.perf_counter() - started, 2),
+            "peak_rss_mb": _peak_rss_mb(),
+        }))
+    else:
+        source = os.path.join(DATA_DIR, DATASETS["fraud_model"][0])
+        with tempfile.TemporaryDirectory() as tmp:
+            for rows in args.rows:
+                path = write_tiled_features(source, os.path.join(tmp, f"features_{rows}.parquet"), rows)
+                modes = [[]] + ([["--in-memory"]] if rows <= args.in_memory_limit else [])
+                for mode in modes:
+                    out = subprocess.run(
+                        [sys.executable, __file__, "score", path, "--out", os.path.join(tmp, "out"), *mode],
+                        capture_output=True, text=True, check=True,
+                    )
+                    label = "in-memory" if mode else "chunked"
+                    print(f"{rows:>12,} rows  {label:<9}  {out.stdout.strip()}")
+                os.remove(path)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Rolling-origin backtest of the churn model.
+
+Churn_Prediction.py fits and evaluates on one snapshot (one
+@observation_end) with a random train_test_split. Here every origin date
+is a training snapshot, and the model is scored on the snapshot
+LABEL_DAYS later. That snapshot's features start where the training
+labels end, so nothing from the test labels leaks into training. ROC-AUC
+per origin shows how stable the model is over time.
+
+All snapshots come from one Churn_Features.ChurnSnapshots (one sort, shared
+prefix sums). Origins are independent, so they are fitted in a process
+pool. Each worker's RandomForest is single-threaded, so the pool is the
+only parallelism. The snapshots are a few hundred rows each and are
+pickled to the workers with the task.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+
+from Churn_Features import LABEL_DAYS, ChurnSnapshots, default_observation_end
+from Churn_Model import TARGET, build_pipeline, churn_features, churn_probability
+
+
+ORIGIN_STEP_DAYS = 7
+MIN_HISTORY_DAYS = 60   # first origin: enough history for the 60-day trend window
+
+
+def origin_dates(transactions_df, step_days=ORIGIN_STEP_DAYS, min_history_days=MIN_HISTORY_DAYS):
+    """Origins every step_days whose test snapshot (origin + LABEL_DAYS) still has a full label window."""
+    first = (pd.Timestamp(transactions_df["transaction_timestamp"].min())
+             + pd.Timedelta(days=min_history_days)).normalize()
+    last = default_observation_end(transactions_df) - pd.Timedelta(days=LABEL_DAYS)
+    return pd.date_range(first, last, freq=f"{step_days}D")
+
+
+def evaluate_origin(origin, train_df, test_df, rf_params=None):
+    """Fit on the origin snapshot, score the one LABEL_DAYS later; one result row."""
+    row = {
+        "origin": origin,
+        "test_date": origin + pd.Timedelta(days=LABEL_DAYS),
+        "train_rows": len(train_df),
+        "test_rows": len(test_df),
+        "train_churn_rate": float(train_df[TARGET].mean()) if len(train_df) else np.nan,
+        "test_churn_rate": float(test_df[TARGET].mean()) if len(test_df) else np.nan,
+        "roc_auc": np.nan,
+        "fit_seconds": 0.0,
+    }
+    # roc_auc_score needs both classes on each side
+    if train_df[TARGET].nunique() < 2 or test_df[TARGET].nunique() < 2:
+        return row
+
+    X_train = churn_features(train_df)
+    started = time.perf_counter()
+    pipeline = build_pipeline(X_train, **{"n_jobs": 1, **(rf_params or {})}).fit(X_train, train_df[TARGET])
+    row["fit_seconds"] = time.perf_counter() - started
+    row["roc_auc"] = roc_auc_score(test_df[TARGET], churn_probability(pipeline, churn_features(test_df)))
+    return row
+
+
+def _evaluate(task):
+    return evaluate_origin(*task)
+
+
+def run_backtest(transactions_df, merchants_df, origins=None, workers=1, rf_params=None):
+    """
+    One result row per origin (see evaluate_origin), in origin order.
+
+    Returns (results DataFrame, seconds spent building snapshots).
+    """
+    origins = origin_dates(transactions_df) if origins is None else pd.DatetimeIndex(origins)
+    offset = pd.Timedelta(days=LABEL_DAYS)
+
+    started = time.perf_counter()
+    builder = ChurnSnapshots(transactions_df, merchants_df)
+    snapshots = builder.snapshots(origins.union(origins + offset))
+    build_seconds = time.perf_counter() - started
+
+    tasks = [(origin, snapshots[origin], snapshots[origin + offset], rf_params) for origin in origins]
+    if workers <= 1 or len(tasks) <= 1:
+        rows = [_evaluate(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(_evaluate, tasks))
+    return pd.DataFrame(rows), build_seconds
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from Data_Loader import load_dataset
+
+    parser = argparse.ArgumentParser(description="Rolling-origin churn backtest and its scaling across cores")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--step-days", type=int, default=ORIGIN_STEP_DAYS)
+    parser.add_argument("--simulate", type=int, default=None, help="use this many simulated merchants instead")
+    args = parser.parse_args()
+
+    if args.simulate:
+        from Transaction_Simulator import simulate
+        merchants_df, _, transactions_df = simulate(args.simulate)
+    else:
+        transactions_df, merchants_df = load_dataset("transactions"), load_dataset("merchants")
+    origins = origin_dates(transactions_df, args.step_days)
+    print(f"{len(transactions_df):,} transactions, {len(origins)} origins, {os.cpu_count()} cores available")
+
+    baseline, reference = None, None
+    for workers in args.workers:
+        started = time.perf_counter()
+        results, build_seconds = run_backtest(transactions_df, merchants_df, origins, workers=workers)
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        reference = results if reference is None else reference
+        same = results["roc_auc"].equals(reference["roc_auc"])
+        print(f"workers={workers}: {elapsed:.2f}s (snapshots {build_seconds:.2f}s)  "
+              f"speedup vs first {baseline / elapsed:.2f}x  same AUCs: {same}")
+
+    table = reference.assign(origin=reference["origin"].dt.date, test_date=reference["test_date"].dt.date)
+    print(table.round(3).to_string(index=False))
+    print(f"ROC-AUC mean {reference['roc_auc'].mean():.3f}, min {reference['roc_auc'].min():.3f}, "
+          f"max {reference['roc_auc'].max():.3f}")
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+In-process churn snapshot builder.
+
+Builds the "1. Merchant Churn Model" rows from Analytics.sql for any number
+of observation dates at once, instead of one SSMS run (and one hand export
+to Churn model.csv) per @observation_end.
+
+The LIVE transactions are sorted once by (merchant, timestamp), as one
+int64 argsort over merchant code * stride + half-day key. Running
+prefix sums over that order (success / failed counts, amount and success
+amount in integer cents, first use of each payment method) are shared by
+every snapshot. Each window boundary of each date then costs one
+searchsorted per merchant and every aggregate is a difference of two
+prefix values:
+
+- observation rows            ts <= @observation_end
+- txns / volume_last_30d      ts >  @observation_end - 30 days
+- txns / volume_prev_30d      ts BETWEEN @observation_end - 60 AND - 31 days
+- churn_flag                  no SUCCESS in (@observation_end, + 30 days]
+
+@observation_end is a DATE, so every boundary is a midnight. Timestamps are
+mapped to half-day keys (2 * day, + 1 if after midnight), which turns each
+<= / < / > comparison against a midnight into one integer threshold.
+
+AVG over DECIMAL(18, 2) and the volume_change_pct_30d division keep six
+decimals, truncated; sql_truncated_ratio repeats that in integer
+arithmetic, so build_churn_features(transactions, merchants, date) equals
+the export value for value and can replace Churn model.csv in
+Churn_Prediction.py.
+"""
+
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from Data_Loader import CHURN_MODEL_SCHEMA
+from Fraud_Features import NS_PER_DAY, _ns, id_ranks, segment_bounds
+
+
+CHURN_MODEL_COLUMNS = list(CHURN_MODEL_SCHEMA)
+
+LABEL_DAYS = 30      # future_txns window and the MAX(ts) - 30 days default
+RECENT_DAYS = 30     # txns_last_30d
+PREV_START_DAYS = 60  # txns_prev_30d: BETWEEN - 60 AND - 31 days
+PREV_END_DAYS = 31
+SQL_SCALE = 6         # decimals kept by AVG(DECIMAL) and the volume_change_pct_30d division
+
+
+def observation_day(value):
+    """A date (or timestamp, truncated like a DATE variable) as days since 1970-01-01."""
+    return int(pd.Timestamp(value).value // NS_PER_DAY)
+
+
+def default_observation_end(transactions_df):
+    """@observation_end = DATEADD(day, -30, MAX(transaction_timestamp)), stored in a DATE."""
+    last = pd.Timestamp(transactions_df["transaction_timestamp"].max())
+    return (last - pd.Timedelta(days=LABEL_DAYS)).normalize()
+
+
+def sql_truncated_ratio(numerator, denominator, scale=SQL_SCALE):
+    """
+    numerator / denominator (int64 arrays, denominator > 0) cut toward zero at
+    scale decimals, as SQL Server's decimal AVG and division do, as the
+    float64 nearest that decimal.
+    """
+    numerator = np.asarray(numerator, dtype=np.int64)
+    denominator = np.asarray(denominator, dtype=np.int64)
+    unit = 10 ** scale
+    whole, rest = np.divmod(np.abs(numerator), denominator)
+
+    # Exact in int64 while the scaled quotient stays below 2 ** 53 and rest * unit fits
+    fits = (whole < (1 << 53) // unit) & (denominator < np.iinfo(np.int64).max // unit)
+    scaled = whole * unit + np.where(fits, rest, 0) * unit // denominator
+    out = np.where(scaled == 0, 0.0, np.sign(numerator) * (scaled / unit))
+    for i in np.flatnonzero(~fits):
+        value = Decimal(abs(int(numerator[i])) * unit // int(denominator[i])) / unit
+        out[i] = float(value if numerator[i] >= 0 else -value)
+    return out
+
+
+def merchant_codes(merchant_ids, merchants_df):
+    """Row of each merchant_id in merchants_df, -1 when it has none (dropped by the JOIN)."""
+    ids = merchant_ids if isinstance(merchant_ids, pd.Series) else pd.Series(merchant_ids)
+    value_set = pa.array(np.asarray(merchants_df["merchant_id"], dtype=object))
+    if isinstance(ids.dtype, pd.CategoricalDtype):
+        lookup = merchant_codes(pd.Series(np.asarray(ids.cat.categories, dtype=object)), merchants_df)
+        return np.where(ids.cat.codes >= 0, lookup[ids.cat.codes], -1)
+    return pc.index_in(pa.array(ids), value_set=value_set).fill_null(-1).to_numpy().astype(np.int64)
+
+
+def _codes(column):
+    """Category codes of a column (-1 for NULL), without going through Python strings."""
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype("category")
+    return column.cat.codes.to_numpy().astype(np.int64), len(column.cat.categories)
+
+
+class ChurnSnapshots:
+    """
+    Sorted LIVE transactions and their prefix sums, from which snapshot(day)
+    reads the churn model rows for any observation date.
+    """
+
+    def __init__(self, transactions_df, merchants_df):
+        # LIVE rows that JOIN merchants, picked by position rather than copying the frame
+        codes = merchant_codes(transactions_df["merchant_id"], merchants_df)
+        rows = np.flatnonzero((transactions_df["environment"] == "LIVE").to_numpy() & (codes >= 0))
+        codes = codes[rows]
+
+        # Half-day key: ts <= midnight of day d  <=>  key <= 2d. Rows only need
+        # ordering by key within a merchant, so one int64 argsort does it.
+        ts = _ns(transactions_df["transaction_timestamp"])[rows]
+        key = 2 * (ts // NS_PER_DAY) + (ts % NS_PER_DAY != 0)
+        # One key range per merchant; _rows_upto clips boundaries outside it
+        self._key_offset = int(key.min()) if len(key) else 0
+        self._stride = int(key.max()) - self._key_offset + 1 if len(key) else 1
+        merchant_key = codes * self._stride + (key - self._key_offset)
+        order = np.argsort(merchant_key, kind="stable")
+
+        self.merchants_df = merchants_df
+        self.n_merchants = len(merchants_df)
+        self._sorted_key = merchant_key[order]
+        # One spare entry, so days_since_last_transaction can index it with no rows
+        self._day = np.append(key[order] // 2, 0)
+        rows = rows[order]
+        codes = codes[order]
+
+        status = transactions_df["status"]
+        success = (status == "SUCCESS").to_numpy()[rows]
+        failed = (status == "FAILED").to_numpy()[rows]
+        cents = np.round(transactions_df["amount"].to_numpy(dtype=np.float64)[rows] * 100).astype(np.int64)
+        method_codes, n_methods = _codes(transactions_df["payment_method"])
+        method_codes = method_codes[rows]
+
+        # First row of each (merchant, method) in key order; COUNT(DISTINCT) skips NULL
+        first_use = np.zeros(len(rows), dtype=bool)
+        for method in range(n_methods):
+            used = np.flatnonzero(method_codes == method)
+            if used.size == 0:   # e.g. a method seen only in TEST rows
+                continue
+            first_use[used[np.r_[True, codes[used][1:] != codes[used][:-1]]]] = True
+
+        def prefix(values):
+            out = np.zeros(len(values) + 1, dtype=np.int64)
+            np.cumsum(values, out=out[1:])
+            return out
+
+        self._success = prefix(success)
+        self._failed = prefix(failed)
+        self._cents = prefix(cents)
+        self._success_cents = prefix(np.where(success, cents, 0))
+        self._methods = prefix(first_use)
+
+        starts, _ = segment_bounds(codes)
+        self._start = np.zeros(self.n_merchants, dtype=np.int64)
+        self._start[codes[starts]] = starts
+        self._end = self._start.copy()
+        self._end[codes[starts]] = np.append(starts[1:], len(codes))[:len(starts)]
+
+        self._signup_day = _ns(merchants_df["signup_timestamp"]) // NS_PER_DAY
+        # SQL has no ORDER BY; the export comes out in merchant_id order
+        self._id_order = np.argsort(id_ranks(merchants_df["merchant_id"]), kind="stable")
+
+    def _rows_upto(self, key):
+        """Per merchant, the end of its rows with half-day key <= key."""
+        targets = np.arange(self.n_merchants, dtype=np.int64) * self._stride + (key - self._key_offset)
+        return np.clip(np.searchsorted(self._sorted_key, targets, side="right"), self._start, self._end)
+
+    def snapshot_arrays(self, day):
+        """Column arrays (merchant row order) and the mask of merchants with observation rows."""
+        upto = self._rows_upto
+        start = self._start
+        observed = upto(2 * day)
+        last_30 = upto(2 * (day - RECENT_DAYS))
+        prev_end = upto(2 * (day - PREV_END_DAYS))
+        prev_start = upto(2 * (day - PREV_START_DAYS) - 1)
+        future = upto(2 * (day + LABEL_DAYS))
+
+        total = observed - start
+        present = total > 0
+        count = np.maximum(total, 1)
+        last_cents = self._cents[observed] - self._cents[last_30]
+        prev_cents = self._cents[prev_end] - self._cents[prev_start]
+
+        return present, {
+            "total_transactions": total,
+            "total_volume_processed": (self._success_cents[observed] - self._success_cents[start]) / 100,
+            # AVG over DECIMAL(18, 2) and over 1.0 / 0.0 keeps 6 decimals, cut toward zero
+            "avg_transaction_amount": sql_truncated_ratio(self._cents[observed] - self._cents[start], 100 * count),
+            "successful_transaction_rate": sql_truncated_ratio(self._success[observed] - self._success[start], count),
+            "failure_rate": sql_truncated_ratio(self._failed[observed] - self._failed[start], count),
+            "days_since_last_transaction": day - self._day[np.maximum(observed - 1, 0)],
+            "txns_last_30d": observed - last_30,
+            "txns_prev_30d": prev_end - prev_start,
+            "volume_last_30d": last_cents / 100,
+            "volume_prev_30d": prev_cents / 100,
+            "volume_change_pct_30d": np.where(
+                prev_cents == 0, np.nan, sql_truncated_ratio(last_cents - prev_cents, np.maximum(prev_cents, 1))
+            ),
+            "num_payment_methods_used": self._methods[observed] - self._methods[start],
+            "merchant_age_days": day - self._signup_day,
+            "churn_flag": self._success[future] == self._success[observed],
+        }
+
+    def snapshot(self, observation_end):
+        """Churn model rows for one @observation_end, typed like CHURN_MODEL_SCHEMA."""
+        day = observation_day(observation_end)
+        present, columns = self.snapshot_arrays(day)
+        rows = self._id_order[present[self._id_order]]
+        df = pd.DataFrame({
+            "merchant_id": np.asarray(self.merchants_df["merchant_id"], dtype=object)[rows],
+            **{name: values[rows] for name, values in columns.items()},
+            "business_type": pd.Categorical(np.asarray(self.merchants_df["business_type"], dtype=object)[rows]),
+        })[CHURN_MODEL_COLUMNS]
+        return df.astype({
+            "total_transactions": np.int32, "successful_transaction_rate": np.float32,
+            "failure_rate": np.float32, "days_since_last_transaction": np.int32,
+            "txns_last_30d": np.int32, "txns_prev_30d": np.int32, "volume_change_pct_30d": np.float32,
+            "num_payment_methods_used": np.int32, "merchant_age_days": np.int32, "churn_flag": np.int8,
+        })
+
+    def snapshots(self, observation_ends):
+        """{observation_end: snapshot DataFrame} for many dates over the same prefix sums."""
+        return {pd.Timestamp(end): self.snapshot(end) for end in observation_ends}
+
+
+def export_observation_end(export_df, merchants_df):
+    """The @observation_end an export was run with, recovered from merchant_age_days."""
+    signup = merchants_df.set_index("merchant_id")["signup_timestamp"].reindex(export_df["merchant_id"])
+    ends = signup.dt.normalize().to_numpy() + pd.to_timedelta(export_df["merchant_age_days"].to_numpy(), unit="D")
+    return pd.Timestamp(pd.Series(ends).mode()[0])
+
+
+def build_churn_features(transactions_df, merchants_df, observation_end=None):
+    """
+    The churn model rows Analytics.sql produces for one @observation_end
+    (default DATEADD(day, -30, MAX(transaction_timestamp))), value for value.
+    """
+    if observation_end is None:
+        observation_end = default_observation_end(transactions_df)
+    return ChurnSnapshots(transactions_df, merchants_df).snapshot(observation_end)
+
+
+def compare_with_export(features_df, export_df):
+    """Mismatching rows per column against an SSMS export (matched on merchant_id); NULL equals NULL."""
+    merged = features_df.merge(export_df, on="merchant_id", how="outer", suffixes=("", "_sql"), indicator=True)
+    report = {"rows": len(features_df), "export_rows": len(export_df), "matched": int((merged["_merge"] == "both").sum())}
+    for column in CHURN_MODEL_COLUMNS[1:]:
+        left, right = merged[column], merged[f"{column}_sql"]
+        if column == "business_type":
+            left, right = left.astype(object), right.astype(object)
+        same = (left == right) | (left.isna() & right.isna())
+        report[column] = int((~same).sum())
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from Data_Loader import load_dataset
+
+    parser = argparse.ArgumentParser(description="Churn snapshot builder: parity with the export and timings")
+    parser.add_argument("--simulate", type=int, default=None, help="also time this many simulated merchants")
+    args = parser.parse_args()
+
+    transactions_df = load_dataset("transactions")
+    merchants_df = load_dataset("merchants")
+
+    started = time.perf_counter()
+    builder = ChurnSnapshots(transactions_df, merchants_df)
+    built = time.perf_counter() - started
+    end = default_observation_end(transactions_df)
+    ends = pd.date_range(end - pd.Timedelta(days=180), end, freq="7D")
+    started = time.perf_counter()
+    builder.snapshots(ends)
+    print(f"sort + prefix sums {built * 1000:.1f}ms, {len(ends)} snapshots {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    # Churn model.csv was exported while the data ended earlier, so compare at its own date
+    export = load_dataset("churn_model")
+    end = export_observation_end(export, merchants_df)
+    print(f"@observation_end {end.date()} mismatching rows per column:")
+    for column, value in compare_with_export(build_churn_features(transactions_df, merchants_df, end), export).items():
+        print(f"  {column:<28} {value}")
+
+    if args.simulate:
+        from Transaction_Simulator import simulate
+
+        merchants_df, _, transactions_df = simulate(args.simulate)
+        started = time.perf_counter()
+        features_df = build_churn_features(transactions_df, merchants_df)
+        print(f"{len(transactions_df):,} simulated transactions -> {features_df.shape} "
+              f"in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,528 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+The Churn_Prediction.py model as importable pieces.
+
+The notebook drops the id / target / volume_change_pct_30d columns, scales
+the numeric features, one-hot encodes business_type and fits a 300-tree
+RandomForestClassifier in one Pipeline. The same pipeline, the vectorized
+Churn_Risk_Level bands and the save / load of the fitted pipeline are here
+so scoring jobs can reuse the notebook's model without retraining.
+
+The pipeline is saved uncompressed to models/churn/rfc_pipeline.pkl, so
+joblib can memory-map the tree arrays on load instead of copying them.
+
+ChurnForest is the same fitted pipeline compiled for lookups: the scaler's
+mean / scale, a category -> column map for the one-hot encoder and every
+tree packed into a few contiguous arrays. Scoring one merchant is then a
+handful of array operations instead of a ColumnTransformer pass and 300
+per-tree predict calls. It is saved next to the pipeline as
+churn_forest.npz, which loads without unpickling sklearn objects.
+
+ChurnSplits is the part of it that needs no compiled trees: the
+preprocessing and every split point, read straight off the fitted trees.
+Its fingerprint() hashes which side of every split point each feature
+falls on, which is what Churn_Scoring's incremental rescoring compares.
+"""
+
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from Data_Loader import CHURN_MODEL_SCHEMA
+
+
+ID_COLUMN = "merchant_id"
+TARGET = "churn_flag"
+DROP_COLUMNS = [ID_COLUMN, "volume_change_pct_30d", TARGET]
+CHURN_FEATURES = [c for c in CHURN_MODEL_SCHEMA if c not in DROP_COLUMNS]
+
+RF_PARAMS = {
+    "n_estimators": 300,
+    "max_depth": None,
+    "min_samples_leaf": 5,
+    "class_weight": "balanced",
+    "random_state": 42,
+    "n_jobs": -1,
+}
+
+# Churn_Risk_Level: probability >= 0.66 High, >= 0.33 Medium, else Low
+RISK_THRESHOLDS = [0.33, 0.66]
+RISK_LEVELS = ["Low Risk", "Medium Risk", "High Risk"]
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models", "churn")
+PIPELINE_PATH = os.path.join(MODEL_DIR, "rfc_pipeline.pkl")
+FOREST_PATH = os.path.join(MODEL_DIR, "churn_forest.npz")
+FOREST_CHUNK = 256   # rows per block, so the splits x trees x rows work arrays stay in cache
+
+
+def churn_features(df):
+    """The model's input columns (X) from a churn snapshot."""
+    return df[CHURN_FEATURES]
+
+
+def build_preprocessor(X):
+    """Unfitted scaler + one-hot ColumnTransformer for the columns of X."""
+    num_cols = X.select_dtypes(include="number").columns
+    cat_cols = X.select_dtypes(include=["object", "category"]).columns
+    return ColumnTransformer(
+        transformers=[
+            ("num", StandardScaler(), num_cols),
+            ("cat", OneHotEncoder(handle_unknown="ignore"), cat_cols),
+        ]
+    )
+
+
+def build_pipeline(X, **rf_params):
+    """Unfitted preprocessor + RandomForestClassifier pipeline for the columns of X."""
+    return Pipeline([
+        ("preprocessor", build_preprocessor(X)),
+        ("classifier", RandomForestClassifier(**{**RF_PARAMS, **rf_params})),
+    ])
+
+
+def risk_levels(probability):
+    """Churn_Risk_Level per probability, as an object array of labels."""
+    bands = np.searchsorted(RISK_THRESHOLDS, np.asarray(probability, dtype=np.float64), side="right")
+    return np.asarray(RISK_LEVELS, dtype=object)[bands]
+
+
+def save_pipeline(pipeline, path=PIPELINE_PATH):
+    """Uncompressed joblib dump, so load_pipeline can memory-map it."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    joblib.dump(pipeline, path)
+    return path
+
+
+def load_pipeline(path=PIPELINE_PATH, mmap=True):
+    """The fitted pipeline; with mmap the tree node arrays stay in the page cache."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No saved churn pipeline at {path}; run Churn_Prediction.py first")
+    return joblib.load(path, mmap_mode="r" if mmap else None)
+
+
+def churn_probability(pipeline, X):
+    return pipeline.predict_proba(X)[:, 1]
+
+
+# ---------- COMPILED FOREST ----------
+
+def _tree_slots(tree, class_index, leaf_dtype):
+    """
+    Internal nodes of one tree as (feature, threshold, clear mask, NaN goes right)
+    and its leaf probabilities, leaves numbered left to right.
+
+    Going right at a node rules out every leaf of its left subtree, so a row's
+    leaf is the lowest bit left set after AND-ing the masks of the nodes it
+    goes right at, whatever order the nodes are visited in.
+    """
+    left, right = tree.children_left, tree.children_right
+    order, stack = [], [0]
+    while stack:
+        node = stack.pop()
+        if left[node] == -1:
+            order.append(node)
+        else:
+            stack.extend((right[node], left[node]))
+    position = np.full(tree.node_count, -1)
+    position[order] = np.arange(len(order))
+
+    # Nodes are numbered parent first, so children are done before their parent
+    first, last = position.copy(), position.copy()
+    for node in range(tree.node_count - 1, -1, -1):
+        if left[node] != -1:
+            first[node], last[node] = first[left[node]], last[right[node]]
+
+    full = (1 << (8 * np.dtype(leaf_dtype).itemsize)) - 1
+    internal = np.flatnonzero(left != -1)
+    # Python ints: a 64-leaf mask does not fit numpy's signed int64
+    masks = []
+    for node in internal:
+        low, high = int(first[left[node]]), int(last[left[node]])
+        masks.append(full & ~(((1 << (high - low + 1)) - 1) << low))
+    missing_left = np.asarray(getattr(tree, "missing_go_to_left", np.ones(tree.node_count)), dtype=bool)
+
+    counts = tree.value[order, 0, :]
+    return (tree.feature[internal], tree.threshold[internal], np.array(masks, dtype=leaf_dtype),
+            ~missing_left[internal], counts[:, class_index] / counts.sum(axis=1))
+
+
+def _tree_nodes(tree, class_index):
+    """
+    One tree as node arrays (feature, threshold, (left, right) children, NaN
+    goes right, leaf probability). Leaves point to themselves behind an
+    infinite threshold, so extra levels of traversal leave a row in place.
+    Internal nodes can have an infinite threshold too: sklearn's splits that
+    only separate NaN from values.
+    """
+    nodes = np.arange(tree.node_count)
+    leaf = tree.children_left == -1
+    missing_left = np.asarray(getattr(tree, "missing_go_to_left", np.ones(tree.node_count)), dtype=bool)
+    counts = tree.value[:, 0, :]
+    return (
+        np.where(leaf, 0, tree.feature),
+        np.where(leaf, np.inf, tree.threshold),
+        np.column_stack([np.where(leaf, nodes, tree.children_left), np.where(leaf, nodes, tree.children_right)]),
+        ~missing_left & ~leaf,
+        np.where(leaf, counts[:, class_index] / counts.sum(axis=1), 0.0),
+    )
+
+
+def _preprocessing(pipeline):
+    """(num_cols, mean, scale, cat_cols, categories) of a fitted churn pipeline's ColumnTransformer."""
+    transformers = {name: (fitted, list(columns))
+                    for name, fitted, columns in pipeline.named_steps["preprocessor"].transformers_}
+    scaler, num_cols = transformers["num"]
+    encoder, cat_cols = transformers["cat"]
+    return num_cols, scaler.mean_, scaler.scale_, cat_cols, encoder.categories_
+
+
+class ChurnSplits:
+    """
+    A fitted churn pipeline's preprocessing and the sorted split points of
+    its forest per transformed column: enough to fingerprint rows, without
+    compiling the trees.
+
+    Numeric columns come first, scaled as (x - mean) / scale, then one 0/1
+    column per known category, exactly the ColumnTransformer's layout.
+    Unknown categories set no column, like handle_unknown="ignore".
+    """
+
+    def __init__(self, num_cols, mean, scale, cat_cols, categories, cuts):
+        self.num_cols = list(num_cols)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.cat_cols = list(cat_cols)
+        self.categories = [list(values) for values in categories]
+        self.cuts = cuts
+
+        start = len(self.num_cols)
+        self.offsets, self.onehot = [], []
+        for values in self.categories:
+            self.offsets.append(start)
+            self.onehot.append({value: start + i for i, value in enumerate(values)})
+            start += len(values)
+        self.n_features = start
+
+    @staticmethod
+    def _cuts(feature, threshold, n_features):
+        """Sorted unique thresholds per column, from parallel split arrays (inf = no split)."""
+        splits = np.isfinite(threshold)
+        return [np.unique(threshold[splits & (feature == j)]) for j in range(n_features)]
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """Split points read straight off every tree_, for forests of any size."""
+        num_cols, mean, scale, cat_cols, categories = _preprocessing(pipeline)
+        trees = [estimator.tree_ for estimator in pipeline.named_steps["classifier"].estimators_]
+        internal = [tree.children_left != -1 for tree in trees]
+        feature = np.concatenate([tree.feature[split] for tree, split in zip(trees, internal)])
+        threshold = np.concatenate([tree.threshold[split] for tree, split in zip(trees, internal)])
+        n_features = len(num_cols) + sum(len(values) for values in categories)
+        return cls(num_cols, mean, scale, cat_cols, categories, cls._cuts(feature, threshold, n_features))
+
+    def transform(self, X):
+        """Preprocessed float32 matrix for a DataFrame of churn features."""
+        out = np.zeros((len(X), self.n_features), dtype=np.float32)
+        numeric = X[self.num_cols].to_numpy(dtype=np.float64)
+        out[:, :len(self.num_cols)] = (numeric - self.mean) / self.scale
+        for column, values, start in zip(self.cat_cols, self.categories, self.offsets):
+            codes = pd.Categorical(X[column], categories=values).codes
+            rows = np.flatnonzero(codes >= 0)
+            out[rows, start + codes[rows]] = 1.0
+        return out
+
+    def split_bins(self, matrix):
+        """
+        Per row and transformed column, how many of the forest's split points
+        on that column the value is above (-1 for NaN). Rows with equal bins
+        take the same path through every tree, so they score identically.
+        """
+        matrix = np.asarray(matrix, dtype=np.float32)
+        # int16 unless a column of a very wide forest has more cuts than that holds
+        widest = max((len(cuts) for cuts in self.cuts), default=0)
+        bins = np.empty(matrix.shape, dtype=np.int16 if widest < np.iinfo(np.int16).max else np.int32)
+        for j, cuts in enumerate(self.cuts):
+            bins[:, j] = np.searchsorted(cuts, matrix[:, j], side="left")   # x > cut goes right
+        bins[np.isnan(matrix)] = -1
+        return bins
+
+    def fingerprint(self, X):
+        """uint64 per row of a churn feature DataFrame; changes only if the row's score can."""
+        bins = pd.DataFrame(self.split_bins(self.transform(X)), copy=False)
+        return pd.util.hash_pandas_object(bins, index=False).to_numpy()
+
+
+class ChurnForest(ChurnSplits):
+    """
+    A fitted churn pipeline as flat arrays (ChurnSplits plus the trees).
+
+    Forests whose trees all have at most MASK_LEAVES leaves use the
+    "leaf_mask" layout: feature / threshold / mask are (max internal nodes,
+    trees) arrays, padded with never-taken splits, and leaf_value is
+    (trees, max leaves). Every split of every tree is compared at once and
+    each tree's leaf comes out of one bitwise AND reduction, so a batch
+    costs a fixed handful of array operations with no per-level or per-tree
+    loop.
+
+    Wider trees (the notebook's max_depth=None on more than a few hundred
+    merchants) use the "nodes" layout instead: every tree's nodes in one set
+    of arrays starting at roots[t], traversed level by level as
+    Fraud_Model.FlatForest does, until every (tree, row) pair is at a leaf.
+
+    Either way rows are compared as float32 against float64 thresholds and
+    leaf probabilities are summed in tree order, like sklearn.
+    """
+
+    MASK_LEAVES = 64   # one uint64 mask bit per leaf
+    LAYOUTS = {
+        "leaf_mask": ("feature", "threshold", "mask", "missing_right", "leaf_value"),
+        "nodes": ("feature", "threshold", "children", "missing_right", "node_value", "roots"),
+    }
+
+    def __init__(self, num_cols, mean, scale, cat_cols, categories, layout, arrays):
+        self.layout = layout
+        for name in self.LAYOUTS[layout]:
+            setattr(self, name, np.asarray(arrays[name]))
+        self.has_missing = bool(self.missing_right.any())
+        if layout == "leaf_mask":
+            self.n_trees = len(self.leaf_value)
+            self._leaf_offset = (np.arange(self.n_trees) * self.leaf_value.shape[1])[:, None]
+        else:
+            self.n_trees = len(self.roots)
+            # Leaves point to themselves; an infinite threshold alone is not a leaf, since
+            # sklearn's missing-value splits (values left, NaN right) use threshold inf
+            self._internal = self.children[0::2] != np.arange(len(self.feature))
+
+        # Padding splits and leaves have infinite thresholds, so only real splits become cuts
+        n_features = len(num_cols) + sum(len(values) for values in categories)
+        super().__init__(num_cols, mean, scale, cat_cols, categories,
+                         self._cuts(self.feature, self.threshold, n_features))
+
+    @classmethod
+    def from_pipeline(cls, pipeline, class_index=1):
+        trees = [estimator.tree_ for estimator in pipeline.named_steps["classifier"].estimators_]
+        n_leaves = max(tree.n_leaves for tree in trees)
+        if n_leaves > cls.MASK_LEAVES:
+            layout, arrays = "nodes", cls._node_arrays(trees, class_index)
+        else:
+            layout, arrays = "leaf_mask", cls._mask_arrays(trees, class_index, n_leaves)
+        return cls(*_preprocessing(pipeline), layout, arrays)
+
+    @staticmethod
+    def _mask_arrays(trees, class_index, n_leaves):
+        leaf_dtype = next(dtype for dtype in (np.uint8, np.uint16, np.uint32, np.uint64)
+                          if n_leaves <= 8 * np.dtype(dtype).itemsize)
+        slots = [_tree_slots(tree, class_index, leaf_dtype) for tree in trees]
+
+        # Padding splits (x > inf) never go right, so their all-ones mask clears nothing
+        width = max(1, max(len(tree_slots[0]) for tree_slots in slots))
+        feature = np.zeros((width, len(trees)), dtype=np.int32)
+        threshold = np.full((width, len(trees)), np.inf)
+        mask = np.full((width, len(trees)), np.iinfo(leaf_dtype).max, dtype=leaf_dtype)
+        missing_right = np.zeros((width, len(trees)), dtype=bool)
+        leaf_value = np.zeros((len(trees), n_leaves))
+        for t, (tree_feature, tree_threshold, tree_mask, tree_missing, tree_leaves) in enumerate(slots):
+            n = len(tree_feature)
+            feature[:n, t], threshold[:n, t], mask[:n, t], missing_right[:n, t] = (
+                tree_feature, tree_threshold, tree_mask, tree_missing)
+            leaf_value[t, :len(tree_leaves)] = tree_leaves
+        return {"feature": feature, "threshold": threshold, "mask": mask,
+                "missing_right": missing_right, "leaf_value": leaf_value}
+
+    @staticmethod
+    def _node_arrays(trees, class_index):
+        parts = [_tree_nodes(tree, class_index) for tree in trees]
+        roots = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+        return {
+            "feature": np.concatenate([part[0] for part in parts]).astype(np.int32),
+            "threshold": np.concatenate([part[1] for part in parts]).astype(np.float64),
+            "children": np.concatenate([part[2] + root for part, root in zip(parts, roots)]).astype(np.int64).ravel(),
+            "missing_right": np.concatenate([part[3] for part in parts]),
+            "node_value": np.concatenate([part[4] for part in parts]),
+            "roots": roots.astype(np.int64),
+        }
+
+    def probability(self, matrix, chunk=FOREST_CHUNK):
+        """Class probability per row of a transformed matrix."""
+        matrix = np.ascontiguousarray(np.asarray(matrix, dtype=np.float32).T)   # features x rows
+        leaf_sums = self._mask_sums if self.layout == "leaf_mask" else self._node_sums
+        out = np.empty(matrix.shape[1], dtype=np.float64)
+        for start in range(0, len(out), chunk):
+            out[start:start + chunk] = leaf_sums(matrix[:, start:start + chunk])
+        return out / self.n_trees
+
+    def _mask_sums(self, block):
+        x = block[self.feature]                                    # slots x trees x rows
+        go_right = x > self.threshold[:, :, None]
+        if self.has_missing:
+            go_right |= np.isnan(x) & self.missing_right[:, :, None]
+        leaves = np.bitwise_and.reduce(
+            np.where(go_right, self.mask[:, :, None], np.iinfo(self.mask.dtype).max), axis=0
+        )
+        lowest = leaves & (~leaves + 1)
+        leaf = np.frexp(lowest.astype(np.float64))[1] - 1
+        return self.leaf_value.ravel()[leaf + self._leaf_offset].sum(axis=0)
+
+    def _node_sums(self, block):
+        n_rows = block.shape[1]
+        flat = np.ascontiguousarray(block).ravel()
+        node = np.repeat(self.roots, n_rows)                       # (tree, row) pairs, tree-major
+        column = np.tile(np.arange(n_rows), self.n_trees)
+        # Each level only moves the pairs not yet at a leaf, so unbalanced trees
+        # cost their rows' path lengths rather than max_depth for every row
+        active = np.arange(len(node))
+        while len(active):
+            current = node[active]
+            x = flat[self.feature[current] * n_rows + column[active]]
+            go_right = x > self.threshold[current]
+            if self.has_missing:
+                go_right |= np.isnan(x) & self.missing_right[current]
+            current = self.children[2 * current + go_right]
+            node[active] = current
+            active = active[self._internal[current]]
+        return self.node_value[node].reshape(self.n_trees, n_rows).sum(axis=0)
+
+    def predict_proba(self, X):
+        """(n, 2) probabilities, so it can stand in for the pipeline in churn_probability."""
+        churn = self.probability(self.transform(X))
+        return np.column_stack([1.0 - churn, churn])
+
+    def score_one(self, merchant):
+        """Churn probability for one merchant given as a mapping of feature -> value."""
+        row = np.zeros((1, self.n_features), dtype=np.float32)
+        numeric = np.array([merchant[column] for column in self.num_cols], dtype=np.float64)
+        row[0, :len(self.num_cols)] = (numeric - self.mean) / self.scale
+        for column, onehot in zip(self.cat_cols, self.onehot):
+            index = onehot.get(merchant[column])
+            if index is not None:
+                row[0, index] = 1.0
+        return float(self.probability(row)[0])
+
+    def save(self, path=FOREST_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez(
+            path,
+            num_cols=np.array(self.num_cols, dtype=str),
+            scaler_mean=self.mean,
+            scaler_scale=self.scale,
+            cat_cols=np.array(self.cat_cols, dtype=str),
+            categories=np.array([value for values in self.categories for value in values], dtype=str),
+            category_counts=np.array([len(values) for values in self.categories], dtype=np.int64),
+            layout=self.layout,
+            **{name: getattr(self, name) for name in self.LAYOUTS[self.layout]},
+        )
+        return path
+
+    @classmethod
+    def load(cls, path=FOREST_PATH):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No compiled churn forest at {path}; run Churn_Model.py first")
+        with np.load(path) as arrays:
+            bounds = np.cumsum(arrays["category_counts"])[:-1]
+            layout = str(arrays["layout"])
+            return cls(
+                arrays["num_cols"].tolist(), arrays["scaler_mean"], arrays["scaler_scale"],
+                arrays["cat_cols"].tolist(),
+                [values.tolist() for values in np.split(arrays["categories"], bounds)],
+                layout, {name: arrays[name] for name in cls.LAYOUTS[layout]},
+            )
+
+
+# ---------- BENCHMARK ----------
+
+def _latency_us(fn, args, repeat=5):
+    """Median microseconds per call over args."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for arg in args:
+            fn(arg)
+        times.append((time.perf_counter() - started) / len(args))
+    return round(float(np.median(times)) * 1e6, 1)
+
+
+def layout_parity(X, y, rf_params, nan_every=7):
+    """
+    Fit a pipeline with rf_params and compare ChurnForest with it: layout,
+    widest tree and max |difference| on X and on X with every nan_every-th
+    value of the first numeric column set to NaN.
+    """
+    pipeline = build_pipeline(X, **rf_params).fit(X, y)
+    forest = ChurnForest.from_pipeline(pipeline)
+    with_nan = X.copy()
+    with_nan.iloc[::nan_every, 0] = np.nan
+    return {
+        "layout": forest.layout,
+        "max_leaves": int(max(e.tree_.n_leaves for e in pipeline.named_steps["classifier"].estimators_)),
+        "max_diff": float(np.abs(churn_probability(forest, X) - churn_probability(pipeline, X)).max()),
+        "max_diff_nan": float(np.abs(churn_probability(forest, with_nan)
+                                     - churn_probability(pipeline, with_nan)).max()),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from Data_Loader import DATA_DIR, DATASETS, read_csv_typed
+
+    parser = argparse.ArgumentParser(description="Compile the saved churn pipeline and time lookups against it")
+    parser.add_argument("--pipeline", default=PIPELINE_PATH)
+    parser.add_argument("--out", default=FOREST_PATH)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1_000, 100_000])
+    parser.add_argument("--parity-merchants", type=int, default=8_000,
+                        help="simulated merchants for the wider-tree layout checks (0 to skip)")
+    args = parser.parse_args()
+
+    pipeline = load_pipeline(args.pipeline)
+    started = time.perf_counter()
+    ChurnForest.from_pipeline(pipeline).save(args.out)
+    print(f"compile + save: {time.perf_counter() - started:.3f}s -> {args.out}")
+    started = time.perf_counter()
+    forest = ChurnForest.load(args.out)
+    print(f"load: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    X = churn_features(read_csv_typed(os.path.join(DATA_DIR, DATASETS["churn_model"][0]), CHURN_MODEL_SCHEMA).to_pandas())
+    reference = churn_probability(pipeline, X)
+    one = np.array([forest.score_one(row) for row in X.to_dict("records")])
+    print(f"max |flat - pipeline| predict_proba: batch {np.abs(churn_probability(forest, X) - reference).max():.2e}, "
+          f"score_one {np.abs(one - reference).max():.2e}")
+
+    rows = [X.iloc[[i]] for i in range(len(X))]
+    records = X.to_dict("records")
+    print(f"one merchant: pipeline.predict_proba {_latency_us(pipeline.predict_proba, rows[:50], repeat=3):,.1f}us   "
+          f"ChurnForest.predict_proba {_latency_us(forest.predict_proba, rows):,.1f}us   "
+          f"ChurnForest.score_one {_latency_us(forest.score_one, records):,.1f}us")
+
+    for size in args.batch_sizes:
+        batch = X.iloc[np.arange(size) % len(X)].reset_index(drop=True)
+        for name, model in (("pipeline", pipeline), ("flat", forest)):
+            started = time.perf_counter()
+            churn_probability(model, batch)
+            elapsed = time.perf_counter() - started
+            print(f"batch {size:>9,} {name:>8}: {elapsed * 1000:>9.1f}ms ({size / elapsed:>12,.0f} rows/s)")
+
+    if args.parity_merchants:
+        from Churn_Features import build_churn_features
+        from Transaction_Simulator import simulate
+
+        merchants_df, _, transactions_df = simulate(args.parity_merchants)
+        snapshot = build_churn_features(transactions_df, merchants_df)
+        # A fifth of the labels flipped, so the trees have to grow wide, and NaN
+        # in training as well, so the trees learn missing-value splits
+        rng = np.random.default_rng(0)
+        y = np.where(rng.random(len(snapshot)) < 0.2, 1 - snapshot[TARGET], snapshot[TARGET])
+        X = churn_features(snapshot).copy()
+        X.iloc[::5, 0] = np.nan
+        X.iloc[::11, 3] = np.nan
+        # 33-64 leaves is the uint64 mask; more than 64 the nodes layout
+        for params in ({"max_leaf_nodes": 48}, {"max_leaf_nodes": 64}, {"min_samples_leaf": 1}):
+            print(f"parity {params}: {layout_parity(X, y, params)}")
@@ -13,7 +13,12 @@ import seaborn as sns
 # In[27]:
 
 
-df = pd.read_csv('Churn Model.csv')
+# Churn model rows built straight from the transactions, identical to the SQL export.
+# Churn model.csv was exported at 2024-06-25; observation_end=None uses MAX(ts) - 30 days.
+from Churn_Features import build_churn_features
+from Data_Loader import load_dataset
+
+df = build_churn_features(load_dataset('transactions'), load_dataset('merchants'), observation_end='2024-06-25')
 
 
 # In[28]:
@@ -63,8 +68,8 @@ from sklearn.preprocessing import OneHotEncoder, StandardScaler
 # In[36]:
 
 
-num_cols = X_train.select_dtypes(include=['int64', 'float64']).columns
-cat_cols = X_train.select_dtypes(include=['object']).columns
+num_cols = X_train.select_dtypes(include='number').columns
+cat_cols = X_train.select_dtypes(include=['object', 'category']).columns
 
 
 # In[37]:
@@ -138,6 +143,25 @@ print("\nConfusion Matrix:")
 print(confusion_matrix(y_test, rfc_pred))
 
 
+# In[45]:
+
+
+# One random split of one snapshot. Churn_Backtest.py refits on a snapshot per
+# weekly observation date and scores the snapshot 30 days later (ROC-AUC over time)
+# from Churn_Backtest import run_backtest
+# backtest, _ = run_backtest(load_dataset('transactions'), load_dataset('merchants'), workers=4)
+
+
+# In[46]:
+
+
+# Tuning n_estimators / min_samples_leaf / class_weight: Churn_Search.py caches the
+# preprocessed CV folds and halves the candidates per round (results/churn_search.csv)
+# from Churn_Search import search, best_within_budget
+# search_results, _ = search(X, y, workers=4)
+# best_within_budget(search_results, predict_one_ms=10)
+
+
 # In[51]:
 
 
@@ -187,13 +211,15 @@ plt.show()
 # In[56]:
 
 
-import joblib
+# Uncompressed joblib under models/churn, memory-mapped by Churn_Scoring.py
+# for daily scoring without retraining
+from Churn_Model import save_pipeline
 
 
 # In[57]:
 
 
-joblib.dump(rfc_pipeline, 'rf=rfc_pipeline.pkl')
+save_pipeline(rfc_pipeline)
 
 
 # In[59]:
@@ -212,14 +238,10 @@ df['churn_probability'] = all_pred_proba
 # In[66]:
 
 
-def risk_category(prob):
-    if prob >= 0.66:
-        return 'High Risk'
-    elif prob >= 0.33:
-        return 'Medium Risk'
-    else:
-        return 'Low Risk'
-df["Churn_Risk_Level"] = df['churn_probability'].apply(risk_category)
+# >= 0.66 High, >= 0.33 Medium, else Low, binned in one vectorized pass
+from Churn_Model import risk_levels
+
+df["Churn_Risk_Level"] = risk_levels(df['churn_probability'])
 
 
 # In[72]:
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Batch churn scoring with the saved pipeline, without retraining.
+
+Churn_Prediction.py refits the 300-tree RandomForestClassifier pipeline
+every run and scores all merchants in the same process. This entry point
+loads the pipeline once (memory-mapped joblib), streams merchant feature
+rows from a Churn model export (CSV) or Parquet file in CHUNK_ROWS chunks,
+and writes each scored chunk as soon as it is ready (CSV or Parquet, by
+the output extension). Output rows are the input columns plus
+churn_probability and Churn_Risk_Level, binned with one searchsorted.
+
+rescore_file() is the incremental form. Next to the output it keeps
+<output>.state.parquet: merchant_id, churn_probability and a fingerprint of
+the merchant's row taken from ChurnSplits.fingerprint(), i.e. which side
+of each of the forest's split points every feature is on. A merchant is
+rescored only if it is new or its fingerprint changed. Recency features
+such as days_since_last_transaction or txns_last_30d move every day for
+every merchant, but the forest only sees them change when they cross a
+split point, so idle merchants keep their probability until they do.
+Reused probabilities are bit-identical to rescoring, since equal
+fingerprints take the same leaf in every tree. A different pipeline file
+(by content hash) invalidates the whole state.
+
+    python Churn_Scoring.py score [input] [--out results/churn_predictions_with_risk.csv]
+    python Churn_Scoring.py rescore [input] [--out results/churn_predictions_with_risk.csv]
+    python Churn_Scoring.py bench --merchants 1000000 [--changed 0.05]
+"""
+
+import os
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from Churn_Model import (
+    ID_COLUMN,
+    PIPELINE_PATH,
+    ChurnSplits,
+    churn_features,
+    churn_probability,
+    load_pipeline,
+    risk_levels,
+)
+from Data_Loader import CHURN_MODEL_SCHEMA, DATA_DIR, DATASETS, file_hash, iter_table_chunks, read_csv_typed
+
+
+CHUNK_ROWS = 100_000
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "results")
+OUTPUT_PATH = os.path.join(RESULTS_DIR, "churn_predictions_with_risk.csv")
+
+
+class _ChunkWriter:
+    """Appends DataFrame chunks to one CSV (header once) or Parquet file."""
+
+    def __init__(self, path, parquet):
+        self.path = path
+        self.parquet = parquet
+        self._writer = None
+        self._file = None
+
+    def write(self, df):
+        if self.parquet:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            header = self._file is None
+            if header:
+                self._file = open(self.path, "w", newline="")
+            df.to_csv(self._file, header=header, index=False)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def score_chunks(pipeline, chunks):
+    """Yield each chunk (DataFrame) with churn_probability and Churn_Risk_Level added."""
+    for table in chunks:
+        df = table.to_pandas()
+        df["churn_probability"] = churn_probability(pipeline, churn_features(df))
+        df["Churn_Risk_Level"] = risk_levels(df["churn_probability"])
+        yield df
+
+
+def score_file(path, out_path=OUTPUT_PATH, pipeline_path=PIPELINE_PATH, chunk_rows=CHUNK_ROWS, pipeline=None):
+    """Score every merchant row in path into out_path; returns rows and risk level counts."""
+    pipeline = load_pipeline(pipeline_path) if pipeline is None else pipeline
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+
+    rows, levels = 0, {}
+    writer = _ChunkWriter(out_path + ".tmp", parquet=out_path.endswith(".parquet"))
+    try:
+        for df in score_chunks(pipeline, iter_table_chunks(path, CHURN_MODEL_SCHEMA, chunk_rows)):
+            writer.write(df)
+            rows += len(df)
+            for level, count in df["Churn_Risk_Level"].value_counts().items():
+                levels[level] = levels.get(level, 0) + int(count)
+    finally:
+        writer.close()
+    # Readers never see a half-written file
+    os.replace(out_path + ".tmp", out_path)
+    return {"rows": rows, "risk_levels": levels}
+
+
+# ---------- INCREMENTAL ----------
+
+def state_path(out_path):
+    return os.path.splitext(out_path)[0] + ".state.parquet"
+
+
+def load_state(path, pipeline_hash):
+    """Previous run's fingerprints and probabilities indexed by merchant_id, or None if unusable."""
+    if not os.path.exists(path):
+        return None
+    table = pq.read_table(path)
+    if (table.schema.metadata or {}).get(b"pipeline_hash", b"").decode() != pipeline_hash:
+        return None
+    return table.to_pandas().set_index(ID_COLUMN)
+
+
+def save_state(path, merchant_ids, fingerprints, probabilities, pipeline_hash):
+    table = pa.table({
+        ID_COLUMN: pa.array(merchant_ids, type=pa.string()),
+        "fingerprint": pa.array(fingerprints, type=pa.uint64()),
+        "churn_probability": pa.array(probabilities, type=pa.float64()),
+    }).replace_schema_metadata({"pipeline_hash": pipeline_hash})
+    pq.write_table(table, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def rescore_chunks(pipeline, splits, chunks, previous, stats):
+    """
+    Like score_chunks, but reuses previous (load_state) probabilities for
+    merchants whose fingerprint is unchanged. stats collects the new state
+    and the rows / seconds spent.
+    """
+    if previous is not None:
+        known_fingerprint = previous["fingerprint"].to_numpy()
+        known_probability = previous["churn_probability"].to_numpy()
+    for table in chunks:
+        df = table.to_pandas()
+        X = churn_features(df)
+
+        started = time.perf_counter()
+        fingerprint = splits.fingerprint(X)
+        stats["fingerprint_seconds"] += time.perf_counter() - started
+
+        probability = np.empty(len(df), dtype=np.float64)
+        stale = np.ones(len(df), dtype=bool)
+        if previous is None:
+            stats["new"] += len(df)
+        else:
+            position = previous.index.get_indexer(df[ID_COLUMN])
+            known = position >= 0
+            stale[known] = known_fingerprint[position[known]] != fingerprint[known]
+            probability[~stale] = known_probability[position[~stale]]
+            stats["new"] += int((~known).sum())
+
+        started = time.perf_counter()
+        if stale.any():
+            probability[stale] = churn_probability(pipeline, X[stale])
+        stats["score_seconds"] += time.perf_counter() - started
+        stats["rescored"] += int(stale.sum())
+        stats["reused"] += int((~stale).sum())
+
+        stats["merchant_ids"].append(df[ID_COLUMN].to_numpy())
+        stats["fingerprints"].append(fingerprint)
+        stats["probabilities"].append(probability)
+
+        df["churn_probability"] = probability
+        df["Churn_Risk_Level"] = risk_levels(probability)
+        yield df
+
+
+def rescore_file(path, out_path=OUTPUT_PATH, pipeline_path=PIPELINE_PATH, chunk_rows=CHUNK_ROWS, pipeline=None):
+    """
+    Rewrite out_path for the merchants in path, rescoring only new or changed
+    merchants (see module docstring). Returns rows rescored / reused / new /
+    dropped and the seconds spent fingerprinting and scoring.
+    """
+    pipeline = load_pipeline(pipeline_path) if pipeline is None else pipeline
+    splits = ChurnSplits.from_pipeline(pipeline)
+    pipeline_hash = file_hash(pipeline_path)
+    previous = load_state(state_path(out_path), pipeline_hash)
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+
+    stats = {"rescored": 0, "reused": 0, "new": 0, "fingerprint_seconds": 0.0, "score_seconds": 0.0,
+             "merchant_ids": [], "fingerprints": [], "probabilities": []}
+    writer = _ChunkWriter(out_path + ".tmp", parquet=out_path.endswith(".parquet"))
+    try:
+        chunks = iter_table_chunks(path, CHURN_MODEL_SCHEMA, chunk_rows)
+        for df in rescore_chunks(pipeline, splits, chunks, previous, stats):
+            writer.write(df)
+    finally:
+        writer.close()
+    os.replace(out_path + ".tmp", out_path)
+
+    merchant_ids = np.concatenate(stats.pop("merchant_ids"))
+    save_state(state_path(out_path), merchant_ids, np.concatenate(stats.pop("fingerprints")),
+               np.concatenate(stats.pop("probabilities")), pipeline_hash)
+    stats["rows"] = len(merchant_ids)
+    stats["dropped"] = 0 if previous is None else len(previous) - (stats["rows"] - stats["new"])
+    stats["full_rescore"] = previous is None
+    return stats
+
+
+def write_tiled_merchants(source, path, merchants, chunk_rows=CHUNK_ROWS):
+    """Parquet file of merchants rows, repeating source with the row number appended to merchant_id."""
+    base = read_csv_typed(source, CHURN_MODEL_SCHEMA)
+    writer = pq.ParquetWriter(path, base.schema)
+    try:
+        for start in range(0, merchants, chunk_rows):
+            rows = np.arange(start, min(start + chunk_rows, merchants))
+            part = base.take(rows % base.num_rows)
+            ids = pc.binary_join_element_wise(part.column("merchant_id"), pa.array(rows.astype(str)), "_")
+            writer.write_table(part.set_column(0, "merchant_id", ids))
+    finally:
+        writer.close()
+    return path
+
+
+def write_next_day(path, out_path, changed, seed=0):
+    """
+    Copy of a merchant file one day later: every merchant is a day more
+    idle, and a changed fraction had one new transaction today.
+    """
+    table = pq.read_table(path)
+    df = table.to_pandas()
+    active = np.random.default_rng(seed).random(len(df)) < changed
+    amount = df["avg_transaction_amount"].to_numpy()
+
+    df["days_since_last_transaction"] = np.where(active, 0, df["days_since_last_transaction"] + 1)
+    for column in ("total_transactions", "txns_last_30d"):
+        df[column] = df[column] + active
+    for column in ("total_volume_processed", "volume_last_30d"):
+        df[column] = df[column] + np.where(active, amount, 0.0)
+    pq.write_table(pa.Table.from_pandas(df, schema=table.schema, preserve_index=False), out_path)
+    return out_path
+
+
+if __name__ == "__main__":
+    import argparse
+    import resource
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Score merchants with the saved churn pipeline")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    score = sub.add_parser("score", help="score one file")
+    score.add_argument("path", nargs="?", default=os.path.join(DATA_DIR, DATASETS["churn_model"][0]))
+    score.add_argument("--out", default=OUTPUT_PATH)
+    score.add_argument("--pipeline", default=PIPELINE_PATH)
+    score.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+
+    rescore = sub.add_parser("rescore", help="score one file, reusing unchanged merchants from the last run")
+    rescore.add_argument("path", nargs="?", default=os.path.join(DATA_DIR, DATASETS["churn_model"][0]))
+    rescore.add_argument("--out", default=OUTPUT_PATH)
+    rescore.add_argument("--pipeline", default=PIPELINE_PATH)
+    rescore.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+
+    bench = sub.add_parser("bench", help="load + score time for a tiled merchant file")
+    bench.add_argument("--merchants", type=int, default=1_000_000)
+    bench.add_argument("--pipeline", default=PIPELINE_PATH)
+    bench.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    bench.add_argument("--changed", type=float, default=None,
+                       help="instead, time a full vs incremental rescore of the next day with this fraction active")
+    args = parser.parse_args()
+
+    if args.command == "score":
+        started = time.perf_counter()
+        result = score_file(args.path, args.out, args.pipeline, args.chunk_rows)
+        print(f"{result['rows']:,} merchants scored in {time.perf_counter() - started:.2f}s -> {args.out}")
+        print(result["risk_levels"])
+    elif args.command == "rescore":
+        started = time.perf_counter()
+        result = rescore_file(args.path, args.out, args.pipeline, args.chunk_rows)
+        print(f"{result['rows']:,} merchants in {time.perf_counter() - started:.2f}s -> {args.out}")
+        print({name: round(value, 3) if isinstance(value, float) else value for name, value in result.items()})
+    elif args.changed is not None:
+        source = os.path.join(DATA_DIR, DATASETS["churn_model"][0])
+        pipeline = load_pipeline(args.pipeline)
+        with tempfile.TemporaryDirectory() as tmp:
+            today = write_tiled_merchants(source, os.path.join(tmp, "today.parquet"), args.merchants)
+            tomorrow = write_next_day(today, os.path.join(tmp, "tomorrow.parquet"), args.changed)
+            out = os.path.join(tmp, "scores.parquet")
+
+            def timed(fn, *fn_args):
+                started = time.perf_counter()
+                result = fn(*fn_args, pipeline_path=args.pipeline, chunk_rows=args.chunk_rows, pipeline=pipeline)
+                return result, time.perf_counter() - started
+
+            _, first = timed(rescore_file, today, out)
+            print(f"day 0, no state: {first:.2f}s")
+            result, incremental = timed(rescore_file, tomorrow, out)
+            _, full = timed(score_file, tomorrow, os.path.join(tmp, "full.parquet"))
+
+            same = pq.read_table(out).equals(pq.read_table(os.path.join(tmp, "full.parquet")))
+            print(f"day 1: {result['rescored']:,} of {result['rows']:,} merchants rescored "
+                  f"({result['reused']:,} reused, {result['new']:,} new, {result['dropped']:,} dropped)")
+            print(f"day 1: incremental {incremental:.2f}s (fingerprint {result['fingerprint_seconds']:.2f}s, "
+                  f"score {result['score_seconds']:.2f}s) vs full {full:.2f}s, "
+                  f"saved {full - incremental:.2f}s; output identical to full: {same}")
+    else:
+        source = os.path.join(DATA_DIR, DATASETS["churn_model"][0])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write_tiled_merchants(source, os.path.join(tmp, "merchants.parquet"), args.merchants)
+
+            started = time.perf_counter()
+            pipeline = load_pipeline(args.pipeline)
+            loaded = time.perf_counter() - started
+
+            for out in ("scores.parquet", "scores.csv"):
+                started = time.perf_counter()
+                result = score_file(path, os.path.join(tmp, out), chunk_rows=args.chunk_rows, pipeline=pipeline)
+                elapsed = time.perf_counter() - started
+                print(f"{result['rows']:,} merchants -> {out}: {elapsed:.2f}s "
+                      f"({result['rows'] / elapsed:,.0f} rows/s)")
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"pipeline load (mmap): {loaded * 1000:.1f}ms, peak RSS {peak:.0f}MB")
+            print(result["risk_levels"])
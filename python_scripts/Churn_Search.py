@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Hyperparameter search for the churn RandomForest.
+
+Tuning Churn_Prediction.py by hand means rerunning the notebook per
+setting, and refitting the ColumnTransformer each time. Here:
+
+1. Stratified CV folds are preprocessed once. The preprocessor is fitted on
+   each fold's training rows only, and the float32 matrices are written
+   as .npy files under models/churn/preprocessed/<data hash>-<splits>-<seed>,
+   next to the fitted preprocessor and one raw test row. The same data,
+   splits and seed reuse the directory on later runs.
+2. Pool workers memory-map those files, so a task carries only
+   (fold, parameters). At most 2 * workers tasks are in flight.
+3. Successive halving over folds: every candidate is scored on the first
+   fold, the best 1 / factor go on to more folds, and so on until the
+   survivors have all n_splits folds. Hopeless settings stop after a
+   single fit.
+
+Each candidate's row in the results table has mean / std ROC-AUC over the
+folds it reached, its mean fit time, batch predict time per 1,000 rows
+(model only, on preprocessed rows) and single-row predict latency. The
+single-row figure covers the whole serving path, one raw merchant row
+through the fitted preprocessor and the forest, so a setting can be picked
+against a per-merchant latency budget (best_within_budget).
+"""
+
+import hashlib
+import itertools
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+
+from Churn_Model import DROP_COLUMNS, MODEL_DIR, RF_PARAMS, TARGET, build_preprocessor
+
+
+SEARCH_SPACE = {
+    "n_estimators": [100, 300, 500],
+    "min_samples_leaf": [1, 3, 5, 10],
+    "class_weight": [None, "balanced", "balanced_subsample"],
+}
+
+N_SPLITS = 5
+HALVING_FACTOR = 3
+SEED = 101
+LATENCY_REPEATS = 5
+CACHE_FORMAT = 2       # bump when the files in a fold directory change
+
+CACHE_DIR = os.path.join(MODEL_DIR, "preprocessed")
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "results", "churn_search.csv")
+
+
+# ---------- CACHED FOLDS ----------
+
+def data_hash(X, y):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(",".join(map(str, X.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    digest.update(np.asarray(y, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def cached_folds(X, y, n_splits=N_SPLITS, seed=SEED, cache_dir=CACHE_DIR):
+    """
+    Directory of fold{k}_{X,y}_{train,test}.npy and fold{k}_serving.joblib
+    (fitted preprocessor, one raw test row) for these rows, preprocessing
+    only on a cache miss. Returns (directory, built).
+    """
+    directory = os.path.join(cache_dir, f"{data_hash(X, y)}-{n_splits}-{seed}-v{CACHE_FORMAT}")
+    if os.path.isdir(directory):
+        return directory, False
+
+    partial = directory + ".tmp"
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    y = np.asarray(y, dtype=np.int8)
+    folds = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed).split(X, y)
+    for fold, (train, test) in enumerate(folds):
+        preprocessor = build_preprocessor(X).fit(X.iloc[train])
+        # RandomForest casts to float32 anyway, so nothing changes by storing float32
+        arrays = {
+            "X_train": preprocessor.transform(X.iloc[train]),
+            "X_test": preprocessor.transform(X.iloc[test]),
+            "y_train": y[train],
+            "y_test": y[test],
+        }
+        for name, values in arrays.items():
+            dtype = np.float32 if name.startswith("X") else np.int8
+            np.save(os.path.join(partial, f"fold{fold}_{name}.npy"), np.asarray(values, dtype=dtype))
+        joblib.dump((preprocessor, X.iloc[test[:1]]), os.path.join(partial, f"fold{fold}_serving.joblib"))
+    # A complete directory appears at once, so readers never see a partial cache
+    os.replace(partial, directory)
+    return directory, True
+
+
+def _load_fold(directory, fold):
+    return {
+        name: np.load(os.path.join(directory, f"fold{fold}_{name}.npy"), mmap_mode="r")
+        for name in ("X_train", "X_test", "y_train", "y_test")
+    }
+
+
+# ---------- CANDIDATES ----------
+
+def candidates(space=SEARCH_SPACE):
+    """Every combination of the search space, as parameter dicts."""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+def evaluate_fold(directory, fold, params):
+    """Fit one candidate on one cached fold; ROC-AUC and timings."""
+    arrays = _load_fold(directory, fold)
+    model = RandomForestClassifier(**{**RF_PARAMS, **params, "n_jobs": 1})
+
+    started = time.perf_counter()
+    model.fit(arrays["X_train"], arrays["y_train"])
+    fit_seconds = time.perf_counter() - started
+
+    X_test = np.asarray(arrays["X_test"])
+    started = time.perf_counter()
+    probability = model.predict_proba(X_test)[:, 1]
+    predict_seconds = time.perf_counter() - started
+
+    # Single-row latency as served: raw row -> fitted preprocessor -> forest
+    preprocessor, one_row = joblib.load(os.path.join(directory, f"fold{fold}_serving.joblib"))
+    latencies = []
+    for _ in range(LATENCY_REPEATS):
+        started = time.perf_counter()
+        model.predict_proba(preprocessor.transform(one_row))
+        latencies.append(time.perf_counter() - started)
+
+    return {
+        "fold": fold,
+        "roc_auc": roc_auc_score(arrays["y_test"], probability),
+        "fit_seconds": fit_seconds,
+        "predict_ms_per_1k": predict_seconds * 1000 * 1000 / len(X_test),
+        "predict_one_ms": float(np.median(latencies)) * 1000,
+    }
+
+
+def _evaluate(task):
+    index, directory, fold, params = task
+    return index, evaluate_fold(directory, fold, params)
+
+
+def _run_tasks(pool, tasks, workers):
+    """Results in submission order; at most 2 * workers tasks in flight."""
+    if pool is None:
+        yield from map(_evaluate, tasks)
+        return
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(_evaluate, task))
+        if len(pending) >= 2 * workers:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+# ---------- SEARCH ----------
+
+def fold_schedule(n_splits=N_SPLITS, factor=HALVING_FACTOR):
+    """Folds each round reaches: 1, factor, factor ** 2, ... ending at n_splits."""
+    schedule, folds = [], 1
+    while folds < n_splits:
+        schedule.append(folds)
+        folds *= factor
+    return schedule + [n_splits]
+
+
+def search(X, y, space=SEARCH_SPACE, n_splits=N_SPLITS, factor=HALVING_FACTOR, workers=1, halving=True,
+           seed=SEED, cache_dir=CACHE_DIR):
+    """
+    Successive-halving CV search (every candidate on every fold without
+    halving). Returns the results table, best first, and run info.
+    """
+    started = time.perf_counter()
+    directory, built = cached_folds(X, y, n_splits, seed, cache_dir)
+    info = {"cache": directory, "cache_built": built, "preprocess_seconds": time.perf_counter() - started}
+
+    params = candidates(space)
+    folds = [[] for _ in params]
+    eliminated = [None] * len(params)
+    alive = list(range(len(params)))
+    schedule = fold_schedule(n_splits, factor) if halving else [n_splits]
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    started = time.perf_counter()
+    try:
+        for round_number, reach in enumerate(schedule):
+            tasks = [(i, directory, fold, params[i]) for i in alive for fold in range(len(folds[i]), reach)]
+            for i, result in _run_tasks(pool, tasks, workers):
+                folds[i].append(result)
+            if reach == n_splits:
+                break
+            # Keep the best 1 / factor by mean AUC; cheaper fits win ties
+            ranked = sorted(alive, key=lambda i: (-np.mean([r["roc_auc"] for r in folds[i]]),
+                                                  np.mean([r["fit_seconds"] for r in folds[i]])))
+            keep = max(1, -(-len(alive) // factor))
+            for i in ranked[keep:]:
+                eliminated[i] = round_number
+            alive = ranked[:keep]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    info["search_seconds"] = time.perf_counter() - started
+    info["fits"] = sum(len(f) for f in folds)
+
+    rows = []
+    for i, candidate in enumerate(params):
+        results = pd.DataFrame(folds[i])
+        rows.append({
+            **{name: str(value) if value is None else value for name, value in candidate.items()},
+            "folds": len(results),
+            "roc_auc": results["roc_auc"].mean(),
+            "roc_auc_std": results["roc_auc"].std(ddof=0),
+            "fit_seconds": results["fit_seconds"].mean(),
+            "predict_ms_per_1k": results["predict_ms_per_1k"].mean(),
+            "predict_one_ms": results["predict_one_ms"].median(),
+            "eliminated_round": eliminated[i],
+        })
+    table = pd.DataFrame(rows).astype({"eliminated_round": "Int64"})
+    table = table.sort_values(["folds", "roc_auc", "fit_seconds"], ascending=[False, False, True], kind="stable")
+    return table.reset_index(drop=True), info
+
+
+def best_within_budget(table, predict_one_ms=None, fit_seconds=None):
+    """The highest-AUC fully evaluated candidate within the latency budgets, or None."""
+    finalists = table[table["folds"] == table["folds"].max()]
+    if predict_one_ms is not None:
+        finalists = finalists[finalists["predict_one_ms"] <= predict_one_ms]
+    if fit_seconds is not None:
+        finalists = finalists[finalists["fit_seconds"] <= fit_seconds]
+    return None if finalists.empty else finalists.iloc[0]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from Data_Loader import load_dataset
+
+    parser = argparse.ArgumentParser(description="Cached-preprocessing, successive-halving churn model search")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--splits", type=int, default=N_SPLITS)
+    parser.add_argument("--factor", type=int, default=HALVING_FACTOR)
+    parser.add_argument("--full", action="store_true", help="also run every candidate on every fold, for comparison")
+    parser.add_argument("--budget-ms", type=float, default=None, help="single-row latency budget, preprocessing included")
+    parser.add_argument("--out", default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    df = load_dataset("churn_model")
+    X, y = df.drop(DROP_COLUMNS, axis=1), df[TARGET]
+
+    runs = [("halving", True)] + ([("full grid", False)] if args.full else [])
+    tables = {}
+    for name, halving in runs:
+        table, info = search(X, y, n_splits=args.splits, factor=args.factor, workers=args.workers, halving=halving)
+        print(f"{name}: {info['fits']} fits in {info['search_seconds']:.1f}s with {args.workers} workers; "
+              f"preprocessing {'built' if info['cache_built'] else 'cached'} in {info['preprocess_seconds'] * 1000:.0f}ms")
+        if halving:
+            os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+            table.to_csv(args.out, index=False)
+            print(table.head(12).round(4).to_string(index=False))
+        print(f"{name} best: {table.iloc[0][list(SEARCH_SPACE)].to_dict()} ROC-AUC {table.iloc[0]['roc_auc']:.4f}")
+        tables[name] = table
+
+    if args.budget_ms is not None:
+        best = best_within_budget(tables["halving"], predict_one_ms=args.budget_ms)
+        print(f"best within {args.budget_ms}ms per merchant: "
+              f"{None if best is None else best[list(SEARCH_SPACE) + ['roc_auc', 'predict_one_ms']].to_dict()}")
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Typed reader and columnar cache for the SSMS CSV exports.
+
+The exports carry a UTF-8 BOM, literal NULL strings and DATETIME2 values
+with 7 fractional digits ("2024-02-29 00:00:00.0000000"), which makes a
+plain pd.read_csv fall back to object columns. load_dataset() reads them
+with explicit schemas matching Tables.sql / Analytics.sql:
+
+- environment / status / payment_method / ... as categoricals
+- int32 counts, int8 flags, float32 rates; money stays float64
+- DATETIME2 parsed natively by the Arrow CSV reader
+
+The parsed table is cached as uncompressed Feather next to the data, keyed
+on a hash of the source file, so the next load is a memory-mapped read with
+no parsing. Editing or re-exporting the CSV changes the hash and rebuilds.
+"""
+
+import hashlib
+import os
+
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.feather as feather
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+CACHE_DIR = os.path.join(DATA_DIR, ".cache")
+
+NULL_VALUES = ["NULL", ""]
+BLOCK_SIZE = 1 << 24   # bytes of CSV parsed per streamed batch
+
+ID = pa.string()
+TIMESTAMP = pa.timestamp("ns")
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+MONEY = pa.float64()
+RATE = pa.float32()
+COUNT = pa.int32()
+FLAG = pa.int8()
+
+
+# ---------- SCHEMAS ----------
+
+MERCHANTS_SCHEMA = {
+    "merchant_id": ID,
+    "signup_timestamp": TIMESTAMP,
+    "country": CATEGORY,
+    "industry": CATEGORY,
+    "business_type": CATEGORY,
+    "signup_channel": CATEGORY,
+}
+
+API_KEYS_SCHEMA = {
+    "api_key_id": ID,
+    "merchant_id": ID,
+    "created_timestamp": TIMESTAMP,
+    "environment": CATEGORY,
+    "key_type": CATEGORY,
+}
+
+TRANSACTIONS_SCHEMA = {
+    "transaction_id": ID,
+    "merchant_id": ID,
+    "transaction_timestamp": TIMESTAMP,
+    "environment": CATEGORY,
+    "status": CATEGORY,
+    "amount": MONEY,
+    "currency": CATEGORY,
+    "payment_method": CATEGORY,
+    "failure_reason": CATEGORY,
+}
+
+MERCHANT_ONBOARDING_SCHEMA = {
+    "merchant_id": ID,
+    "signup_timestamp": TIMESTAMP,
+    "first_test_txn_timestamp": TIMESTAMP,
+    "first_live_txn_timestamp": TIMESTAMP,
+    "is_activated": FLAG,
+    "days_signup_to_test": RATE,   # NULL when never tested
+    "days_signup_to_live": RATE,
+    "days_test_to_live": RATE,
+}
+
+FRAUD_MODEL_SCHEMA = {
+    "transaction_id": ID,
+    "merchant_id": ID,
+    "transaction_timestamp": TIMESTAMP,
+    "transaction_amount": MONEY,
+    "merchant_avg_amount": MONEY,
+    "merchant_std_amount": MONEY,
+    "hour_of_day": FLAG,
+    "is_weekend": FLAG,
+    "time_since_last_tx_sec": pa.float64(),   # NULL on a merchant's first txn
+    "merchant_age_days": COUNT,
+    "is_early_lifecycle_tx": FLAG,
+    "payment_method": CATEGORY,
+    "merchant_failure_rate_7d": RATE,
+}
+
+CHURN_MODEL_SCHEMA = {
+    "merchant_id": ID,
+    "total_transactions": COUNT,
+    "total_volume_processed": MONEY,
+    "avg_transaction_amount": MONEY,
+    "successful_transaction_rate": RATE,
+    "failure_rate": RATE,
+    "days_since_last_transaction": COUNT,
+    "txns_last_30d": COUNT,
+    "txns_prev_30d": COUNT,
+    "volume_last_30d": MONEY,
+    "volume_prev_30d": MONEY,
+    "volume_change_pct_30d": RATE,
+    "num_payment_methods_used": COUNT,
+    "merchant_age_days": COUNT,
+    "business_type": CATEGORY,
+    "churn_flag": FLAG,
+}
+
+MERCHANT_SEGMENTATION_SCHEMA = {
+    "merchant_id": ID,
+    "total_transaction_volume": MONEY,
+    "avg_transaction_size": MONEY,
+    "transaction_frequency": COUNT,
+    "avg_monthly_transactions": RATE,
+    "payment_method_diversity": COUNT,
+    "success_rate": RATE,
+    "merchant_age_days": COUNT,
+}
+
+DATASETS = {
+    "merchants": (os.path.join("raw", "merchants.csv"), MERCHANTS_SCHEMA),
+    "api_keys": (os.path.join("raw", "api keys.csv"), API_KEYS_SCHEMA),
+    "transactions": (os.path.join("raw", "transactions.csv"), TRANSACTIONS_SCHEMA),
+    "merchant_onboarding": (os.path.join("raw", "merchant onboarding.csv"), MERCHANT_ONBOARDING_SCHEMA),
+    "fraud_model": (os.path.join("processed", "Fraud Model.csv"), FRAUD_MODEL_SCHEMA),
+    "churn_model": (os.path.join("processed", "Churn model.csv"), CHURN_MODEL_SCHEMA),
+    "merchant_segmentation": (os.path.join("processed", "Merchant Segmentation.csv"), MERCHANT_SEGMENTATION_SCHEMA),
+}
+
+
+# ---------- READING ----------
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_csv_typed(path, schema):
+    """Parse an SSMS export with the given {column: arrow type} schema into an Arrow table."""
+    # DATETIME2 carries 7 fractional digits; Arrow's ISO-8601 parser
+    # handles them natively, so timestamps never go through object strings
+    return pv.read_csv(
+        path,
+        read_options=pv.ReadOptions(use_threads=True),
+        convert_options=pv.ConvertOptions(
+            column_types=schema,
+            null_values=NULL_VALUES,
+            strings_can_be_null=True,
+            include_columns=list(schema),
+        ),
+    )
+
+
+def iter_batches(path, schema, columns=None, block_size=BLOCK_SIZE):
+    """
+    Stream a typed CSV export (or a Parquet file) as Arrow record batches,
+    without reading the whole file; columns limits what is parsed.
+    """
+    columns = list(columns or schema)
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        # pre_buffer caches the byte ranges it has read ahead, which grows with the file
+        yield from pq.ParquetFile(path, pre_buffer=False).iter_batches(columns=columns)
+        return
+
+    reader = pv.open_csv(
+        path,
+        read_options=pv.ReadOptions(block_size=block_size),
+        convert_options=pv.ConvertOptions(
+            column_types={name: schema[name] for name in columns},
+            null_values=NULL_VALUES,
+            strings_can_be_null=True,
+            include_columns=columns,
+        ),
+    )
+    yield from reader
+
+
+def iter_table_chunks(path, schema, chunk_rows, columns=None):
+    """iter_batches regrouped into Arrow tables of exactly chunk_rows rows (the last may be shorter)."""
+    pending, buffered = [], 0
+    for batch in iter_batches(path, schema, columns):
+        pending.append(batch)
+        buffered += batch.num_rows
+        while buffered >= chunk_rows:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, chunk_rows)
+            rest = table.slice(chunk_rows)
+            pending, buffered = rest.to_batches(), rest.num_rows
+    if buffered:
+        yield pa.Table.from_batches(pending)
+
+
+def cache_path(path, cache_dir=CACHE_DIR):
+    stem = os.path.splitext(os.path.basename(path))[0].replace(" ", "_")
+    return os.path.join(cache_dir, f"{stem}-{file_hash(path)}.feather")
+
+
+def load_table(path, schema, cache=True, cache_dir=CACHE_DIR):
+    """Arrow table for a CSV, served from the Feather cache when the source is unchanged."""
+    if not cache:
+        return read_csv_typed(path, schema)
+
+    cached = cache_path(path, cache_dir)
+    if os.path.exists(cached):
+        return feather.read_table(cached, memory_map=True)
+
+    table = read_csv_typed(path, schema)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = cached + ".tmp"
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, cached)
+    return table
+
+
+def load_dataset(name, cache=True, data_dir=DATA_DIR, cache_dir=CACHE_DIR):
+    """
+    Typed DataFrame for one of DATASETS, e.g. load_dataset("fraud_model").
+
+    A path to any CSV with a matching schema also works:
+    load_dataset("exports/Fraud Model.csv") picks the schema by file name.
+    """
+    if name in DATASETS:
+        relative, schema = DATASETS[name]
+        path = os.path.join(data_dir, relative)
+    else:
+        path = name
+        matches = [
+            schema for relative, schema in DATASETS.values()
+            if os.path.basename(relative).lower() == os.path.basename(path).lower()
+        ]
+        if not matches:
+            raise ValueError(f"No schema registered for {path!r}; use one of {sorted(DATASETS)}")
+        schema = matches[0]
+
+    return load_table(path, schema, cache, cache_dir).to_pandas()
+
+
+if __name__ == "__main__":
+    import time
+
+    import pandas as pd
+
+    for name, (relative, schema) in DATASETS.items():
+        path = os.path.join(DATA_DIR, relative)
+
+        started = time.perf_counter()
+        untyped = pd.read_csv(path)
+        plain = time.perf_counter() - started
+
+        started = time.perf_counter()
+        typed = load_dataset(name)
+        first = time.perf_counter() - started
+
+        started = time.perf_counter()
+        load_dataset(name)
+        cached = time.perf_counter() - started
+
+        print(f"{name:<22} read_csv {plain * 1000:7.1f}ms {untyped.memory_usage(deep=True).sum() / 1e6:6.1f}MB | "
+              f"typed {first * 1000:7.1f}ms | cached {cached * 1000:6.1f}ms "
+              f"{typed.memory_usage(deep=True).sum() / 1e6:6.1f}MB")
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Pluggable database sinks with a small connection pool.
+
+A sink only knows how to open a connection (SQL Server via pyodbc, or a
+local SQLite file) and which errors mean that connection is lost.
+load_pipeline() then loads the parent merchants table, commits, and loads
+the FK-dependent api_keys and transactions tables at the same time, with
+transactions split across several pooled connections.
+"""
+
+import queue
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+from Bulk_Loader import BATCH_SIZE, COMMIT_EVERY, connect_sqlite, load_table
+
+
+DRIVER = "ODBC Driver 17 for SQL Server"
+SERVER = "THOTH\\SQLEXPRESS"
+DATABASE = "PaystackFintechDB"
+
+TRANSACTION_PARTITIONS = 4
+
+
+# ---------- SINKS ----------
+
+class PyodbcSink:
+    """SQL Server through pyodbc (trusted connection by default)."""
+
+    name = "pyodbc"
+
+    def __init__(self, server=SERVER, database=DATABASE, driver=DRIVER, connection_string=None):
+        self.connection_string = connection_string or (
+            f"DRIVER={{{driver}}};"
+            f"SERVER={server};"
+            f"DATABASE={database};"
+            "Trusted_Connection=yes;"
+        )
+
+    def connect(self):
+        import pyodbc
+        return pyodbc.connect(self.connection_string)
+
+    def connection_lost(self, exc):
+        """SQLSTATE class 08 (connection exception) or a communication link failure."""
+        import pyodbc
+        state = str(exc.args[0]) if getattr(exc, "args", None) else ""
+        return isinstance(exc, (pyodbc.InterfaceError, pyodbc.OperationalError)) or state.startswith("08")
+
+
+class SqliteSink:
+    """Local SQLite file standing in for PaystackFintechDB."""
+
+    name = "sqlite"
+
+    def __init__(self, path, timeout=60):
+        if path == ":memory:":
+            raise ValueError("SqliteSink needs a file path so pooled connections share one database")
+        self.path = path
+        self.timeout = timeout
+        connect_sqlite(path).close()   # create the schema once
+
+    def connect(self):
+        conn = connect_sqlite(self.path, create_schema=False, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        return conn
+
+    def connection_lost(self, exc):
+        """Closed or unusable connection (not e.g. a constraint or lock error)."""
+        return isinstance(exc, (sqlite3.InterfaceError, sqlite3.ProgrammingError))
+
+
+# ---------- POOL ----------
+
+class ConnectionPool:
+    """
+    Fixed-size pool; connections are opened lazily and reused. A connection
+    whose block failed is rolled back, and closed instead of reused when the
+    rollback fails or the error means the connection is gone.
+    """
+
+    def __init__(self, sink, size=TRANSACTION_PARTITIONS + 1):
+        self.sink = sink
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._slots = queue.Queue()
+        for _ in range(size):
+            self._slots.put(None)
+
+    @contextmanager
+    def connection(self):
+        self._slots.get()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self.sink.connect()
+            reusable = True
+            try:
+                yield conn
+            except Exception as exc:
+                reusable = _rollback(conn) and not self.sink.connection_lost(exc)
+                raise
+            finally:
+                if reusable:
+                    self._idle.put(conn)
+                else:
+                    _close_quietly(conn)
+        finally:
+            # Also after a failed connect, so a bad server cannot use up the slots
+            self._slots.put(None)
+
+    def close(self):
+        while True:
+            try:
+                _close_quietly(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _rollback(conn):
+    try:
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+# ---------- PIPELINE ----------
+
+def _load(pool, table, data, batch_size, commit_every):
+    with pool.connection() as conn:
+        return load_table(conn, table, data, batch_size=batch_size, commit_every=commit_every)
+
+
+def load_pipeline(sink, merchants_df, api_keys_df, transactions_df,
+                  transaction_partitions=TRANSACTION_PARTITIONS,
+                  batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY):
+    """
+    Load merchants, then api_keys and transactions concurrently.
+
+    Returns per-load stats (one row per transactions partition) plus a
+    'pipeline' row with the overall wall clock.
+    """
+    started = time.perf_counter()
+    partitions = max(1, transaction_partitions)
+
+    with ConnectionPool(sink, size=partitions + 1) as pool:
+        stats = [_load(pool, "merchants", merchants_df, batch_size, commit_every)]
+
+        chunks = np.array_split(np.arange(len(transactions_df)), partitions)
+        with ThreadPoolExecutor(max_workers=partitions + 1) as executor:
+            futures = [executor.submit(_load, pool, "api_keys", api_keys_df, batch_size, commit_every)]
+            futures += [
+                executor.submit(
+                    _load, pool, "transactions",
+                    transactions_df.iloc[rows[0]:rows[-1] + 1] if len(rows) else transactions_df.iloc[:0],
+                    batch_size, commit_every
+                )
+                for rows in chunks
+            ]
+            stats += [f.result() for f in futures]
+
+    seconds = time.perf_counter() - started
+    total = sum(s["rows"] for s in stats)
+    stats.append({
+        "table": "pipeline",
+        "rows": total,
+        "batches": sum(s["batches"] for s in stats),
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(total / seconds) if seconds > 0 else None,
+    })
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import tempfile
+
+    from Bulk_Loader import print_stats
+    from Transaction_Simulator import simulate
+
+    parser = argparse.ArgumentParser(description="Measure concurrent table loads against SQLite")
+    parser.add_argument("--merchants", type=int, default=10_000)
+    parser.add_argument("--partitions", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    frames = simulate(args.merchants)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for partitions in args.partitions:
+            sink = SqliteSink(os.path.join(tmp, f"paystack_{partitions}.db"))
+            print(f"\ntransaction partitions = {partitions}")
+            print_stats(load_pipeline(sink, *frames, transaction_partitions=partitions))
@@ -0,0 +1,428 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Streaming distribution and drift monitor for fraud scores.
+
+Checking whether anomaly_score / fraud_risk_score have shifted used to mean
+rerunning Fraud_Detection.py and re-plotting fraud_patterns.png and
+fraud_hours.png from the full frame. DriftMonitor keeps, per (day,
+payment_method) cell, for each of anomaly_score, fraud_risk_score,
+transaction_amount and hour_of_day:
+
+- a fixed-bin histogram (linear or log bins, with underflow / overflow)
+- a quantile sketch (DDSketch: log-spaced buckets with 1% relative
+  accuracy; mergeable, so cells can be combined)
+
+Each transaction updates one bin and one sketch bucket per metric, which is
+O(1). The baseline is the same structure, built once per payment method
+from the training rows. drift() compares a cell's histogram with the
+baseline histogram: PSI, and KS as the largest gap between the two binned
+CDFs (exact at bin edges). It reads only the histograms, never the
+transactions.
+"""
+
+import json
+import math
+
+import numpy as np
+import pandas as pd
+
+from Fraud_Features import NS_PER_DAY
+
+
+METRIC_BINS = {
+    # (scale, low, high, bins) with one underflow and one overflow bin
+    "anomaly_score": ("linear", -0.5, 0.5, 100),
+    "fraud_risk_score": ("linear", -0.5, 100.5, 101),   # one bin per point
+    "transaction_amount": ("log", 1.0, 1e7, 70),        # 10 bins per decade
+    "hour_of_day": ("linear", -0.5, 23.5, 24),
+}
+
+RELATIVE_ACCURACY = 0.01
+PSI_EPSILON = 1e-4   # floor for empty-bin proportions
+DRIFT_BANDS = [(0.1, "moderate"), (0.25, "major")]   # PSI rule of thumb
+ALL_METHODS = "all"
+UNKNOWN_METHOD = "unknown"   # cell key for a NULL / missing payment_method
+
+
+# ---------- BINS ----------
+
+def _edges(spec):
+    scale, low, high, bins = spec
+    return np.geomspace(low, high, bins + 1) if scale == "log" else np.linspace(low, high, bins + 1)
+
+
+def bin_indices(spec, values):
+    """0 = underflow, 1..bins, bins + 1 = overflow; NaN -> -1."""
+    scale, low, high, bins = spec
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if scale == "log":
+            position = (np.log(values) - math.log(low)) / (math.log(high) - math.log(low))
+        else:
+            position = (values - low) / (high - low)
+    index = np.clip(np.floor(position * bins) + 1, 0, bins + 1)
+    if scale == "log":
+        index = np.where(values <= 0, 0, index)
+    return np.where(np.isnan(index), -1, index).astype(np.int64)
+
+
+def bin_index(spec, x):
+    """Scalar bin_indices."""
+    scale, low, high, bins = spec
+    if x != x:
+        return -1
+    if scale == "log":
+        if x <= 0:
+            return 0
+        position = (math.log(x) - math.log(low)) / (math.log(high) - math.log(low))
+    else:
+        position = (x - low) / (high - low)
+    return min(max(math.floor(position * bins) + 1, 0), bins + 1)
+
+
+# ---------- QUANTILE SKETCH ----------
+
+class QuantileSketch:
+    """DDSketch: bucket k holds values in (gamma^(k-1), gamma^k]; quantiles within relative_accuracy."""
+
+    MIN_VALUE = 1e-9   # |x| below this counts as zero
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero = 0
+        self.count = 0
+
+    def add(self, x):
+        if x != x:
+            return
+        if x > self.MIN_VALUE:
+            key = math.ceil(math.log(x) / self.log_gamma)
+            self.positive[key] = self.positive.get(key, 0) + 1
+        elif x < -self.MIN_VALUE:
+            key = math.ceil(math.log(-x) / self.log_gamma)
+            self.negative[key] = self.negative.get(key, 0) + 1
+        else:
+            self.zero += 1
+        self.count += 1
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        for store, side in ((self.positive, values[values > self.MIN_VALUE]),
+                            (self.negative, -values[values < -self.MIN_VALUE])):
+            keys, counts = np.unique(np.ceil(np.log(side) / self.log_gamma).astype(np.int64), return_counts=True)
+            for key, count in zip(keys.tolist(), counts.tolist()):
+                store[key] = store.get(key, 0) + count
+        self.zero += int(np.count_nonzero(np.abs(values) <= self.MIN_VALUE))
+        self.count += len(values)
+
+    def merge(self, other):
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        self.zero += other.zero
+        self.count += other.count
+        return self
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
+
+    def to_dict(self):
+        return {"positive": self.positive, "negative": self.negative, "zero": self.zero, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, state, relative_accuracy=RELATIVE_ACCURACY):
+        sketch = cls(relative_accuracy)
+        sketch.positive = {int(k): v for k, v in state["positive"].items()}
+        sketch.negative = {int(k): v for k, v in state["negative"].items()}
+        sketch.zero, sketch.count = state["zero"], state["count"]
+        return sketch
+
+
+# ---------- MONITOR ----------
+
+class _Cell:
+    __slots__ = ("counts", "sketches")
+
+    def __init__(self, metrics, relative_accuracy):
+        self.counts = {name: np.zeros(spec[3] + 2, dtype=np.int64) for name, spec in metrics.items()}
+        self.sketches = {name: QuantileSketch(relative_accuracy) for name in metrics}
+
+    def merge(self, other):
+        for name in self.counts:
+            self.counts[name] += other.counts[name]
+            self.sketches[name].merge(other.sketches[name])
+        return self
+
+
+def population_stability(actual, expected, epsilon=PSI_EPSILON):
+    """PSI between two histograms over the same bins."""
+    p = np.maximum(actual / max(actual.sum(), 1), epsilon)
+    q = np.maximum(expected / max(expected.sum(), 1), epsilon)
+    return float(np.sum((p - q) * np.log(p / q)))
+
+
+def binned_ks(actual, expected):
+    """Largest gap between the two empirical CDFs, evaluated at the bin edges."""
+    if not actual.sum() or not expected.sum():
+        return None
+    return float(np.max(np.abs(np.cumsum(actual) / actual.sum() - np.cumsum(expected) / expected.sum())))
+
+
+def drift_status(psi):
+    status = "stable"
+    for threshold, label in DRIFT_BANDS:
+        if psi >= threshold:
+            status = label
+    return status
+
+
+def _known_methods(methods):
+    """payment_method as an object array with NULLs mapped to UNKNOWN_METHOD."""
+    methods = np.asarray(methods, dtype=object)
+    return np.where(pd.isna(methods), UNKNOWN_METHOD, methods)
+
+
+def _payment_methods(df):
+    """payment_method, or recovered from the notebook's method_* dummies."""
+    if "payment_method" in df:
+        return _known_methods(df["payment_method"])
+    dummies = df.filter(like="method_")
+    return np.asarray(dummies.idxmax(axis=1).str.removeprefix("method_"), dtype=object)
+
+
+class DriftMonitor:
+    """Per (day, payment_method) histograms and sketches, plus a per-method training baseline."""
+
+    def __init__(self, metrics=METRIC_BINS, relative_accuracy=RELATIVE_ACCURACY):
+        self.metrics = dict(metrics)
+        self.relative_accuracy = relative_accuracy
+        self.cells = {}      # (day number, payment_method) -> _Cell
+        self.baseline = {}   # payment_method -> _Cell
+
+    def _cell(self, cells, key):
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = _Cell(self.metrics, self.relative_accuracy)
+        return cell
+
+    # ---------- UPDATES ----------
+
+    def update(self, transaction_timestamp, payment_method, **values):
+        """One scored transaction: values are metric=value (missing metrics are skipped)."""
+        day = pd.Timestamp(transaction_timestamp).value // NS_PER_DAY
+        method = UNKNOWN_METHOD if payment_method is None or pd.isna(payment_method) else payment_method
+        cell = self._cell(self.cells, (day, method))
+        for name, x in values.items():
+            x = float(x)
+            index = bin_index(self.metrics[name], x)
+            if index >= 0:
+                cell.counts[name][index] += 1
+                cell.sketches[name].add(x)
+
+    def _add(self, cells, keys, values):
+        """Vectorized update: keys is a list of cell keys per row, values a dict of metric arrays."""
+        keys = pd.Series(keys, dtype=object)
+        for key, rows in keys.groupby(keys).indices.items():
+            cell = self._cell(cells, key)
+            for name, column in values.items():
+                column = column[rows]
+                index = bin_indices(self.metrics[name], column)
+                cell.counts[name] += np.bincount(index[index >= 0], minlength=len(cell.counts[name]))
+                cell.sketches[name].add_many(column)
+
+    def update_many(self, timestamps, payment_methods, values):
+        """A batch of scored transactions (arrays of equal length)."""
+        days = np.asarray(pd.to_datetime(timestamps), dtype="datetime64[ns]").view(np.int64) // NS_PER_DAY
+        values = {name: np.asarray(column, dtype=np.float64) for name, column in values.items()}
+        self._add(self.cells, list(zip(days.tolist(), _known_methods(payment_methods))), values)
+        return self
+
+    def update_frame(self, scored_df):
+        return self.update_many(
+            scored_df["transaction_timestamp"], _payment_methods(scored_df),
+            {name: scored_df[name].to_numpy() for name in self.metrics if name in scored_df}
+        )
+
+    def fit_baseline(self, scored_df):
+        """Baseline histograms per payment method from the training rows (replaces any previous one)."""
+        self.baseline = {}
+        values = {name: scored_df[name].to_numpy(dtype=np.float64) for name in self.metrics if name in scored_df}
+        self._add(self.baseline, list(_payment_methods(scored_df)), values)
+        return self
+
+    # ---------- REPORTS ----------
+
+    def _merged(self, cells):
+        merged = _Cell(self.metrics, self.relative_accuracy)
+        for cell in cells:
+            merged.merge(cell)
+        return merged
+
+    def days(self):
+        return sorted({day for day, _ in self.cells})
+
+    def drift(self, by_day=True, by_method=True, days=None, quantiles=(0.5, 0.99)):
+        """
+        PSI / KS per (day, payment_method, metric) against the baseline.
+
+        by_day=False pools the selected days into one window and
+        by_method=False pools payment methods (against the pooled baseline).
+        Only histogram counts are read.
+        """
+        groups = {}
+        for (day, method), cell in self.cells.items():
+            if days is None or day in days:
+                key = (day if by_day else None, method if by_method else ALL_METHODS)
+                groups.setdefault(key, []).append((day, cell))
+        pooled = self._merged(self.baseline.values())
+
+        rows = []
+        for (day, method), members in sorted(groups.items(), key=lambda item: (item[0][0] or 0, item[0][1])):
+            cells = [cell for _, cell in members]
+            window = cells[0] if len(cells) == 1 else self._merged(cells)
+            covered = sorted({d for d, _ in members})
+            label = str(np.datetime64(covered[0], "D"))
+            if len(covered) > 1:
+                label += f"..{np.datetime64(covered[-1], 'D')}"
+            baseline = self.baseline.get(method, pooled)
+            for name in self.metrics:
+                actual, expected = window.counts[name], baseline.counts[name]
+                if not actual.sum():
+                    continue
+                psi = population_stability(actual, expected)
+                row = {
+                    "day": label,
+                    "payment_method": method,
+                    "metric": name,
+                    "rows": int(actual.sum()),
+                    "psi": round(psi, 4),
+                    "ks": binned_ks(actual, expected),
+                    "status": drift_status(psi),
+                }
+                for q in quantiles:
+                    row[f"p{q * 100:g}"] = window.sketches[name].quantile(q)
+                    row[f"baseline_p{q * 100:g}"] = baseline.sketches[name].quantile(q)
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+    def histogram(self, metric, days=None, payment_methods=None):
+        """Summed counts for one metric with its bin edges (under/overflow excluded)."""
+        cells = [
+            cell for (day, method), cell in self.cells.items()
+            if (days is None or day in days) and (payment_methods is None or method in payment_methods)
+        ]
+        counts = self._merged(cells).counts[metric]
+        return counts[1:-1], _edges(self.metrics[metric])
+
+    # ---------- PERSISTENCE ----------
+
+    def _state(self, cells):
+        return [
+            {"key": key, "counts": {n: c.tolist() for n, c in cell.counts.items()},
+             "sketches": {n: s.to_dict() for n, s in cell.sketches.items()}}
+            for key, cell in cells.items()
+        ]
+
+    def _restore(self, state):
+        cell = _Cell(self.metrics, self.relative_accuracy)
+        for name in self.metrics:
+            cell.counts[name][:] = state["counts"][name]
+            cell.sketches[name] = QuantileSketch.from_dict(state["sketches"][name], self.relative_accuracy)
+        return cell
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({
+                "metrics": self.metrics,
+                "relative_accuracy": self.relative_accuracy,
+                "cells": self._state(self.cells),
+                "baseline": self._state(self.baseline),
+            }, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            state = json.load(f)
+        monitor = cls({name: tuple(spec) for name, spec in state["metrics"].items()}, state["relative_accuracy"])
+        monitor.cells = {tuple(s["key"]): monitor._restore(s) for s in state["cells"]}
+        monitor.baseline = {s["key"]: monitor._restore(s) for s in state["baseline"]}
+        return monitor
+
+
+if __name__ == "__main__":
+    import time
+
+    from Data_Loader import load_dataset
+    from Fraud_Features import build_fraud_features
+    from Fraud_Model import FraudModel
+
+    features = build_fraud_features(load_dataset("transactions"), load_dataset("merchants"))
+    scored = features.copy()
+    model = FraudModel()
+    for name, values in model.fit(features).score(features).items():
+        scored[name] = values
+    scored = scored.sort_values(["transaction_timestamp", "transaction_id"], kind="stable")
+
+    # Baseline on the first half of the year, monitor everything after it
+    cutoff = scored["transaction_timestamp"].quantile(0.5)
+    train, live = scored[scored["transaction_timestamp"] < cutoff], scored[scored["transaction_timestamp"] >= cutoff]
+    monitor = DriftMonitor().fit_baseline(train)
+
+    columns = list(METRIC_BINS)
+    rows = list(zip(live["transaction_timestamp"], live["payment_method"], *(live[c] for c in columns)))
+    started = time.perf_counter()
+    for ts, method, *values in rows:
+        monitor.update(ts, method, **dict(zip(columns, values)))
+    per_row = (time.perf_counter() - started) / len(rows)
+    print(f"update(): {per_row * 1e6:.1f}us per transaction ({len(rows):,} rows, {len(monitor.cells)} cells)")
+
+    batch = DriftMonitor().fit_baseline(train)
+    started = time.perf_counter()
+    batch.update_frame(live)
+    print(f"update_frame(): {(time.perf_counter() - started) * 1000:.1f}ms for the same rows")
+
+    started = time.perf_counter()
+    report = monitor.drift()
+    pooled = monitor.drift(by_method=False)
+    print(f"drift(): {(time.perf_counter() - started) * 1000:.1f}ms for {len(report) + len(pooled)} comparisons")
+    same = report.equals(batch.drift())
+    print(f"row-by-row and batch updates give the same report: {same}")
+
+    days = pd.Series(monitor.days())
+    months = days.map(lambda day: str(np.datetime64(day, "D").astype("datetime64[M]")))
+    monthly = pd.concat([
+        monitor.drift(by_day=False, by_method=False, days=set(group)).assign(month=month)
+        for month, group in days.groupby(months)
+    ])
+    print("\nmonthly PSI vs the first-half baseline:")
+    print(monthly.pivot(index="month", columns="metric", values="psi").round(3).to_string())
+    # Amount quantiles from the sketch against the exact ones
+    sketch = monitor._merged(monitor.cells.values()).sketches["transaction_amount"]
+    for q in (0.5, 0.9, 0.99):
+        exact = float(np.quantile(live["transaction_amount"], q, method="lower"))
+        print(f"amount p{q * 100:g}: sketch {sketch.quantile(q):,.0f}  exact {exact:,.0f}")
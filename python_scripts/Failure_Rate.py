@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Rolling 7-day merchant failure rate without the self-join.
+
+Analytics.sql computes merchant_failure_rate_7d by joining live_txns to
+itself on merchant and a 7-day BETWEEN window, which is quadratic in the
+number of transactions per merchant. Here the transactions are sorted once
+by (merchant, timestamp) and each window is two binary searches into that
+order plus a difference of cumulative failure counts:
+
+    rate(t) = (F[right] - F[left]) / (right - left)
+
+with the same inclusive window as the SQL:
+t2.transaction_timestamp BETWEEN DATEADD(day, -7, t1.transaction_timestamp)
+AND t1.transaction_timestamp (rows at the exact same timestamp count too).
+"""
+
+import numpy as np
+import pandas as pd
+
+
+WINDOW = pd.Timedelta(days=7)
+
+
+def _sorted_keys(merchant_codes, ts, lower):
+    """Merchant-major int64 keys for ts and the window lower bounds, sharing one time axis."""
+    # Dense-rank the times (and window bounds) so merchant * stride + rank
+    # never overflows int64, whatever the time resolution or merchant count
+    axis = np.unique(np.concatenate([ts, lower]))
+    stride = np.int64(len(axis) + 1)
+    key = merchant_codes * stride + np.searchsorted(axis, ts)
+    lower_key = merchant_codes * stride + np.searchsorted(axis, lower)
+    return key, lower_key
+
+
+def sorted_failure_rate(merchant_codes, ts, failed, window=WINDOW):
+    """
+    Window failure rate for arrays already sorted by (merchant_codes, ts).
+
+    merchant_codes: int64 codes; ts: int64 nanoseconds; failed: bool.
+    Returns float64 rates in the same (sorted) order.
+    """
+    key, lower_key = _sorted_keys(merchant_codes, ts, ts - np.int64(pd.Timedelta(window).value))
+
+    left = np.searchsorted(key, lower_key, side="left")
+    right = np.searchsorted(key, key, side="right")
+    cum_failed = np.concatenate([[0], np.cumsum(failed)])
+    return (cum_failed[right] - cum_failed[left]) / (right - left)
+
+
+def rolling_failure_rate(merchants, timestamps, failed, window=WINDOW):
+    """
+    Failure rate over [t - window, t] for each transaction, within its merchant.
+
+    merchants: ids or integer codes; timestamps: datetime-like; failed: bool.
+    Returns float64 rates in input row order.
+    """
+    merchant_codes = pd.factorize(np.asarray(merchants))[0].astype(np.int64)
+    ts = np.asarray(pd.to_datetime(timestamps), dtype="datetime64[ns]").view(np.int64)
+    failed = np.asarray(failed, dtype=bool)
+
+    order = np.lexsort((ts, merchant_codes))
+    rates = np.empty(len(ts), dtype=np.float64)
+    rates[order] = sorted_failure_rate(merchant_codes[order], ts[order], failed[order], window)
+    return rates
+
+
+def merchant_failure_rate_7d(transactions_df, window=WINDOW):
+    """transaction_id, merchant_id, merchant_failure_rate_7d for the LIVE transactions."""
+    live = transactions_df[transactions_df["environment"] == "LIVE"]
+    return pd.DataFrame({
+        "transaction_id": live["transaction_id"].to_numpy(),
+        "merchant_id": live["merchant_id"].to_numpy(),
+        "merchant_failure_rate_7d": rolling_failure_rate(
+            live["merchant_id"], live["transaction_timestamp"], live["status"] == "FAILED", window
+        ),
+    })
+
+
+# ---------- BENCHMARK ----------
+
+# Same query as merchant_failure_7d in Analytics.sql, in SQLite dialect
+SQLITE_SELF_JOIN = """
+WITH live_txns AS (
+    SELECT transaction_id, merchant_id, transaction_timestamp, status
+    FROM transactions
+    WHERE environment = 'LIVE'
+)
+SELECT
+    t1.transaction_id,
+    SUM(CASE WHEN t2.status = 'FAILED' THEN 1 ELSE 0 END) * 1.0 / COUNT(*)
+        AS merchant_failure_rate_7d
+FROM live_txns t1
+JOIN live_txns t2
+    ON t1.merchant_id = t2.merchant_id
+   AND t2.transaction_timestamp BETWEEN
+        strftime('%Y-%m-%d %H:%M:%f000', t1.transaction_timestamp, '-7 days')
+        AND t1.transaction_timestamp
+GROUP BY t1.transaction_id
+"""
+
+
+def benchmark(transactions_df):
+    """Self-join (SQLite stand-in) vs sorted single pass; returns timings and max abs diff."""
+    import time
+
+    from Bulk_Loader import connect_sqlite, load_table
+
+    conn = connect_sqlite()
+    conn.execute("PRAGMA foreign_keys=OFF")
+    load_table(conn, "transactions", transactions_df)
+    conn.execute("CREATE INDEX ix_live ON transactions (merchant_id, transaction_timestamp)")
+
+    started = time.perf_counter()
+    joined = pd.read_sql(SQLITE_SELF_JOIN, conn)
+    self_join = time.perf_counter() - started
+    conn.close()
+
+    started = time.perf_counter()
+    fast = merchant_failure_rate_7d(transactions_df)
+    single_pass = time.perf_counter() - started
+
+    merged = fast.merge(joined, on="transaction_id", suffixes=("", "_sql"))
+    return {
+        "rows": len(fast),
+        "self_join_sec": round(self_join, 3),
+        "single_pass_sec": round(single_pass, 4),
+        "speedup": round(self_join / single_pass, 1),
+        "max_abs_diff": float(np.abs(
+            merged["merchant_failure_rate_7d"] - merged["merchant_failure_rate_7d_sql"]
+        ).max()),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from Data_Loader import load_dataset
+    from Transaction_Simulator import simulate
+
+    parser = argparse.ArgumentParser(description="Benchmark the 7-day failure rate engine")
+    parser.add_argument("--merchants", type=int, nargs="+", default=[2_000, 5_000])
+    args = parser.parse_args()
+
+    print("data/raw/transactions.csv", benchmark(load_dataset("transactions")))
+    for n in args.merchants:
+        _, _, transactions_df = simulate(n)
+        print(f"simulated {n:,} merchants", benchmark(transactions_df))
@@ -13,7 +13,37 @@ import seaborn as sns
 # In[5]:
 
 
-df = pd.read_csv('Fraud Model.csv')
+# Fraud features built in-process from the transactions/merchants tables in one
+# sort-and-scan (same definitions as Analytics.sql), no SSMS export round-trip
+from Data_Loader import load_dataset
+from Fraud_Features import build_fraud_features
+
+df = build_fraud_features(load_dataset('transactions'), load_dataset('merchants'))
+
+# Previous path via the exported query results:
+# df = load_dataset('fraud_model')
+
+# Parallel mode for large volumes: merchant hash partitions built and scored
+# on all cores over memory-mapped columns, same rows and order as below
+# from Fraud_Pipeline import run_fraud_pipeline
+# scored, fraud_model = run_fraud_pipeline(load_dataset('transactions'), load_dataset('merchants'), workers=4)
+
+# Out-of-core mode for feature files larger than memory: model fitted on a
+# reservoir sample, rows scored in fixed-size chunks, merchant totals (with
+# merchant_fraud_flag) and summary written to data/processed/fraud_scored
+# from Chunked_Fraud_Scoring import score_file
+# summary, merchant_fraud, fraud_model = score_file('../data/processed/Fraud Model.csv', '../data/processed/fraud_scored')
+
+
+# In[ ]:
+
+
+# Dense int32 merchant surrogates: every groupby/map/transform below runs on
+# integers, and ids are decoded back to strings only for output
+from Id_Dictionary import IdDictionary
+
+merchant_ids = IdDictionary.from_values(df['merchant_id'])
+df['merchant_id'] = merchant_ids.encode(df['merchant_id'])
 
 
 # In[7]:
@@ -32,9 +62,8 @@ df.info()
 
 
 df['merchant_std_amount'] = df['merchant_std_amount'].fillna(0)
-df['time_since_last_tx_sec'] = df['time_since_last_tx_sec'].fillna(
-    df['time_since_last_tx_sec'].median()
-)
+time_since_fill = df['time_since_last_tx_sec'].median()
+df['time_since_last_tx_sec'] = df['time_since_last_tx_sec'].fillna(time_since_fill)
 
 
 # In[11]:
@@ -49,18 +78,22 @@ df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
 # In[13]:
 
 
-# Calculate merchant's average transaction amount
-merchant_avg = df.groupby('merchant_id')['transaction_amount'].mean().to_dict()
-df['merchant_avg_amount'] = df['merchant_id'].map(merchant_avg)
+# merchant_avg_amount already comes from the feature builder
 df['amount_vs_avg'] = df['transaction_amount'] / df['merchant_avg_amount']
 
 
 # In[15]:
 
 
-# Transaction velocity (how many transactions in last 5 minutes)
-transactions = df.sort_values(['merchant_id', 'transaction_timestamp'])
-transactions['prev_tx_time'] = df.groupby('merchant_id')['transaction_timestamp'].shift(1)
+# Transaction velocity: per-merchant count and amount over the trailing
+# 5m / 1h / 24h / 7d, up to and including each transaction (one sorted pass)
+from Velocity import VELOCITY_WINDOWS, velocity_frame
+
+velocity = velocity_frame(
+    df['merchant_id'], df['transaction_timestamp'], df['transaction_amount'],
+    tie_break=df['transaction_id'], windows=VELOCITY_WINDOWS, index=df.index
+)
+df = df.join(velocity)
 
 
 # In[17]:
@@ -165,6 +198,20 @@ df['is_fraud'] = iso_forest.predict(X_fraud_scaled)
 df['is_fraud'] = df['is_fraud'].map({1: 0, -1: 1})  # -1 = anomaly = fraud
 
 
+# In[ ]:
+
+
+# Save the fitted scaler + forest as a new version under models/fraud, so new
+# transactions can be scored with Fraud_Model.load_model() instead of refitting
+from Fraud_Model import FraudModel, save_model
+
+fraud_model_path = save_model(
+    FraudModel.from_fitted(scaler, iso_forest, time_since_fill),
+    training_rows=len(df)
+)
+print(fraud_model_path)
+
+
 # In[31]:
 
 
@@ -240,49 +287,21 @@ high_risk_fraud = df[df['is_fraud'] == 1].sort_values('transaction_amount', asce
 
 
 print("TOP 10 HIGH-RISK TRANSACTIONS:")
-print(high_risk_fraud[['transaction_id', 'merchant_id', 'transaction_amount', 'hour_of_day']].head(10))
+print(
+    high_risk_fraud[['transaction_id', 'merchant_id', 'transaction_amount', 'hour_of_day']]
+    .head(10)
+    .assign(merchant_id=lambda x: merchant_ids.decode(x['merchant_id']))
+)
 
 
 # In[39]:
 
 
-def compute_fraud_risk_score(df):
-    score = np.zeros(len(df))
-
-    # Rule 1: Amount far above merchant norm
-    score += np.where(
-        df['transaction_amount'] >
-        df['merchant_avg_amount'] + 3 * df['merchant_std_amount'],
-        40, 0
-    )
-
-    # Rule 2: Near platform limit
-    score += np.where(
-        df['transaction_amount'].between(75000, 99000),
-        25, 0
-    )
+# Fraud rules and action bands are data (Fraud_Rules.FRAUD_RULES / ACTION_BANDS),
+# compiled once into a vectorized engine with per-rule hit counters
+from Fraud_Rules import compile_rules
 
-    # Rule 3: New merchant + high amount
-    score += np.where(
-        (df['merchant_age_days'] < 30) &
-        (df['transaction_amount'] > 50000),
-        15, 0
-    )
-
-    # Rule 4: Rapid succession
-    score += np.where(
-        (df['time_since_last_tx_sec'].notna()) &
-        (df['time_since_last_tx_sec'] < 300),
-        10, 0
-    )
-
-    # Rule 5: Merchant instability
-    score += np.where(
-        df['merchant_failure_rate_7d'] > 0.05,
-        10, 0
-    )
-
-    return score
+fraud_rules = compile_rules()
 
 
 # In[40]:
@@ -304,27 +323,28 @@ df['is_first_purchase'] = df['time_since_last_tx_sec'].isna().astype(int)
 # In[41]:
 
 
-df['fraud_risk_score'] = 0
-
-mask = df['is_fraud'] == 1
-df.loc[mask, 'fraud_risk_score'] = compute_fraud_risk_score(df[mask])
+# Only the IsolationForest anomalies are scored; everything else stays 0 / APPROVE
+mask = (df['is_fraud'] == 1).to_numpy()
+df['fraud_risk_score'] = fraud_rules.score(df, where=mask)
 
 
 # In[42]:
 
 
-def assign_fraud_action(score):
-    if score >= 60:
-        return 'BLOCK'
-    elif score >= 40:
-        return 'REVIEW'
-    else:
-        return 'APPROVE'
+df['fraud_action'] = fraud_rules.actions(df['fraud_risk_score'])
+fraud_rules.hit_report()
 
-df['fraud_action'] = 'APPROVE'
-df.loc[mask, 'fraud_action'] = (
-    df.loc[mask, 'fraud_risk_score'].apply(assign_fraud_action)
-)
+
+# In[ ]:
+
+
+# Score / amount / hour distributions per day and payment method, kept as
+# fixed-bin histograms + quantile sketches; PSI / KS per day against the
+# training rows as the baseline (the service keeps them updated live)
+from Drift_Monitor import DriftMonitor
+
+drift_monitor = DriftMonitor().fit_baseline(df).update_frame(df)
+drift_monitor.drift(by_method=False).sort_values('psi', ascending=False).head(10)
 
 
 # In[43]:
@@ -353,7 +373,18 @@ df.info()
 # In[46]:
 
 
-df.to_csv("fraud_alert.csv", index=False)
+df['merchant_id'] = merchant_ids.decode(df['merchant_id'])
+
+# Append-only output under results/fraud_alerts: REVIEW/BLOCK rows with every
+# column plus compact scores for all rows, date-partitioned, with a merchant
+# offset index (rows at or below the previous run's watermark are skipped)
+from Alert_Sink import AlertSink
+
+fraud_alerts = AlertSink()
+fraud_alerts.append(df)
+
+# Previous full rewrite of every row and column:
+# df.to_csv("fraud_alert.csv", index=False)
 
 
 # In[ ]:
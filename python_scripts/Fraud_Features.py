@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+In-process fraud feature builder.
+
+Builds the "2. Payment Fraud Detection" model matrix from Analytics.sql
+directly from the transactions / merchants tables (or their typed CSV /
+Parquet cache), instead of running the query in SSMS, exporting
+Fraud Model.csv by hand and reading it back.
+
+One stable sort by (merchant, timestamp) feeds every feature:
+
+- merchant_avg_amount / merchant_std_amount    AVG / STDEV (sample) per merchant
+- time_since_last_tx_sec                        DATEDIFF(second, LAG(ts), ts)
+- merchant_age_days / is_early_lifecycle_tx     DATEDIFF(day, signup, ts) (<= 14)
+- hour_of_day / is_weekend                      DATEPART(hour) / Saturday-Sunday
+- merchant_failure_rate_7d                      inclusive 7-day window (Failure_Rate)
+
+Column names, order and dtypes match Data_Loader.FRAUD_MODEL_SCHEMA, so
+Fraud_Detection.py can use either source unchanged.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from Failure_Rate import WINDOW, sorted_failure_rate
+
+
+FRAUD_MODEL_COLUMNS = [
+    "transaction_id",
+    "merchant_id",
+    "transaction_timestamp",
+    "transaction_amount",
+    "merchant_avg_amount",
+    "merchant_std_amount",
+    "hour_of_day",
+    "is_weekend",
+    "time_since_last_tx_sec",
+    "merchant_age_days",
+    "is_early_lifecycle_tx",
+    "payment_method",
+    "merchant_failure_rate_7d",
+]
+
+EARLY_LIFECYCLE_DAYS = 14
+
+NS_PER_SECOND = 1_000_000_000
+NS_PER_HOUR = 3600 * NS_PER_SECOND
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+
+def _ns(values):
+    return np.asarray(pd.to_datetime(values), dtype="datetime64[ns]").view(np.int64)
+
+
+def id_ranks(ids):
+    """
+    Dense ascending rank of each id, as int64: an integer tie break that sorts
+    like the id strings. Arrow's string sort is far faster than numpy's
+    argsort over Python objects.
+    """
+    array = pa.array(ids if isinstance(ids, pd.Series) else np.asarray(ids, dtype=object))
+    return pc.rank(array, sort_keys="ascending", tiebreaker="dense").to_numpy().astype(np.int64)
+
+
+def segment_bounds(sorted_codes):
+    """Start index of each run of equal codes, and the run id of every row (both empty for no rows)."""
+    if len(sorted_codes) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate([[True], sorted_codes[1:] != sorted_codes[:-1]]))
+    run = np.cumsum(np.concatenate([[False], sorted_codes[1:] != sorted_codes[:-1]]))
+    return starts, run
+
+
+def merchant_mean_std(amount, starts, run):
+    """Per-row merchant AVG and sample STDEV (NaN for single-transaction merchants)."""
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.float64), np.zeros(0, dtype=np.float64)
+    counts = np.diff(np.concatenate([starts, [len(amount)]]))
+    mean = np.add.reduceat(amount, starts) / counts
+    sq_dev = np.add.reduceat((amount - mean[run]) ** 2, starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.where(counts > 1, np.sqrt(sq_dev / (counts - 1)), np.nan)
+    return mean[run], std[run]
+
+
+def fraud_feature_arrays(merchant_codes, ts, amount, failed, signup, tie_break, window=WINDOW):
+    """
+    Per-transaction feature columns from plain arrays, in input row order.
+
+    merchant_codes: int codes; ts / signup: int64 nanoseconds; failed: bool;
+    tie_break: ranks ordering rows that share a merchant and timestamp.
+    """
+    # ---------- ONE SORT ----------
+    order = np.lexsort((tie_break, ts, merchant_codes))
+    codes_sorted = merchant_codes[order]
+    ts_sorted = ts[order]
+    starts, run = segment_bounds(codes_sorted)
+
+    # ---------- SCAN ----------
+    avg_sorted, std_sorted = merchant_mean_std(amount[order], starts, run)
+
+    # DATEDIFF(second, prev, ts) counts second boundaries crossed
+    seconds = ts_sorted // NS_PER_SECOND
+    since_last_sorted = np.empty(len(ts_sorted), dtype=np.float64)
+    since_last_sorted[1:] = seconds[1:] - seconds[:-1]
+    since_last_sorted[starts] = np.nan
+
+    rate_sorted = sorted_failure_rate(codes_sorted, ts_sorted, failed[order], window)
+
+    def unsort(values):
+        out = np.empty_like(values)
+        out[order] = values
+        return out
+
+    # DATEDIFF(day, signup, ts) counts midnights crossed
+    age_days = ts // NS_PER_DAY - signup // NS_PER_DAY
+    day_of_week = (ts // NS_PER_DAY + 3) % 7   # 1970-01-01 was a Thursday; Monday = 0
+
+    return {
+        "merchant_avg_amount": unsort(avg_sorted),
+        "merchant_std_amount": unsort(std_sorted),
+        "hour_of_day": ((ts // NS_PER_HOUR) % 24).astype(np.int8),
+        "is_weekend": (day_of_week >= 5).astype(np.int8),
+        "time_since_last_tx_sec": unsort(since_last_sorted),
+        "merchant_age_days": age_days.astype(np.int32),
+        "is_early_lifecycle_tx": (age_days <= EARLY_LIFECYCLE_DAYS).astype(np.int8),
+        "merchant_failure_rate_7d": unsort(rate_sorted).astype(np.float32),
+    }
+
+
+def live_merchant_rows(transactions_df, merchants_df):
+    """LIVE transactions that join to a merchant, and their merchant codes (row numbers in merchants_df)."""
+    live = transactions_df[transactions_df["environment"] == "LIVE"]
+
+    # JOIN merchants: transactions without a merchant row drop out, as in SQL
+    merchant_index = pd.Index(np.asarray(merchants_df["merchant_id"], dtype=object))
+    merchant_codes = merchant_index.get_indexer(np.asarray(live["merchant_id"], dtype=object))
+    return live[merchant_codes >= 0], merchant_codes[merchant_codes >= 0].astype(np.int64)
+
+
+def build_fraud_features(transactions_df, merchants_df, window=WINDOW):
+    """Fraud model matrix for the LIVE transactions, in input row order."""
+    live, merchant_codes = live_merchant_rows(transactions_df, merchants_df)
+
+    ts = _ns(live["transaction_timestamp"])
+    amount = live["amount"].to_numpy(dtype=np.float64)
+    # transaction_id breaks timestamp ties so LAG is deterministic
+    tie_break = id_ranks(live["transaction_id"])
+
+    features = fraud_feature_arrays(
+        merchant_codes, ts, amount,
+        failed=(live["status"] == "FAILED").to_numpy(),
+        signup=_ns(merchants_df["signup_timestamp"])[merchant_codes],
+        tie_break=tie_break,
+        window=window,
+    )
+
+    return pd.DataFrame({
+        "transaction_id": live["transaction_id"].to_numpy(),
+        "merchant_id": live["merchant_id"].to_numpy(),
+        "transaction_timestamp": ts.view("datetime64[ns]"),
+        "transaction_amount": amount,
+        "payment_method": pd.Categorical(live["payment_method"]),
+        **features,
+    })[FRAUD_MODEL_COLUMNS]
+
+
+def compare_with_export(features_df, export_df):
+    """
+    Max abs difference per feature column against an SSMS export (matched on transaction_id).
+
+    LAG has no defined order among rows sharing a merchant and timestamp, so
+    time_since_last_tx_sec is compared as the sorted values within each
+    (merchant_id, transaction_timestamp) group rather than row by row.
+    """
+    merged = features_df.merge(export_df, on="transaction_id", suffixes=("", "_sql"))
+    report = {"rows": len(features_df), "export_rows": len(export_df), "matched": len(merged)}
+
+    for column in FRAUD_MODEL_COLUMNS[3:]:
+        left, right = merged[column], merged[f"{column}_sql"]
+        if column == "payment_method":
+            report[column] = int((left.astype(str) != right.astype(str)).sum())
+            continue
+        if column == "time_since_last_tx_sec":
+            keys = ["merchant_id", "transaction_timestamp"]
+            left = merged[keys + [column]].sort_values(keys + [column], na_position="first")[column]
+            right = merged[keys + [f"{column}_sql"]].sort_values(
+                keys + [f"{column}_sql"], na_position="first"
+            )[f"{column}_sql"]
+            left, right = left.reset_index(drop=True), right.reset_index(drop=True)
+        both_null = left.isna() & right.isna()
+        one_null = left.isna() ^ right.isna()
+        diff = (left.astype(float) - right.astype(float)).abs().where(~both_null, 0.0)
+        report[column] = float(np.inf) if one_null.any() else float(diff.max())
+
+    return report
+
+
+if __name__ == "__main__":
+    import time
+
+    from Data_Loader import load_dataset
+
+    transactions_df = load_dataset("transactions")
+    merchants_df = load_dataset("merchants")
+
+    started = time.perf_counter()
+    features_df = build_fraud_features(transactions_df, merchants_df)
+    print(f"Built {features_df.shape} in {time.perf_counter() - started:.3f}s")
+
+    for column, value in compare_with_export(features_df, load_dataset("fraud_model")).items():
+        print(f"  {column:<26} {value}")
@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+The Fraud_Detection.py model as importable pieces.
+
+The notebook cleans the fraud feature matrix, adds the ratio / z-score /
+burst columns and one-hot payment methods, scales it, fits an
+IsolationForest and then scores only the anomalies with the rule-based
+fraud_risk_score. The same steps are here so a service (or a later batch
+job) can fit once and score new transactions without re-running the
+notebook.
+
+save_model() writes the scaler + forest as a numbered version under
+models/fraud. load_model() reads back only the flattened forest arrays
+(FlatForest), which score without sklearn's per-tree Python dispatch.
+"""
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+from Fraud_Rules import compile_rules
+
+
+# Same list as Fraud_Detection.py, including the repeated merchant_std_amount,
+# so a model fitted here matches the notebook's. Fitting on arrays keeps
+# newer scikit-learn from rejecting the duplicate column name.
+FRAUD_FEATURES = [
+    "transaction_amount",
+    "merchant_avg_amount",
+    "is_weekend",
+    "merchant_std_amount",
+    "merchant_std_amount",
+    "time_since_last_tx_sec",
+    "hour_of_day",
+    "merchant_age_days",
+    "is_early_lifecycle_tx",
+    "merchant_failure_rate_7d",
+    "amount_to_avg_ratio",
+    "z_score_amount",
+    "rapid_repeat_tx",
+    "burst_tx",
+    "method_card",
+    "method_ussd",
+    "method_bank",
+]
+
+CONTAMINATION = 0.02
+N_ESTIMATORS = 100
+RANDOM_STATE = 42
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models", "fraud")
+FORMAT_VERSION = 1
+FOREST_CHUNK = 1024   # rows per traversal block, so the trees x rows work arrays stay in cache
+
+
+# ---------- FEATURES ----------
+
+def _column(features, name):
+    return np.asarray(features[name], dtype=np.float64)
+
+
+def prepare_fraud_frame(features, time_since_fill):
+    """
+    Notebook cleaning + derived columns as a dict of float64 arrays.
+
+    features is a DataFrame or any mapping of columns; time_since_fill is the
+    training median of time_since_last_tx_sec.
+    """
+    amount = _column(features, "transaction_amount")
+    avg = _column(features, "merchant_avg_amount")
+    std = np.nan_to_num(_column(features, "merchant_std_amount"))
+    since_last = _column(features, "time_since_last_tx_sec")
+    since_last = np.where(np.isnan(since_last), time_since_fill, since_last)
+
+    prepared = {
+        "transaction_amount": amount,
+        "merchant_avg_amount": avg,
+        "merchant_std_amount": std,
+        "time_since_last_tx_sec": since_last,
+    }
+    for name in ("hour_of_day", "is_weekend", "merchant_age_days",
+                 "is_early_lifecycle_tx", "merchant_failure_rate_7d"):
+        prepared[name] = _column(features, name)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        prepared["amount_to_avg_ratio"] = amount / avg
+        prepared["z_score_amount"] = (amount - avg) / std
+    prepared["rapid_repeat_tx"] = (since_last < 60).astype(np.float64)
+    prepared["burst_tx"] = (since_last < 300).astype(np.float64)
+
+    method = np.asarray(features["payment_method"], dtype=object)
+    for name in ("card", "ussd", "bank"):
+        prepared[f"method_{name}"] = (method == name).astype(np.float64)
+    return prepared
+
+
+def fraud_matrix(prepared):
+    """float64 model input in FRAUD_FEATURES order."""
+    return np.column_stack([prepared[column] for column in FRAUD_FEATURES])
+
+
+# ---------- FOREST ----------
+
+def average_path_length(n_samples):
+    """Expected isolation depth c(n) of an unsuccessful BST search (Liu et al.)."""
+    n = np.asarray(n_samples, dtype=np.float64)
+    out = np.zeros_like(n)
+    out[n == 2] = 1.0
+    big = n > 2
+    out[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return out
+
+
+def leaf_path_lengths(tree):
+    """Per node: nodes on the path from the root + c(n_node_samples) - 1."""
+    return tree.compute_node_depths() + average_path_length(tree.n_node_samples) - 1.0
+
+
+class FlatForest:
+    """
+    Every isolation tree in one set of contiguous node arrays.
+
+    Nodes of tree t occupy [roots[t], roots[t + 1]). feature holds the column
+    of X (already mapped through estimators_features_), children holds
+    (left, right) pairs, and leaves point to themselves, so a batch is
+    traversed level by level for max_depth steps with no per-tree Python loop
+    and no leaf masks. path_length is depth + c(n_node_samples) - 1 per node.
+    X is compared as float32 against float64 thresholds, like sklearn, and
+    path lengths are summed in tree order, so decision_function reproduces
+    IsolationForest.decision_function.
+    """
+
+    ARRAYS = ("feature", "threshold", "children", "missing_left", "path_length", "roots")
+
+    def __init__(self, feature, threshold, children, missing_left, path_length, roots,
+                 max_depth, normalizer, offset):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.missing_left = missing_left
+        self.path_length = path_length
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.normalizer = float(normalizer)
+        self.offset = float(offset)
+        self.has_missing = bool(missing_left.any())
+
+    @classmethod
+    def from_isolation_forest(cls, iso_forest):
+        feature, threshold, children, missing_left, path_length, roots = [], [], [], [], [], []
+        start = 0
+        for estimator, columns in zip(iso_forest.estimators_, iso_forest.estimators_features_):
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left == -1
+
+            roots.append(start)
+            feature.append(np.where(leaf, 0, np.asarray(columns)[np.maximum(tree.feature, 0)]))
+            threshold.append(np.where(leaf, 0.0, tree.threshold))
+            children.append(np.column_stack([
+                np.where(leaf, nodes, tree.children_left),
+                np.where(leaf, nodes, tree.children_right),
+            ]) + start)
+            missing_left.append(np.asarray(getattr(tree, "missing_go_to_left", np.zeros(tree.node_count)), dtype=bool))
+            path_length.append(leaf_path_lengths(tree))
+            start += tree.node_count
+
+        return cls(
+            feature=np.concatenate(feature).astype(np.int32),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            children=np.concatenate(children).astype(np.int32).ravel(),
+            missing_left=np.concatenate(missing_left),
+            path_length=np.concatenate(path_length),
+            roots=np.array(roots, dtype=np.int32),
+            max_depth=max(e.tree_.max_depth for e in iso_forest.estimators_),
+            normalizer=len(iso_forest.estimators_) * average_path_length([iso_forest.max_samples_])[0],
+            offset=iso_forest.offset_,
+        )
+
+    def to_arrays(self):
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        arrays.update(max_depth=self.max_depth, normalizer=self.normalizer, offset=self.offset)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(**{name: np.asarray(arrays[name]) for name in cls.ARRAYS},
+                   max_depth=arrays["max_depth"], normalizer=arrays["normalizer"], offset=arrays["offset"])
+
+    def path_lengths(self, X, chunk=FOREST_CHUNK):
+        """Summed path length per row of X (n_rows x n_features)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        depths = np.empty(len(X), dtype=np.float64)
+
+        # Rows with NaN need the per-node missing-value direction; keep them off the fast path
+        missing = np.isnan(X).any(axis=1) if self.has_missing else np.zeros(len(X), dtype=bool)
+        for rows, with_missing in ((np.flatnonzero(~missing), False), (np.flatnonzero(missing), True)):
+            if not len(rows):
+                continue
+            block = X if len(rows) == len(X) else X[rows]
+            out = depths if len(rows) == len(X) else np.empty(len(rows), dtype=np.float64)
+            for start in range(0, len(block), chunk):
+                out[start:start + chunk] = self._traverse(block[start:start + chunk], with_missing)
+            if out is not depths:
+                depths[rows] = out
+        return depths
+
+    def _traverse(self, block, with_missing):
+        n_trees, n_rows = len(self.roots), len(block)
+        flat = block.ravel()
+        row_offset = (np.arange(n_rows, dtype=np.int32) * block.shape[1])[None, :]
+
+        node = np.repeat(self.roots[:, None], n_rows, axis=1)   # (trees, rows)
+        index = np.empty((n_trees, n_rows), dtype=np.int32)
+        x = np.empty((n_trees, n_rows), dtype=np.float32)
+        threshold = np.empty((n_trees, n_rows), dtype=np.float64)
+        go_right = np.empty((n_trees, n_rows), dtype=bool)
+
+        for _ in range(self.max_depth):
+            np.take(self.feature, node, out=index)
+            index += row_offset
+            np.take(flat, index, out=x)
+            np.take(self.threshold, node, out=threshold)
+            np.greater(x, threshold, out=go_right)
+            if with_missing:
+                go_right |= np.isnan(x) & ~self.missing_left[node]
+            np.multiply(node, 2, out=index)
+            index += go_right
+            np.take(self.children, index, out=node)
+
+        total = np.zeros(n_rows, dtype=np.float64)
+        for tree_lengths in self.path_length[node]:   # tree order, as IsolationForest accumulates
+            total += tree_lengths
+        return total
+
+    def decision_function(self, X):
+        return -(2.0 ** (-self.path_lengths(X) / self.normalizer)) - self.offset
+
+
+# ---------- MODEL ----------
+
+class FraudModel:
+    """StandardScaler + IsolationForest fitted the way Fraud_Detection.py does."""
+
+    def __init__(self, contamination=CONTAMINATION, n_estimators=N_ESTIMATORS, random_state=RANDOM_STATE):
+        self.scaler = StandardScaler()
+        self.iso_forest = IsolationForest(
+            contamination=contamination, random_state=random_state, n_estimators=n_estimators
+        )
+        self.time_since_fill = None
+        self.mean = None
+        self.scale = None
+        self.forest = None
+        self.metadata = {}
+        self.rules = compile_rules()
+
+    @classmethod
+    def from_fitted(cls, scaler, iso_forest, time_since_fill):
+        """Wrap a scaler + forest fitted elsewhere (e.g. in the notebook)."""
+        model = cls()
+        model.scaler, model.iso_forest = scaler, iso_forest
+        model.time_since_fill = float(time_since_fill)
+        model._flatten()
+        return model
+
+    def fit(self, features_df):
+        self.time_since_fill = float(np.nanmedian(_column(features_df, "time_since_last_tx_sec")))
+        X = fraud_matrix(self.prepare(features_df))
+        self.iso_forest.fit(self.scaler.fit_transform(X))
+        self._flatten()
+        return self
+
+    def _flatten(self):
+        self.mean = np.asarray(self.scaler.mean_, dtype=np.float64)
+        self.scale = np.asarray(self.scaler.scale_, dtype=np.float64)
+        self.forest = FlatForest.from_isolation_forest(self.iso_forest)
+
+    def prepare(self, features):
+        return prepare_fraud_frame(features, self.time_since_fill)
+
+    def anomaly_score(self, prepared):
+        X = (fraud_matrix(prepared) - self.mean) / self.scale
+        return self.forest.decision_function(X)
+
+    def score(self, features):
+        """anomaly_score, is_fraud, fraud_risk_score and fraud_action per row (rules only on anomalies)."""
+        prepared = self.prepare(features)
+        anomaly = self.anomaly_score(prepared)
+        is_fraud = anomaly < 0   # IsolationForest.predict == -1
+
+        risk = self.rules.score(prepared, where=is_fraud)
+        action = self.rules.action_labels(risk)
+        return {
+            "anomaly_score": anomaly,
+            "is_fraud": is_fraud.astype(np.int8),
+            "fraud_risk_score": risk,
+            "fraud_action": action,
+        }
+
+
+# ---------- PERSISTENCE ----------
+
+def model_versions(root=MODEL_DIR):
+    """Saved version numbers under root, ascending."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(int(name[1:]) for name in os.listdir(root) if name.startswith("v") and name[1:].isdigit())
+
+
+def save_model(model, root=MODEL_DIR, **metadata):
+    """
+    Write model as the next version under root and return its directory.
+
+    v0001/flat_forest.npz   scaler mean/scale + FlatForest arrays (enough to score)
+    v0001/sklearn.joblib    the fitted StandardScaler and IsolationForest
+    v0001/metadata.json     version, creation time, library versions, settings
+    """
+    import sklearn
+
+    versions = model_versions(root)
+    version = versions[-1] + 1 if versions else 1
+    path = os.path.join(root, f"v{version:04d}")
+    os.makedirs(path)
+
+    np.savez(os.path.join(path, "flat_forest.npz"), scaler_mean=model.mean, scaler_scale=model.scale,
+             **model.forest.to_arrays())
+    joblib.dump({"scaler": model.scaler, "iso_forest": model.iso_forest}, os.path.join(path, "sklearn.joblib"))
+
+    model.metadata = {
+        "format_version": FORMAT_VERSION,
+        "model_version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "sklearn_version": sklearn.__version__,
+        "numpy_version": np.__version__,
+        "features": FRAUD_FEATURES,
+        "time_since_fill": model.time_since_fill,
+        "contamination": model.iso_forest.contamination,
+        "n_estimators": len(model.iso_forest.estimators_),
+        "max_samples": int(model.iso_forest.max_samples_),
+        **metadata,
+    }
+    with open(os.path.join(path, "metadata.json"), "w") as f:
+        json.dump(model.metadata, f, indent=2)
+    return path
+
+
+def load_model(root=MODEL_DIR, version=None, with_sklearn=False):
+    """
+    Load a saved version (latest by default) ready to score.
+
+    Only the flat arrays are read unless with_sklearn, so scoring does not
+    unpickle the forest.
+    """
+    versions = model_versions(root)
+    if not versions:
+        raise FileNotFoundError(f"No saved fraud models under {root}")
+    version = versions[-1] if version is None else version
+    path = os.path.join(root, f"v{version:04d}")
+
+    with open(os.path.join(path, "metadata.json")) as f:
+        metadata = json.load(f)
+    if metadata["format_version"] != FORMAT_VERSION:
+        raise ValueError(f"{path} has format {metadata['format_version']}, expected {FORMAT_VERSION}")
+
+    model = FraudModel()
+    with np.load(os.path.join(path, "flat_forest.npz")) as arrays:
+        model.mean = arrays["scaler_mean"]
+        model.scale = arrays["scaler_scale"]
+        model.forest = FlatForest.from_arrays(arrays)
+    model.time_since_fill = metadata["time_since_fill"]
+    model.metadata = metadata
+
+    if with_sklearn:
+        fitted = joblib.load(os.path.join(path, "sklearn.joblib"))
+        model.scaler, model.iso_forest = fitted["scaler"], fitted["iso_forest"]
+    else:
+        model.scaler = model.iso_forest = None
+    return model
+
+
+# ---------- BENCHMARK ----------
+
+def _throughput(fn, X, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(X)
+        best = min(best, time.perf_counter() - started)
+    return {"rows": len(X), "ms": round(best * 1000, 3), "rows_per_sec": round(len(X) / best)}
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    from Data_Loader import load_dataset
+    from Fraud_Features import build_fraud_features
+
+    parser = argparse.ArgumentParser(description="Train once, save, load, and measure fraud scoring throughput")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 256, 10_000, 1_000_000])
+    args = parser.parse_args()
+
+    features_df = build_fraud_features(load_dataset("transactions"), load_dataset("merchants"))
+
+    started = time.perf_counter()
+    trained = FraudModel().fit(features_df)
+    print(f"train: {time.perf_counter() - started:.3f}s on {len(features_df):,} rows")
+
+    with tempfile.TemporaryDirectory() as root:
+        started = time.perf_counter()
+        path = save_model(trained, root, training_rows=len(features_df))
+        print(f"save:  {time.perf_counter() - started:.3f}s -> {os.path.basename(path)}")
+        started = time.perf_counter()
+        model = load_model(root)
+        print(f"load:  {time.perf_counter() - started:.3f}s (flat arrays only)")
+
+    X = (fraud_matrix(model.prepare(features_df)) - model.mean) / model.scale
+    diff = np.abs(model.forest.decision_function(X) - trained.iso_forest.decision_function(X)).max()
+    print(f"max |flat - sklearn decision_function| = {diff:.2e}")
+
+    # Scoring only, on the real rows tiled up to each batch size
+    for size in args.batch_sizes:
+        batch = X[np.arange(size) % len(X)]
+        flat = _throughput(model.forest.decision_function, batch)
+        ref = _throughput(trained.iso_forest.decision_function, batch, repeat=1 if size > 10_000 else 3)
+        print(f"batch {size:>9,}: flat {flat['ms']:>10.3f}ms ({flat['rows_per_sec']:>10,}/s)"
+              f"   sklearn {ref['ms']:>10.3f}ms ({ref['rows_per_sec']:>10,}/s)")
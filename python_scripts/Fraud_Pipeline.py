@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Merchant-partitioned, multi-core fraud pipeline.
+
+Every fraud feature (AVG/STDEV, LAG, the 7-day failure rate, the burst
+flags, merchant_fraud_flag) depends only on the merchant's own rows, so
+transactions are hash-partitioned by merchant_id and each partition is
+processed independently:
+
+1. The parent reorders the LIVE rows so each partition is one contiguous
+   slice and writes the input columns as .npy files in a temp directory.
+2. Pool workers memory-map those files (nothing is pickled per task), build
+   features and/or score their slice, and write into memory-mapped output
+   columns at the same offsets.
+3. The parent un-permutes the outputs once, which gives the same rows in
+   the same order as the serial path.
+
+Without a fitted model, stage 1 builds features, the parent fits FraudModel
+on them, and stage 2 scores in parallel from the feature outputs.
+"""
+
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from Failure_Rate import WINDOW
+from Fraud_Features import FRAUD_MODEL_COLUMNS, _ns, fraud_feature_arrays, id_ranks, live_merchant_rows
+from Fraud_Model import FlatForest, FraudModel, fraud_matrix, prepare_fraud_frame
+from Fraud_Rules import compile_rules
+from Simulation_Writer import merchant_bucket
+from Transaction_Simulator import PAYMENT_METHODS
+
+
+PARTITIONS_PER_WORKER = 4   # more partitions than workers evens out skewed merchants
+
+INPUT_COLUMNS = {
+    "merchant_code": np.int64,
+    "ts": np.int64,
+    "amount": np.float64,
+    "failed": np.bool_,
+    "signup": np.int64,
+    "tie_break": np.int64,
+    "method": np.int8,
+}
+
+FEATURE_COLUMNS = {
+    "merchant_avg_amount": np.float64,
+    "merchant_std_amount": np.float64,
+    "hour_of_day": np.int8,
+    "is_weekend": np.int8,
+    "time_since_last_tx_sec": np.float64,
+    "merchant_age_days": np.int32,
+    "is_early_lifecycle_tx": np.int8,
+    "merchant_failure_rate_7d": np.float32,
+}
+
+SCORE_COLUMNS = {
+    "anomaly_score": np.float64,
+    "is_fraud": np.int8,
+    "fraud_risk_score": np.int64,
+    "fraud_action": np.int8,
+    "merchant_fraud_flag": np.int8,
+}
+
+MODEL_FILE = "model.npz"
+
+# Method code -> name; code -1 (NULL or not in PAYMENT_METHODS) is None, which
+# prepare_fraud_frame treats like the serial path does: no method_* dummy set
+METHOD_NAMES = np.asarray(list(PAYMENT_METHODS) + [None], dtype=object)
+
+
+# ---------- WORKER ----------
+
+_COLUMNS = {}
+_MODEL = {}
+
+
+def _open_columns(directory):
+    """Memory-map every column file once per process."""
+    if _COLUMNS.get("directory") != directory:
+        _COLUMNS.clear()
+        _COLUMNS["directory"] = directory
+        for name in list(INPUT_COLUMNS) + list(FEATURE_COLUMNS) + list(SCORE_COLUMNS):
+            mode = "r" if name in INPUT_COLUMNS else "r+"
+            _COLUMNS[name] = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode)
+    return _COLUMNS
+
+
+def _load_model(directory):
+    path = os.path.join(directory, MODEL_FILE)
+    if _MODEL.get("path") != path:
+        with np.load(path) as arrays:
+            _MODEL.update(
+                path=path,
+                mean=arrays["scaler_mean"],
+                scale=arrays["scaler_scale"],
+                time_since_fill=float(arrays["time_since_fill"]),
+                forest=FlatForest.from_arrays(arrays),
+            )
+        _MODEL["rules"] = compile_rules()
+    return _MODEL
+
+
+def run_partition(directory, start, stop, build=True, score=True, window=WINDOW):
+    """Features and/or scores for rows [start, stop) of the partition-grouped columns."""
+    columns = _open_columns(directory)
+    rows = slice(start, stop)
+    codes = np.asarray(columns["merchant_code"][rows])
+
+    if build:
+        features = fraud_feature_arrays(
+            codes, np.asarray(columns["ts"][rows]), np.asarray(columns["amount"][rows]),
+            failed=np.asarray(columns["failed"][rows]),
+            signup=np.asarray(columns["signup"][rows]),
+            tie_break=np.asarray(columns["tie_break"][rows]),
+            window=window,
+        )
+        for name, values in features.items():
+            columns[name][rows] = values
+
+    if score:
+        model = _load_model(directory)
+        features = {name: np.asarray(columns[name][rows]) for name in FEATURE_COLUMNS}
+        features["transaction_amount"] = np.asarray(columns["amount"][rows])
+        features["payment_method"] = METHOD_NAMES[columns["method"][rows]]
+
+        prepared = prepare_fraud_frame(features, model["time_since_fill"])
+        anomaly = model["forest"].decision_function((fraud_matrix(prepared) - model["mean"]) / model["scale"])
+        is_fraud = anomaly < 0
+        risk = model["rules"].score(prepared, where=is_fraud)
+
+        # groupby('merchant_id')['is_fraud'].transform('max'): merchants never span partitions
+        local, inverse = np.unique(codes, return_inverse=True)
+        merchant_flag = np.zeros(len(local), dtype=np.int8)
+        merchant_flag[inverse[is_fraud]] = 1
+
+        columns["anomaly_score"][rows] = anomaly
+        columns["is_fraud"][rows] = is_fraud
+        columns["fraud_risk_score"][rows] = risk
+        columns["fraud_action"][rows] = model["rules"].action_codes(risk)
+        columns["merchant_fraud_flag"][rows] = merchant_flag[inverse]
+
+    return stop - start
+
+
+# ---------- PARENT ----------
+
+def _write_columns(directory, n, arrays):
+    for name, dtype in {**INPUT_COLUMNS, **FEATURE_COLUMNS, **SCORE_COLUMNS}.items():
+        out = np.lib.format.open_memmap(os.path.join(directory, f"{name}.npy"), mode="w+", dtype=dtype, shape=(n,))
+        if name in arrays:
+            out[:] = arrays[name]
+        out.flush()
+        del out
+
+
+def _save_model(directory, model):
+    np.savez(
+        os.path.join(directory, MODEL_FILE),
+        scaler_mean=model.mean, scaler_scale=model.scale, time_since_fill=model.time_since_fill,
+        **model.forest.to_arrays()
+    )
+
+
+def _run_stage(executor, directory, bounds, build, score):
+    tasks = [(directory, start, stop, build, score) for start, stop in bounds if stop > start]
+    if executor is None:
+        return sum(run_partition(*task) for task in tasks)
+    return sum(f.result() for f in [executor.submit(run_partition, *task) for task in tasks])
+
+
+def run_fraud_pipeline(transactions_df, merchants_df, model=None, workers=os.cpu_count(), partitions=None):
+    """
+    Fraud features + scores for the LIVE transactions, in the same row order as
+    build_fraud_features. Fits a FraudModel on the features when model is None.
+
+    Returns (scored DataFrame, fitted or given model).
+    """
+    workers = max(1, workers or 1)
+    partitions = partitions or workers * PARTITIONS_PER_WORKER
+
+    live, merchant_codes = live_merchant_rows(transactions_df, merchants_df)
+    n = len(live)
+
+    # Hash partition by merchant_id, then group rows so each partition is a contiguous slice
+    partition = merchant_bucket(merchants_df["merchant_id"], partitions)[merchant_codes]
+    grouped = np.argsort(partition, kind="stable")
+    bounds = np.searchsorted(partition[grouped], np.arange(partitions + 1))
+    bounds = list(zip(bounds[:-1], bounds[1:]))
+
+    method_codes = pd.Index(PAYMENT_METHODS).get_indexer(np.asarray(live["payment_method"], dtype=object))
+    inputs = {
+        "merchant_code": merchant_codes,
+        "ts": _ns(live["transaction_timestamp"]),
+        "amount": live["amount"].to_numpy(dtype=np.float64),
+        "failed": (live["status"] == "FAILED").to_numpy(),
+        "signup": _ns(merchants_df["signup_timestamp"])[merchant_codes],
+        "tie_break": id_ranks(live["transaction_id"]),
+        "method": method_codes,
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        _write_columns(directory, n, {name: values[grouped] for name, values in inputs.items()})
+        if model is not None:
+            _save_model(directory, model)
+
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            if model is None:
+                _run_stage(executor, directory, bounds, build=True, score=False)
+                features = {name: np.load(os.path.join(directory, f"{name}.npy")) for name in FEATURE_COLUMNS}
+                features["transaction_amount"] = inputs["amount"][grouped]
+                features["payment_method"] = METHOD_NAMES[inputs["method"][grouped]]
+                # Fit on the rows in their original order, as the serial path does
+                model = FraudModel().fit({name: _ungroup(values, grouped) for name, values in features.items()})
+                _save_model(directory, model)
+                _run_stage(executor, directory, bounds, build=False, score=True)
+            else:
+                _run_stage(executor, directory, bounds, build=True, score=True)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            _COLUMNS.clear()
+            _MODEL.clear()
+
+        outputs = {
+            name: _ungroup(np.load(os.path.join(directory, f"{name}.npy")), grouped)
+            for name in list(FEATURE_COLUMNS) + list(SCORE_COLUMNS)
+        }
+
+    scored = pd.DataFrame({
+        "transaction_id": live["transaction_id"].to_numpy(),
+        "merchant_id": live["merchant_id"].to_numpy(),
+        "transaction_timestamp": inputs["ts"].view("datetime64[ns]"),
+        "transaction_amount": inputs["amount"],
+        "payment_method": pd.Categorical(live["payment_method"]),
+        **{name: outputs[name] for name in FEATURE_COLUMNS},
+    })[FRAUD_MODEL_COLUMNS]
+    for name in SCORE_COLUMNS:
+        scored[name] = outputs[name]
+    scored["fraud_action"] = pd.Categorical.from_codes(outputs["fraud_action"], categories=model.rules.action_names)
+    return scored, model
+
+
+def _ungroup(values, grouped):
+    """Partition-grouped order -> original row order."""
+    out = np.empty_like(values)
+    out[grouped] = values
+    return out
+
+
+def serial_fraud_pipeline(transactions_df, merchants_df):
+    """Reference single-process path: build_fraud_features + FraudModel + merchant_fraud_flag."""
+    from Fraud_Features import build_fraud_features
+
+    features = build_fraud_features(transactions_df, merchants_df)
+    model = FraudModel().fit(features)
+    scored = features.copy()
+    for name, values in model.score(features).items():
+        scored[name] = values
+    scored["merchant_fraud_flag"] = scored.groupby("merchant_id")["is_fraud"].transform("max").astype(np.int8)
+    return scored
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from Transaction_Simulator import simulate
+
+    parser = argparse.ArgumentParser(description="Scale the merchant-partitioned fraud pipeline across cores")
+    parser.add_argument("--merchants", type=int, default=40_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    merchants_df, _, transactions_df = simulate(args.merchants)
+    # A NULL and an unknown payment_method must score the same as in the serial path
+    methods = transactions_df["payment_method"].astype(object)
+    methods.iloc[::997] = None
+    methods.iloc[1::997] = "crypto"
+    transactions_df["payment_method"] = methods
+    print(f"{len(transactions_df):,} transactions, {os.cpu_count()} cores available")
+
+    started = time.perf_counter()
+    reference = serial_fraud_pipeline(transactions_df, merchants_df)
+    serial = time.perf_counter() - started
+    print(f"serial (build_fraud_features + FraudModel): {serial:.2f}s")
+
+    baseline = None
+    for workers in args.workers:
+        started = time.perf_counter()
+        scored, _ = run_fraud_pipeline(transactions_df, merchants_df, workers=workers)
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+
+        same = all(
+            np.array_equal(np.asarray(scored[c]), np.asarray(reference[c]), equal_nan=scored[c].dtype.kind == "f")
+            if c not in ("payment_method", "fraud_action")
+            else scored[c].astype(object).fillna("").equals(reference[c].astype(object).fillna(""))
+            for c in scored
+        )
+        print(f"workers={workers}: {elapsed:.2f}s  speedup vs 1 worker {baseline / elapsed:.2f}x  "
+              f"identical to serial: {same}")
@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Real-time fraud scoring service with adaptive micro-batching.
+
+Each request is a single transaction. It is queued, and one batcher task
+groups queued requests into micro-batches bounded by MAX_BATCH requests and
+MAX_WAIT_MS of waiting. Everything already queued is always taken; the
+batcher only waits for more while the batch is smaller than the recent
+average batch (an EWMA), so at low load a request is scored alone straight
+away, and under load the batches grow and the model runs vectorized.
+
+A batch is scored on one worker thread so the event loop keeps accepting
+requests:
+
+1. MerchantStateStore.update() per transaction (O(1) online features)
+2. FraudModel.score() once for the whole batch (IsolationForest + rules)
+3. DriftMonitor.update() per transaction, when a monitor is given, so the
+   score / amount / hour distributions per day and payment method stay current.
+   A monitor error is logged and counted; it never fails the scored requests.
+
+serve() exposes it over TCP as newline-delimited JSON (a local stand-in for
+an HTTP endpoint): send one transaction object per line, get back one
+{"transaction_id", "fraud_action", "anomaly_score", "fraud_risk_score"} per
+line.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from Merchant_State import STATE_FEATURES
+
+
+MAX_BATCH = 256
+MAX_WAIT_MS = 2.0
+EWMA_WEIGHT = 0.1
+HISTORY = 100_000      # latencies / batch sizes kept for report()
+
+log = logging.getLogger(__name__)
+
+
+class FraudScoringService:
+    """Queue + micro-batcher in front of a fitted FraudModel and a MerchantStateStore."""
+
+    def __init__(self, model, store, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, monitor=None):
+        self.model = model
+        self.store = store
+        self.monitor = monitor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.latencies = deque(maxlen=HISTORY)
+        self.batch_sizes = deque(maxlen=HISTORY)
+        self.requests = 0
+        self.batches = 0
+        self.monitor_errors = 0
+        self._avg_batch = 1.0
+        self._queue = None
+        self._task = None
+        self._executor = None
+        self._started = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1)   # keeps state updates in arrival order
+        self._task = asyncio.create_task(self._run())
+        self._started = time.perf_counter()
+        return self
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._executor.shutdown()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def score(self, transaction):
+        """Score one transaction dict; returns action, anomaly score and rule score."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((transaction, future, time.perf_counter()))
+        return await future
+
+    # ---------- BATCHING ----------
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0 or len(batch) >= self._avg_batch:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            self._avg_batch += EWMA_WEIGHT * (len(batch) - self._avg_batch)
+            try:
+                results = await loop.run_in_executor(self._executor, self._score_batch, [t for t, _, _ in batch])
+            except Exception as exc:
+                # A failed batch fails its requests, never the batcher
+                results = [exc] * len(batch)
+
+            finished = time.perf_counter()
+            for (_, future, queued), result in zip(batch, results):
+                self.latencies.append(finished - queued)
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            self.batch_sizes.append(len(batch))
+            self.requests += len(batch)
+            self.batches += 1
+
+    # ---------- SCORING ----------
+
+    def _score_batch(self, transactions):
+        rows, results = [], [None] * len(transactions)
+        for i, t in enumerate(transactions):
+            try:
+                rows.append((i, self.store.update(
+                    t["merchant_id"], t["transaction_timestamp"], t["amount"],
+                    t.get("status") == "FAILED", t.get("payment_method")
+                )))
+            except Exception as exc:
+                results[i] = exc
+
+        if not rows:
+            return results
+        try:
+            features = {name: [features[name] for _, features in rows] for name in STATE_FEATURES}
+            scored = self.model.score(features)
+            for (i, _), anomaly, risk, action in zip(
+                rows, scored["anomaly_score"], scored["fraud_risk_score"], scored["fraud_action"]
+            ):
+                results[i] = {
+                    "transaction_id": transactions[i].get("transaction_id"),
+                    "fraud_action": str(action),
+                    "anomaly_score": float(anomaly),
+                    "fraud_risk_score": float(risk),
+                }
+        except Exception as exc:
+            for i, _ in rows:
+                results[i] = exc
+            return results
+
+        if self.monitor is not None:
+            try:
+                for (i, row), anomaly, risk in zip(rows, scored["anomaly_score"], scored["fraud_risk_score"]):
+                    self.monitor.update(
+                        transactions[i]["transaction_timestamp"], row["payment_method"],
+                        anomaly_score=anomaly, fraud_risk_score=risk,
+                        transaction_amount=row["transaction_amount"], hour_of_day=row["hour_of_day"],
+                    )
+            except Exception:
+                self.monitor_errors += 1
+                log.exception("drift monitor update failed for a batch of %d", len(rows))
+        return results
+
+    def report(self):
+        """Requests served, p50/p99 latency (queue + scoring, last HISTORY requests) and throughput."""
+        latencies_ms = np.asarray(self.latencies) * 1000
+        elapsed = time.perf_counter() - self._started
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "monitor_errors": self.monitor_errors,
+            "mean_batch": round(float(np.mean(self.batch_sizes)), 1) if self.batch_sizes else 0.0,
+            "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3) if len(latencies_ms) else None,
+            "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3) if len(latencies_ms) else None,
+            "throughput_per_sec": round(self.requests / elapsed) if elapsed > 0 else None,
+        }
+
+
+# ---------- SOCKET STAND-IN ----------
+
+async def serve(service, host="127.0.0.1", port=8765):
+    """Newline-delimited JSON over TCP; requests on one connection are scored concurrently."""
+
+    async def handle(reader, writer):
+        lock = asyncio.Lock()
+        pending = set()
+
+        async def respond(line):
+            try:
+                result = await service.score(json.loads(line))
+            except Exception as exc:
+                result = {"error": f"{type(exc).__name__}: {exc}"}
+            async with lock:
+                writer.write((json.dumps(result) + "\n").encode())
+                await writer.drain()
+
+        while line := await reader.readline():
+            task = asyncio.create_task(respond(line))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+        writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+def transaction_messages(transactions_df):
+    """LIVE transactions in timestamp order as request dicts."""
+    live = transactions_df[transactions_df["environment"] == "LIVE"]
+    live = live.sort_values(["transaction_timestamp", "transaction_id"], kind="stable")
+    return [
+        {
+            "transaction_id": tid,
+            "merchant_id": m,
+            "transaction_timestamp": pd.Timestamp(ts).isoformat(),
+            "amount": float(amount),
+            "status": status,
+            "payment_method": method,
+        }
+        for tid, m, ts, amount, status, method in zip(
+            live["transaction_id"], live["merchant_id"], live["transaction_timestamp"],
+            live["amount"], live["status"], live["payment_method"]
+        )
+    ]
+
+
+async def run_clients(port, messages, clients):
+    """Closed-loop clients: each sends its share one request at a time; returns round-trip seconds."""
+
+    async def client(share):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        round_trips = []
+        for message in share:
+            started = time.perf_counter()
+            writer.write((json.dumps(message) + "\n").encode())
+            await writer.drain()
+            await reader.readline()
+            round_trips.append(time.perf_counter() - started)
+        writer.close()
+        return round_trips
+
+    results = await asyncio.gather(*(client(messages[i::clients]) for i in range(clients)))
+    return [rt for share in results for rt in share]
+
+
+def client_process(port, messages, clients):
+    """run_clients in its own process, so load generation does not share the server's GIL."""
+    return asyncio.run(run_clients(port, messages, clients))
+
+
+if __name__ == "__main__":
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+
+    from Data_Loader import load_dataset
+    from Drift_Monitor import DriftMonitor
+    from Fraud_Features import build_fraud_features
+    from Fraud_Model import FraudModel
+    from Merchant_State import MerchantStateStore
+
+    parser = argparse.ArgumentParser(description="Replay transactions through the fraud scoring service")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--monitor", action="store_true", help="keep a DriftMonitor updated while serving")
+    args = parser.parse_args()
+
+    transactions_df = load_dataset("transactions")
+    merchants_df = load_dataset("merchants")
+    features = build_fraud_features(transactions_df, merchants_df)
+    model = FraudModel().fit(features)
+    baseline = features.assign(**model.score(features))
+    messages = transaction_messages(transactions_df)
+
+    async def main(clients):
+        store = MerchantStateStore().register_merchants(merchants_df)
+        monitor = DriftMonitor().fit_baseline(baseline) if args.monitor else None
+        async with FraudScoringService(model, store, args.max_batch, args.max_wait_ms, monitor) as service:
+            server = await serve(service, port=0)
+            port = server.sockets[0].getsockname()[1]
+            started = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                round_trips = await asyncio.get_running_loop().run_in_executor(
+                    pool, client_process, port, messages, clients
+                )
+            round_trips = np.asarray(round_trips) * 1000
+            elapsed = time.perf_counter() - started
+            server.close()
+            await server.wait_closed()
+            report = service.report()
+        if monitor is not None:
+            report["drift_cells"] = len(monitor.cells)
+        report["throughput_per_sec"] = round(len(round_trips) / elapsed)
+        report["client_p50_ms"] = round(float(np.percentile(round_trips, 50)), 3)
+        report["client_p99_ms"] = round(float(np.percentile(round_trips, 99)), 3)
+        return report
+
+    for clients in args.clients:
+        print(f"clients={clients}", asyncio.run(main(clients)))
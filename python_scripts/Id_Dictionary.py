@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Dictionary encoding for merchant / api key / transaction ids.
+
+External ids are uuid-hex strings (m_..., k_..., t_...). Hashing those
+Python strings on every groupby, map, merge and transform dominates the
+fraud and segmentation steps, so ids are mapped once at load time to dense
+integer surrogates (int32, or int64 past 2**31 entries). Joins and groupbys
+then run on integers and strings come back only when results are written.
+
+Surrogates built by from_values() follow the sorted order of the ids, so
+sorting by the surrogate gives the same order as sorting by the original
+string. Ids added later by encode(add_missing=True) are appended in first-seen
+order after the existing ones and are not re-sorted: callers keep arrays
+indexed by surrogate, and re-sorting would renumber them.
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+
+ID_COLUMNS = ("merchant_id", "api_key_id", "transaction_id")
+
+
+class IdDictionary:
+    """Bidirectional external id <-> dense integer surrogate mapping."""
+
+    def __init__(self, ids):
+        self.ids = pd.Index(np.asarray(ids, dtype=object))
+        if not self.ids.is_unique:
+            raise ValueError("IdDictionary ids must be unique")
+
+    @classmethod
+    def from_values(cls, *columns):
+        """Build from one or more columns of ids (duplicates and NULLs dropped)."""
+        values = pd.concat([pd.Series(np.asarray(c, dtype=object)) for c in columns], ignore_index=True)
+        return cls(np.sort(values.dropna().unique()))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dtype(self):
+        return np.int32 if len(self.ids) < 2**31 else np.int64
+
+    def encode(self, values, add_missing=False):
+        """
+        External ids -> surrogates; unknown ids raise unless add_missing appends
+        them (first-seen order, after every existing surrogate, not re-sorted).
+        """
+        values = np.asarray(values, dtype=object)
+        codes = self.ids.get_indexer(values)
+        missing = codes < 0
+        if missing.any():
+            if not add_missing:
+                raise KeyError(f"{missing.sum()} ids not in dictionary, e.g. {values[missing][0]!r}")
+            new_ids = pd.unique(values[missing])
+            self.ids = self.ids.append(pd.Index(new_ids, dtype=object))
+            codes[missing] = self.ids.get_indexer(values[missing])
+        return codes.astype(self.dtype)
+
+    def decode(self, codes):
+        """Surrogates -> external id strings."""
+        return self.ids.values.take(np.asarray(codes))
+
+    def to_frame(self):
+        return pd.DataFrame({"surrogate": np.arange(len(self.ids), dtype=self.dtype), "id": self.ids.values})
+
+    def save(self, path):
+        self.to_frame().to_parquet(path, index=False)
+
+    @classmethod
+    def load(cls, path):
+        return cls(pd.read_parquet(path).sort_values("surrogate")["id"].values)
+
+
+def build_dictionaries(*frames, columns=ID_COLUMNS):
+    """One IdDictionary per id column found in any of the frames."""
+    return {
+        column: IdDictionary.from_values(*(f[column] for f in frames if column in f))
+        for column in columns
+        if any(column in f for f in frames)
+    }
+
+
+def encode_ids(df, dictionaries):
+    """Copy of df with every id column replaced by its integer surrogate."""
+    df = df.copy()
+    for column, dictionary in dictionaries.items():
+        if column in df:
+            df[column] = dictionary.encode(df[column])
+    return df
+
+
+def decode_ids(df, dictionaries):
+    """Copy of df with surrogate columns turned back into external ids (for output)."""
+    df = df.copy()
+    for column, dictionary in dictionaries.items():
+        if column in df:
+            df[column] = dictionary.decode(df[column])
+    return df
+
+
+# ---------- BENCHMARK ----------
+
+def _timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def benchmark(transactions_df, merchants_df):
+    """Memory and join/groupby time on string ids vs integer surrogates."""
+    # transaction_id is only carried through to output, so the benchmark
+    # keys on merchant_id, which every join/groupby/transform uses
+    string_txns = pd.DataFrame({
+        "merchant_id": np.asarray(transactions_df["merchant_id"], dtype=object),
+        "amount": transactions_df["amount"].to_numpy(),
+    })
+    string_merchants = pd.DataFrame({
+        "merchant_id": np.asarray(merchants_df["merchant_id"], dtype=object),
+        "business_type": merchants_df["business_type"].to_numpy(),
+    })
+
+    dictionaries = {"merchant_id": IdDictionary.from_values(string_merchants["merchant_id"])}
+    int_txns = encode_ids(string_txns, dictionaries)
+    int_merchants = encode_ids(string_merchants, dictionaries)
+
+    def mb(df):
+        return df.memory_usage(deep=True).sum() / 1e6
+
+    results = {}
+    for label, txns, merchants in [("string ids", string_txns, string_merchants),
+                                   ("int surrogates", int_txns, int_merchants)]:
+        results[label] = {
+            "memory_mb": round(mb(txns) + mb(merchants), 1),
+            "groupby_ms": round(1000 * _timed(lambda: txns.groupby("merchant_id")["amount"].agg(["mean", "std"])), 1),
+            "transform_ms": round(1000 * _timed(lambda: txns.groupby("merchant_id")["amount"].transform("max")), 1),
+            "merge_ms": round(1000 * _timed(lambda: txns.merge(merchants, on="merchant_id", how="left")), 1),
+        }
+    return pd.DataFrame(results).T
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from Data_Loader import load_dataset
+    from Transaction_Simulator import simulate
+
+    parser = argparse.ArgumentParser(description="Benchmark string ids vs integer surrogates")
+    parser.add_argument("--merchants", type=int, default=360_000, help="simulated merchants (~10M txns)")
+    args = parser.parse_args()
+
+    print("data/raw/transactions.csv")
+    print(benchmark(load_dataset("transactions"), load_dataset("merchants")))
+
+    merchants_df, _, transactions_df = simulate(args.merchants)
+    transactions_df = transactions_df[["merchant_id", "amount"]]
+    print(f"\nsimulated: {len(transactions_df):,} transactions")
+    print(benchmark(transactions_df, merchants_df))
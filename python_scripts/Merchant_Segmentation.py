@@ -13,7 +13,10 @@ import seaborn as sns
 # In[2]:
 
 
-df = pd.read_csv('Merchant Segmentation.csv')
+# Typed load (int32/float32) with a Feather cache
+from Data_Loader import load_dataset
+
+df = load_dataset('merchant_segmentation')
 
 
 # In[3]:
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Online per-merchant state for streaming fraud scoring.
+
+The batch path (Fraud_Features.build_fraud_features) needs each merchant's
+whole history. MerchantStateStore keeps a compact slot per merchant in
+preallocated numpy arrays and updates it in O(1) per transaction:
+
+- count / mean / M2          Welford running mean and sample variance
+- last_ts                    previous transaction time (LAG)
+- signup_ts                  for merchant_age_days / is_early_lifecycle_tx
+- ring_bucket/count/failed   fixed ring of time buckets covering the 7-day
+                             failure window
+
+update() returns the same feature vector the batch path produces for that
+transaction, computed over the history seen so far (including the current
+transaction). Replayed in (timestamp, transaction_id) order, a merchant's
+last transaction gets exactly the batch merchant_avg_amount /
+merchant_std_amount, and every transaction gets the batch LAG, age and
+time features. The batch failure window also counts rows that share the
+current timestamp but arrive later, so the online rate matches it on the
+last arrival at each (merchant, timestamp). Failures are counted in whole
+buckets, which is exact when timestamps fall on bucket boundaries (daily
+buckets for the current data) and otherwise also counts the part of the
+oldest bucket that falls before t - 7 days.
+"""
+
+import numpy as np
+import pandas as pd
+
+from Failure_Rate import WINDOW
+from Fraud_Features import EARLY_LIFECYCLE_DAYS, NS_PER_DAY, NS_PER_HOUR, NS_PER_SECOND
+
+
+BUCKET = pd.Timedelta(days=1)
+NO_TIME = np.iinfo(np.int64).min
+
+STATE_FEATURES = [
+    "transaction_amount",
+    "merchant_avg_amount",
+    "merchant_std_amount",
+    "hour_of_day",
+    "is_weekend",
+    "time_since_last_tx_sec",
+    "merchant_age_days",
+    "is_early_lifecycle_tx",
+    "payment_method",
+    "merchant_failure_rate_7d",
+]
+
+
+def _to_ns(ts):
+    return pd.Timestamp(ts).value
+
+
+class MerchantStateStore:
+    """Fixed-width per-merchant slots with O(1) updates."""
+
+    def __init__(self, capacity=1024, window=WINDOW, bucket=BUCKET):
+        self.bucket_ns = pd.Timedelta(bucket).value
+        self.window_ns = pd.Timedelta(window).value
+        self.slots = -(-self.window_ns // self.bucket_ns) + 1   # buckets touched by [t - window, t]
+        self.index = {}
+        self._allocate(capacity)
+
+    # ---------- STORAGE ----------
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.mean = np.zeros(capacity, dtype=np.float64)
+        self.m2 = np.zeros(capacity, dtype=np.float64)
+        self.last_ts = np.full(capacity, NO_TIME, dtype=np.int64)
+        self.signup_ts = np.full(capacity, NO_TIME, dtype=np.int64)
+        self.ring_bucket = np.full((capacity, self.slots), -1, dtype=np.int64)
+        self.ring_count = np.zeros((capacity, self.slots), dtype=np.int32)
+        self.ring_failed = np.zeros((capacity, self.slots), dtype=np.int32)
+
+    def _grow(self):
+        old = {name: getattr(self, name) for name in self._arrays()}
+        self._allocate(self.capacity * 2)
+        for name, values in old.items():
+            getattr(self, name)[:len(values)] = values
+
+    @staticmethod
+    def _arrays():
+        return ("count", "mean", "m2", "last_ts", "signup_ts", "ring_bucket", "ring_count", "ring_failed")
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, merchant_id):
+        return merchant_id in self.index
+
+    def register(self, merchant_id, signup_timestamp):
+        """Add a merchant (or refresh its signup time); returns its slot."""
+        slot = self.index.get(merchant_id)
+        if slot is None:
+            slot = len(self.index)
+            if slot >= self.capacity:
+                self._grow()
+            self.index[merchant_id] = slot
+        self.signup_ts[slot] = _to_ns(signup_timestamp)
+        return slot
+
+    def register_merchants(self, merchants_df):
+        for merchant_id, signup in zip(merchants_df["merchant_id"], merchants_df["signup_timestamp"]):
+            self.register(merchant_id, signup)
+        return self
+
+    # ---------- UPDATE ----------
+
+    def update(self, merchant_id, transaction_timestamp, amount, failed=False, payment_method=None):
+        """Fold one LIVE transaction into the merchant's slot and return its feature vector."""
+        slot = self.index.get(merchant_id)
+        if slot is None:
+            raise KeyError(f"Unknown merchant {merchant_id!r}; register it with its signup time first")
+
+        ts = _to_ns(transaction_timestamp)
+        amount = float(amount)
+
+        # Welford mean / M2
+        n = self.count[slot] + 1
+        delta = amount - self.mean[slot]
+        mean = self.mean[slot] + delta / n
+        self.m2[slot] += delta * (amount - mean)
+        self.mean[slot] = mean
+        self.count[slot] = n
+
+        previous = self.last_ts[slot]
+        self.last_ts[slot] = max(previous, ts)
+
+        # Failure ring: slot b % slots holds bucket b while it is in the window
+        bucket = ts // self.bucket_ns
+        position = bucket % self.slots
+        held = self.ring_bucket[slot, position]
+        if held < bucket:
+            self.ring_bucket[slot, position] = bucket
+            self.ring_count[slot, position] = 0
+            self.ring_failed[slot, position] = 0
+        if held <= bucket:
+            self.ring_count[slot, position] += 1
+            self.ring_failed[slot, position] += bool(failed)
+
+        return self.features(slot, ts, amount, previous, payment_method)
+
+    def failure_rate(self, slot, ts):
+        first = (ts - self.window_ns) // self.bucket_ns
+        live = self.ring_bucket[slot] >= first
+        total = self.ring_count[slot][live].sum()
+        return self.ring_failed[slot][live].sum() / total if total else np.nan
+
+    def features(self, slot, ts, amount, previous_ts, payment_method=None):
+        n = self.count[slot]
+        age_days = ts // NS_PER_DAY - self.signup_ts[slot] // NS_PER_DAY
+        return {
+            "transaction_amount": amount,
+            "merchant_avg_amount": self.mean[slot],
+            "merchant_std_amount": np.sqrt(self.m2[slot] / (n - 1)) if n > 1 else np.nan,
+            "hour_of_day": int((ts // NS_PER_HOUR) % 24),
+            "is_weekend": int((ts // NS_PER_DAY + 3) % 7 >= 5),
+            "time_since_last_tx_sec": (
+                float(ts // NS_PER_SECOND - previous_ts // NS_PER_SECOND)
+                if previous_ts != NO_TIME else np.nan
+            ),
+            "merchant_age_days": int(age_days),
+            "is_early_lifecycle_tx": int(age_days <= EARLY_LIFECYCLE_DAYS),
+            "payment_method": payment_method,
+            "merchant_failure_rate_7d": self.failure_rate(slot, ts),
+        }
+
+    def update_frame(self, transactions_df):
+        """Replay LIVE transactions in (timestamp, transaction_id) order; one feature row each."""
+        live = transactions_df[transactions_df["environment"] == "LIVE"]
+        live = live.sort_values(["transaction_timestamp", "transaction_id"], kind="stable")
+        rows = [
+            self.update(m, ts, amount, status == "FAILED", method)
+            for m, ts, amount, status, method in zip(
+                live["merchant_id"], live["transaction_timestamp"], live["amount"],
+                live["status"], live["payment_method"]
+            )
+        ]
+        features = pd.DataFrame(rows, columns=STATE_FEATURES)
+        features.insert(0, "transaction_id", live["transaction_id"].to_numpy())
+        features.insert(1, "merchant_id", live["merchant_id"].to_numpy())
+        return features
+
+    # ---------- PERSISTENCE ----------
+
+    def save(self, path):
+        n = len(self.index)
+        np.savez(
+            path,
+            merchant_ids=np.array(list(self.index), dtype=object),
+            bucket_ns=self.bucket_ns,
+            window_ns=self.window_ns,
+            **{name: getattr(self, name)[:n] for name in self._arrays()}
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=True)
+        ids = data["merchant_ids"]
+        store = cls(
+            capacity=max(1024, len(ids)),
+            window=pd.Timedelta(int(data["window_ns"])),
+            bucket=pd.Timedelta(int(data["bucket_ns"]))
+        )
+        store.index = {merchant_id: i for i, merchant_id in enumerate(ids)}
+        for name in cls._arrays():
+            getattr(store, name)[:len(ids)] = data[name]
+        return store
+
+
+if __name__ == "__main__":
+    import time
+
+    from Data_Loader import load_dataset
+    from Fraud_Features import build_fraud_features
+
+    transactions_df = load_dataset("transactions")
+    merchants_df = load_dataset("merchants")
+
+    store = MerchantStateStore().register_merchants(merchants_df)
+    started = time.perf_counter()
+    online = store.update_frame(transactions_df)
+    elapsed = time.perf_counter() - started
+    print(f"{len(online):,} updates in {elapsed:.3f}s ({len(online) / elapsed:,.0f} txns/sec)")
+
+    batch = build_fraud_features(transactions_df, merchants_df)
+    merged = online.merge(batch, on="transaction_id", suffixes=("", "_batch"))
+
+    def max_diff(column, rows=merged):
+        a, b = rows[column].astype(float), rows[f"{column}_batch"].astype(float)
+        return float((a - b).abs().where(~(a.isna() & b.isna()), 0.0).max())
+
+    # Each merchant's final state equals the batch (whole-history) values,
+    # and the window rate once every tie at that timestamp has arrived
+    last = merged.groupby("merchant_id").tail(1)
+    settled = merged.groupby(["merchant_id", "transaction_timestamp"]).tail(1)
+    for column in ["merchant_avg_amount", "merchant_std_amount"]:
+        print(f"  final   {column:<28} max diff {max_diff(column, last):.2e}")
+    print(f"  settled {'merchant_failure_rate_7d':<28} max diff {max_diff('merchant_failure_rate_7d', settled):.2e}")
+    for column in ["time_since_last_tx_sec", "merchant_age_days", "is_early_lifecycle_tx",
+                   "hour_of_day", "is_weekend"]:
+        print(f"  every   {column:<28} max diff {max_diff(column):.2e}")
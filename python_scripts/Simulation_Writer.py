@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Streaming writer for the simulator output.
+
+Shards from Transaction_Simulator.iter_shards are written as soon as they are
+generated, so nothing accumulates in memory. Transactions are stored as
+hive-style Parquet partitions:
+
+    <root>/transactions/month=2024-03/[bucket=07/]part-00012.parquet
+
+merchants and api_keys go to <root>/merchants and <root>/api_keys. A
+manifest.json lists every file with its partition values, row count and
+timestamp range, and read_transactions() uses it to open only the
+partitions a downstream stage asks for.
+
+A seed's data depends on the shard size (each shard draws from its own
+stream), so shard_size defaults to Transaction_Simulator.SHARD_SIZE and the
+files hold the same rows as simulate() with the same seed. A smaller shard
+size lowers peak memory but gives a different, equally valid dataset; the
+manifest records the size used.
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from Transaction_Simulator import (
+    NUM_MERCHANTS,
+    SHARD_SIZE,
+    SIMULATION_DAYS,
+    START_DATE,
+    iter_shards,
+)
+
+
+MANIFEST_FILE = "manifest.json"
+
+
+def merchant_bucket(merchant_ids, buckets):
+    """Stable hash bucket in [0, buckets) for each merchant id."""
+    hashed = pd.util.hash_array(np.asarray(merchant_ids, dtype=object))
+    return (hashed % np.uint64(buckets)).astype(np.int32)
+
+
+def _write_part(root, table, partition, shard_id, df):
+    parts = [f"{key}={value}" for key, value in partition.items()]
+    directory = os.path.join(root, table, *parts)
+    os.makedirs(directory, exist_ok=True)
+
+    path = os.path.join(directory, f"part-{shard_id:05d}.parquet")
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path)
+
+    entry = {
+        "path": os.path.relpath(path, root).replace(os.sep, "/"),
+        "table": table,
+        "partition": partition,
+        "shard": shard_id,
+        "rows": len(df),
+    }
+    if table == "transactions" and len(df):
+        entry["min_timestamp"] = str(df["transaction_timestamp"].min())
+        entry["max_timestamp"] = str(df["transaction_timestamp"].max())
+    return entry
+
+
+def write_shard(root, shard_id, merchants_df, api_keys_df, transactions_df, hash_buckets=None):
+    """Write one simulator shard; returns its manifest entries."""
+    entries = [
+        _write_part(root, "merchants", {}, shard_id, merchants_df),
+        _write_part(root, "api_keys", {}, shard_id, api_keys_df),
+    ]
+
+    keys = [transactions_df["transaction_timestamp"].dt.strftime("%Y-%m").rename("month")]
+    if hash_buckets:
+        keys.append(pd.Series(
+            merchant_bucket(transactions_df["merchant_id"], hash_buckets),
+            index=transactions_df.index,
+            name="bucket"
+        ))
+
+    for values, part in transactions_df.groupby(keys, sort=True):
+        values = values if isinstance(values, tuple) else (values,)
+        partition = {"month": values[0]}
+        if hash_buckets:
+            partition["bucket"] = f"{int(values[1]):02d}"
+        entries.append(_write_part(root, "transactions", partition, shard_id, part))
+
+    return entries
+
+
+def write_simulation(root, num_merchants=NUM_MERCHANTS, seed=42, start_date=START_DATE,
+                     simulation_days=SIMULATION_DAYS, shard_size=SHARD_SIZE,
+                     hash_buckets=None, workers=1):
+    """Generate and stream the simulation to partitioned Parquet; returns the manifest."""
+    started = time.perf_counter()
+    os.makedirs(root, exist_ok=True)
+
+    entries = []
+    shards = iter_shards(num_merchants, seed, start_date, simulation_days, shard_size, workers)
+    for shard_id, (merchants_df, api_keys_df, transactions_df) in enumerate(shards):
+        entries.extend(write_shard(
+            root, shard_id, merchants_df, api_keys_df, transactions_df, hash_buckets
+        ))
+
+    manifest = {
+        "created": pd.Timestamp.now().isoformat(),
+        "seed": seed,
+        "num_merchants": num_merchants,
+        "start_date": str(pd.Timestamp(start_date).date()),
+        "simulation_days": simulation_days,
+        "shard_size": shard_size,
+        "hash_buckets": hash_buckets,
+        "rows": {
+            table: sum(e["rows"] for e in entries if e["table"] == table)
+            for table in ("merchants", "api_keys", "transactions")
+        },
+        "elapsed_sec": round(time.perf_counter() - started, 3),
+        "files": entries,
+    }
+    with open(os.path.join(root, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def load_manifest(root):
+    with open(os.path.join(root, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def read_table(root, table, columns=None):
+    """Read merchants or api_keys back into one frame."""
+    paths = [
+        os.path.join(root, e["path"])
+        for e in load_manifest(root)["files"] if e["table"] == table
+    ]
+    return pd.concat(
+        [pq.read_table(p, columns=columns).to_pandas() for p in paths],
+        ignore_index=True
+    )
+
+
+def read_transactions(root, months=None, buckets=None, columns=None):
+    """Read only the transaction partitions for the requested months / hash buckets."""
+    months = None if months is None else {str(m) for m in months}
+    buckets = None if buckets is None else {f"{int(b):02d}" for b in buckets}
+
+    frames = []
+    for entry in load_manifest(root)["files"]:
+        if entry["table"] != "transactions":
+            continue
+        if months is not None and entry["partition"]["month"] not in months:
+            continue
+        if buckets is not None and entry["partition"].get("bucket") not in buckets:
+            continue
+        frames.append(pq.read_table(os.path.join(root, entry["path"]), columns=columns).to_pandas())
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stream the simulation to partitioned Parquet")
+    parser.add_argument("root")
+    parser.add_argument("--merchants", type=int, default=NUM_MERCHANTS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=SIMULATION_DAYS)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE,
+                        help="merchants per shard; changes the generated data for a seed")
+    parser.add_argument("--buckets", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    manifest = write_simulation(
+        args.root,
+        num_merchants=args.merchants,
+        seed=args.seed,
+        simulation_days=args.days,
+        shard_size=args.shard_size,
+        hash_buckets=args.buckets,
+        workers=args.workers
+    )
+    print(f"Wrote {manifest['rows']} in {manifest['elapsed_sec']}s "
+          f"({len(manifest['files'])} files)")
@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Columnar generator for the synthetic merchants / api_keys / transactions data.
+
+Same merchant journey as the original notebook loop in Data_Ingestion.py
+(signup -> API keys -> TEST transactions -> LIVE activation -> daily usage
+until churn), but every decision is drawn for a whole column at once from a
+seeded numpy Generator and the frames are built straight from arrays.
+
+Merchants are generated in fixed-size shards. Each shard draws from its own
+stream spawned from the master seed, so shards can run in a process pool and
+the result depends only on (seed, shard_size), never on the worker count.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+NUM_MERCHANTS = 800
+
+P_API_KEY = 0.85
+P_LIVE_KEY = 0.65
+P_TEST_TXN = 0.75
+P_LIVE_TXN = 0.55
+P_REGULAR_USAGE = 0.35
+P_DAILY_CHURN = 0.02
+FAILURE_RATE = 0.08  # 8% realistic failure rate
+
+START_DATE = pd.Timestamp("2024-01-01")
+SIMULATION_DAYS = 240   # ~8 months
+
+SHARD_SIZE = 50_000   # merchants per independently seeded shard
+
+INDUSTRIES = ["Ecommerce", "SaaS", "Education", "Logistics", "Fintech"]
+BUSINESS_TYPES = ["SME", "Enterprise"]
+SIGNUP_CHANNELS = ["Web", "Referral", "Sales"]
+PAYMENT_METHODS = ["card", "bank", "ussd"]
+FAILURE_REASONS = [
+    "Insufficient Funds",
+    "Bank Timeout",
+    "Network Error",
+    "Invalid Card"
+]
+ENVIRONMENTS = ["TEST", "LIVE"]
+STATUSES = ["SUCCESS", "FAILED"]
+
+MERCHANT_COLUMNS = [
+    "merchant_id", "signup_timestamp", "country", "industry",
+    "business_type", "signup_channel"
+]
+API_KEY_COLUMNS = [
+    "api_key_id", "merchant_id", "created_timestamp", "environment", "key_type"
+]
+TRANSACTION_COLUMNS = [
+    "transaction_id", "merchant_id", "transaction_timestamp", "environment",
+    "status", "amount", "currency", "payment_method", "failure_reason"
+]
+
+# Hex digits in the generated ids (same widths as uuid4().hex[:n] before)
+MERCHANT_ID_WIDTH = 10
+API_KEY_ID_WIDTH = 10
+TRANSACTION_ID_WIDTH = 12
+
+# Transaction ids scramble (shard << SHARD_ROW_BITS | row in shard), which has
+# to fit the 4 * TRANSACTION_ID_WIDTH = 48 bits of an id without wrapping
+SHARD_ROW_BITS = 32
+MAX_SHARDS = 1 << (4 * TRANSACTION_ID_WIDTH - SHARD_ROW_BITS)
+
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+_ONE_DAY = np.timedelta64(1, "D")
+
+
+# ---------- IDS ----------
+
+def scramble(values, bits, salt):
+    """Bijective mix of integers in [0, 2**bits) -> random-looking, never colliding ids."""
+    mask = np.uint64((1 << bits) - 1)
+    half = np.uint64(bits // 2)
+    x = (np.asarray(values, dtype=np.uint64) + np.uint64(salt)) & mask
+    x = (x * np.uint64(0x9E3779B97F4A7C15)) & mask
+    x ^= x >> half
+    x = (x * np.uint64(0xBF58476D1CE4E5B9)) & mask
+    x ^= x >> half
+    return x
+
+
+def format_ids(prefix, values, width):
+    """Render uint64 values as fixed-width lowercase hex ids, e.g. m_0a1b2c3d4e."""
+    values = np.asarray(values, dtype=np.uint64)
+    head = np.frombuffer(prefix.encode(), dtype=np.uint8)
+    shifts = np.arange(width - 1, -1, -1, dtype=np.uint64) * np.uint64(4)
+
+    chars = np.empty((len(values), len(head) + width), dtype=np.uint8)
+    chars[:, :len(head)] = head
+    chars[:, len(head):] = _HEX_DIGITS[(values[:, None] >> shifts) & np.uint64(0xF)]
+    return chars.view(f"S{chars.shape[1]}").ravel().astype(str)
+
+
+def _categorical(codes, categories):
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def _segment_positions(counts):
+    """0..count-1 inside each segment of a np.repeat(..., counts) expansion."""
+    ends = np.cumsum(counts)
+    return np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - counts, counts)
+
+
+# ---------- SIMULATION ----------
+
+def id_salts(seed):
+    """Id salts shared by every shard, derived from the master seed."""
+    merchant, api_key, transaction = np.random.SeedSequence(seed).generate_state(3, np.uint64)
+    return (
+        int(merchant) >> (64 - 4 * MERCHANT_ID_WIDTH),
+        int(api_key) >> (64 - 4 * API_KEY_ID_WIDTH),
+        int(transaction) >> (64 - 4 * TRANSACTION_ID_WIDTH),
+    )
+
+
+def shard_bounds(num_merchants, shard_size=SHARD_SIZE):
+    """
+    [(shard_id, first_merchant, num_merchants_in_shard), ...]
+
+    Zero merchants give one empty shard, so the frames keep their columns.
+    """
+    if num_merchants == 0:
+        return [(0, 0, 0)]
+    shard_size = max(1, shard_size or num_merchants)
+    num_shards = -(-num_merchants // shard_size)
+    if num_shards > MAX_SHARDS:
+        raise ValueError(
+            f"{num_shards} shards would reuse transaction ids (at most {MAX_SHARDS}); "
+            f"use a shard size of at least {-(-num_merchants // MAX_SHARDS)}"
+        )
+    return [
+        (shard_id, first, min(shard_size, num_merchants - first))
+        for shard_id, first in enumerate(range(0, num_merchants, shard_size))
+    ]
+
+
+def shard_rng(seed, shard_id):
+    """Independent Generator for one shard (same stream as SeedSequence(seed).spawn(n)[shard_id])."""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(shard_id,)))
+
+
+def simulate_shard(shard_id, first_merchant, num_merchants, seed=42,
+                   start_date=START_DATE, simulation_days=SIMULATION_DAYS):
+    """Generate the frames for merchants [first_merchant, first_merchant + num_merchants)."""
+    rng = shard_rng(seed, shard_id)
+    merchant_salt, api_key_salt, transaction_salt = id_salts(seed)
+    start = np.datetime64(pd.Timestamp(start_date), "D")
+    merchant_idx = np.arange(num_merchants)
+    global_idx = first_merchant + merchant_idx
+
+    # ---------- MERCHANTS ----------
+    signup = start + rng.integers(0, 60, num_merchants) * _ONE_DAY
+    merchant_ids = format_ids(
+        "m_",
+        scramble(global_idx, 4 * MERCHANT_ID_WIDTH, merchant_salt),
+        MERCHANT_ID_WIDTH
+    )
+
+    merchants_df = pd.DataFrame({
+        "merchant_id": merchant_ids,
+        "signup_timestamp": signup.astype("datetime64[ns]"),
+        "country": "NG",
+        "industry": _categorical(rng.integers(0, len(INDUSTRIES), num_merchants), INDUSTRIES),
+        "business_type": _categorical(rng.integers(0, len(BUSINESS_TYPES), num_merchants), BUSINESS_TYPES),
+        "signup_channel": _categorical(rng.integers(0, len(SIGNUP_CHANNELS), num_merchants), SIGNUP_CHANNELS),
+    })
+
+    # ---------- API KEYS ----------
+    # TEST key the day after signup, some merchants add a LIVE key on day 5
+    has_test_key = rng.random(num_merchants) < P_API_KEY
+    has_live_key = has_test_key & (rng.random(num_merchants) < P_LIVE_KEY)
+
+    keys_per_merchant = has_test_key.astype(np.int64) + has_live_key
+    key_merchant = np.repeat(merchant_idx, keys_per_merchant)
+    key_env = _segment_positions(keys_per_merchant)   # 0 = TEST, 1 = LIVE
+
+    api_keys_df = pd.DataFrame({
+        "api_key_id": format_ids(
+            "k_",
+            scramble(2 * global_idx[key_merchant] + key_env, 4 * API_KEY_ID_WIDTH, api_key_salt),
+            API_KEY_ID_WIDTH
+        ),
+        "merchant_id": merchant_ids[key_merchant],
+        "created_timestamp": (
+            signup[key_merchant] + np.where(key_env == 0, 1, 5) * _ONE_DAY
+        ).astype("datetime64[ns]"),
+        "environment": _categorical(key_env, ENVIRONMENTS),
+        "key_type": "secret",
+    })
+
+    # ---------- TEST TRANSACTIONS ----------
+    has_test = rng.random(num_merchants) < P_TEST_TXN
+    num_test = np.where(has_test, rng.integers(5, 15, num_merchants), 0)
+
+    test_merchant = np.repeat(merchant_idx, num_test)
+    test_ts = signup[test_merchant] + (2 + _segment_positions(num_test)) * _ONE_DAY
+
+    # ---------- LIVE ACTIVATION ----------
+    is_live = has_test & (rng.random(num_merchants) < P_LIVE_TXN)
+    activation = signup + rng.integers(7, 20, num_merchants) * _ONE_DAY
+    failed = rng.random(num_merchants) < FAILURE_RATE
+    reason = np.where(failed, rng.integers(0, len(FAILURE_REASONS), num_merchants), -1)
+    activation_amount = rng.integers(2000, 80000, num_merchants)
+    activation_method = rng.integers(0, len(PAYMENT_METHODS), num_merchants)
+    is_power_user = rng.random(num_merchants) < P_REGULAR_USAGE
+
+    live_merchant = merchant_idx[is_live]
+
+    # ---------- DAILY USAGE ----------
+    # Each day a merchant churns with P_DAILY_CHURN before transacting, so
+    # the number of active days is geometric, capped by the simulation window
+    active_days = np.minimum(
+        rng.geometric(P_DAILY_CHURN, num_merchants) - 1,
+        simulation_days - 1
+    )
+    active_days = np.where(is_live, active_days, 0)
+
+    day_merchant = np.repeat(merchant_idx, active_days)
+    day_offset = 1 + _segment_positions(active_days)
+    power_day = is_power_user[day_merchant]
+    daily_txns = rng.integers(np.where(power_day, 1, 0), np.where(power_day, 4, 2))
+
+    usage_merchant = np.repeat(day_merchant, daily_txns)
+    usage_ts = activation[usage_merchant] + np.repeat(day_offset, daily_txns) * _ONE_DAY
+    num_usage = len(usage_merchant)
+    usage_amount = rng.integers(2000, 80000, num_usage)
+    usage_method = rng.integers(0, len(PAYMENT_METHODS), num_usage)
+
+    # ---------- ASSEMBLE ----------
+    num_live = len(live_merchant)
+    txn_merchant = np.concatenate([test_merchant, live_merchant, usage_merchant])
+    order = np.argsort(txn_merchant, kind="stable")
+    txn_merchant = txn_merchant[order]
+
+    def _column(test, live, usage):
+        return np.concatenate([test, live, usage])[order]
+
+    num_test_rows = len(test_merchant)
+    environment = _column(np.zeros(num_test_rows, np.int8), np.ones(num_live, np.int8), np.ones(num_usage, np.int8))
+    status = _column(np.zeros(num_test_rows, np.int8), failed[live_merchant].astype(np.int8), np.zeros(num_usage, np.int8))
+    reason_codes = _column(np.full(num_test_rows, -1), reason[live_merchant], np.full(num_usage, -1))
+    method_codes = _column(np.zeros(num_test_rows, np.int64), activation_method[live_merchant], usage_method)
+
+    if len(txn_merchant) >> SHARD_ROW_BITS:
+        raise ValueError(f"shard {shard_id} has {len(txn_merchant)} transactions, more than "
+                         f"2**{SHARD_ROW_BITS} ids per shard; use a smaller shard size")
+
+    transactions_df = pd.DataFrame({
+        "transaction_id": format_ids(
+            "t_",
+            scramble(
+                (shard_id << SHARD_ROW_BITS) + np.arange(len(txn_merchant)),
+                4 * TRANSACTION_ID_WIDTH,
+                transaction_salt
+            ),
+            TRANSACTION_ID_WIDTH
+        ),
+        "merchant_id": merchant_ids[txn_merchant],
+        "transaction_timestamp": _column(test_ts, activation[live_merchant], usage_ts).astype("datetime64[ns]"),
+        "environment": _categorical(environment, ENVIRONMENTS),
+        "status": _categorical(status, STATUSES),
+        "amount": _column(np.zeros(num_test_rows), activation_amount[live_merchant], usage_amount).astype(np.float64),
+        "currency": "NGN",
+        "payment_method": _categorical(method_codes, PAYMENT_METHODS),
+        "failure_reason": _categorical(reason_codes, FAILURE_REASONS),
+    })
+
+    return merchants_df, api_keys_df, transactions_df
+
+
+def _run_shard(args):
+    return simulate_shard(*args)
+
+
+def iter_shards(num_merchants=NUM_MERCHANTS, seed=42, start_date=START_DATE,
+                simulation_days=SIMULATION_DAYS, shard_size=SHARD_SIZE, workers=1):
+    """
+    Yield (merchants_df, api_keys_df, transactions_df) one shard at a time, in shard order.
+
+    At most 2 * workers shards are in flight, so memory is bounded by the
+    shard size rather than the total number of merchants or days.
+    """
+    jobs = [
+        (shard_id, first, count, seed, start_date, simulation_days)
+        for shard_id, first, count in shard_bounds(num_merchants, shard_size)
+    ]
+
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield _run_shard(job)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append(pool.submit(_run_shard, job))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def simulate(num_merchants=NUM_MERCHANTS, seed=42, start_date=START_DATE,
+             simulation_days=SIMULATION_DAYS, shard_size=SHARD_SIZE, workers=1):
+    """
+    Generate (merchants_df, api_keys_df, transactions_df) from one seed.
+
+    Shards run in a process pool when workers > 1 and are concatenated in
+    shard order, so the output is identical for any worker count.
+    """
+    shards = list(iter_shards(
+        num_merchants, seed, start_date, simulation_days, shard_size, workers
+    ))
+
+    return tuple(
+        pd.concat([shard[i] for shard in shards], ignore_index=True)
+        for i in range(3)
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Generate synthetic Paystack-style data")
+    parser.add_argument("--merchants", type=int, default=NUM_MERCHANTS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    merchants_df, api_keys_df, transactions_df = simulate(
+        args.merchants,
+        seed=args.seed,
+        shard_size=args.shard_size,
+        workers=args.workers
+    )
+    elapsed = time.perf_counter() - started
+
+    print("Merchants:", len(merchants_df))
+    print("API Keys:", len(api_keys_df))
+    print("Transactions:", len(transactions_df))
+    print(f"Generated in {elapsed:.2f}s")
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+Per-merchant transaction velocity over several trailing windows.
+
+For every transaction, and each window w (5m, 1h, 24h, 7d by default):
+
+    tx_count_<w>     transactions by the same merchant in [t - w, t]
+    amount_sum_<w>   their total amount
+
+counted up to and including the transaction itself, in (timestamp,
+transaction_id) order. Rows that share the timestamp but come later are not
+counted, so the batch and incremental APIs agree row for row and a
+streaming scorer sees the same values as a nightly recompute.
+
+Batch: one sort by (merchant, timestamp, tie break). Each window's left edge
+is a binary search into the sorted keys, and sums are differences of one
+cumulative amount.
+
+Incremental: VelocityState keeps a per-merchant list of recent (ts, amount)
+with one moving head pointer and running sum per window (two pointers), so
+each update costs O(1) amortised.
+"""
+
+import numpy as np
+import pandas as pd
+
+from Fraud_Features import id_ranks
+
+
+VELOCITY_WINDOWS = {
+    "5m": pd.Timedelta(minutes=5),
+    "1h": pd.Timedelta(hours=1),
+    "24h": pd.Timedelta(hours=24),
+    "7d": pd.Timedelta(days=7),
+}
+
+COMPACT_AFTER = 256   # expired entries kept per merchant before the lists are trimmed
+
+
+def velocity_columns(windows=VELOCITY_WINDOWS):
+    return [f"{kind}_{label}" for label in windows for kind in ("tx_count", "amount_sum")]
+
+
+# ---------- BATCH ----------
+
+def sorted_velocity(codes_sorted, ts_sorted, amount_sorted, windows=VELOCITY_WINDOWS):
+    """
+    Velocity columns for arrays already sorted by (merchant code, ts, tie break).
+
+    codes_sorted: int64 codes; ts_sorted: int64 nanoseconds; amount_sorted: float64.
+    Returns a dict of arrays in the same (sorted) order.
+    """
+    n = len(ts_sorted)
+    windows_ns = [np.int64(pd.Timedelta(w).value) for w in windows.values()]
+    lowers = [ts_sorted - w for w in windows_ns]
+
+    # Dense-rank every time and window edge on one axis so merchant * stride + rank fits int64
+    axis = np.unique(np.concatenate([ts_sorted] + lowers))
+    stride = np.int64(len(axis) + 1)
+    base = codes_sorted * stride
+    key = base + np.searchsorted(axis, ts_sorted)
+
+    position = np.arange(n)
+    cum_amount = np.concatenate([[0.0], np.cumsum(amount_sorted)])
+
+    out = {}
+    for label, lower in zip(windows, lowers):
+        left = np.searchsorted(key, base + np.searchsorted(axis, lower), side="left")
+        out[f"tx_count_{label}"] = (position - left + 1).astype(np.int32)
+        out[f"amount_sum_{label}"] = cum_amount[position + 1] - cum_amount[left]
+    return out
+
+
+def velocity_frame(merchants, timestamps, amounts, tie_break=None, windows=VELOCITY_WINDOWS, index=None):
+    """
+    Velocity columns in input row order.
+
+    merchants: ids or codes; timestamps: datetime-like; amounts: numeric;
+    tie_break: optional values ordering same-timestamp rows (e.g. transaction_id).
+    """
+    codes = pd.factorize(np.asarray(merchants))[0].astype(np.int64)
+    ts = np.asarray(pd.to_datetime(timestamps), dtype="datetime64[ns]").view(np.int64)
+    amount = np.asarray(amounts, dtype=np.float64)
+    ties = np.arange(len(ts)) if tie_break is None else id_ranks(tie_break)
+
+    order = np.lexsort((ties, ts, codes))
+    sorted_columns = sorted_velocity(codes[order], ts[order], amount[order], windows)
+
+    out = {}
+    for name, values in sorted_columns.items():
+        out[name] = np.empty_like(values)
+        out[name][order] = values
+    return pd.DataFrame(out, index=index)[velocity_columns(windows)]
+
+
+def velocity_features(transactions_df, windows=VELOCITY_WINDOWS):
+    """transaction_id, merchant_id and velocity columns for the LIVE transactions."""
+    live = transactions_df[transactions_df["environment"] == "LIVE"]
+    velocity = velocity_frame(
+        live["merchant_id"], live["transaction_timestamp"], live["amount"],
+        tie_break=live["transaction_id"], windows=windows
+    )
+    velocity.insert(0, "transaction_id", live["transaction_id"].to_numpy())
+    velocity.insert(1, "merchant_id", live["merchant_id"].to_numpy())
+    return velocity
+
+
+# ---------- INCREMENTAL ----------
+
+class _MerchantWindows:
+    __slots__ = ("times", "amounts", "heads", "sums")
+
+    def __init__(self, n_windows):
+        self.times = []
+        self.amounts = []
+        self.heads = [0] * n_windows
+        self.sums = [0.0] * n_windows
+
+
+class VelocityState:
+    """
+    Running per-merchant window counts and sums.
+
+    Transactions are expected in timestamp order per merchant; a late one is
+    counted where it arrives.
+    """
+
+    def __init__(self, windows=VELOCITY_WINDOWS):
+        self.labels = list(windows)
+        self.windows_ns = [pd.Timedelta(w).value for w in windows.values()]
+        self.widest = int(np.argmax(self.windows_ns))
+        self.merchants = {}
+
+    def update(self, merchant_id, transaction_timestamp, amount):
+        """Add one transaction and return its velocity columns."""
+        ts = pd.Timestamp(transaction_timestamp).value
+        amount = float(amount)
+
+        state = self.merchants.get(merchant_id)
+        if state is None:
+            state = self.merchants[merchant_id] = _MerchantWindows(len(self.windows_ns))
+        times, amounts, heads, sums = state.times, state.amounts, state.heads, state.sums
+        times.append(ts)
+        amounts.append(amount)
+
+        out = {}
+        for j, (label, window) in enumerate(zip(self.labels, self.windows_ns)):
+            lower, head, total = ts - window, heads[j], sums[j] + amount
+            while times[head] < lower:
+                total -= amounts[head]
+                head += 1
+            heads[j], sums[j] = head, total
+            out[f"tx_count_{label}"] = len(times) - head
+            out[f"amount_sum_{label}"] = total
+
+        # Everything before the widest window's head has left every window
+        expired = heads[self.widest]
+        if expired > COMPACT_AFTER and 2 * expired > len(times):
+            del times[:expired], amounts[:expired]
+            state.heads = [head - expired for head in heads]
+        return out
+
+    def update_frame(self, transactions_df):
+        """Replay LIVE transactions in (timestamp, transaction_id) order; rows come back in that order."""
+        live = transactions_df[transactions_df["environment"] == "LIVE"]
+        live = live.sort_values(["transaction_timestamp", "transaction_id"], kind="stable")
+        rows = [
+            self.update(m, ts, amount)
+            for m, ts, amount in zip(live["merchant_id"], live["transaction_timestamp"], live["amount"])
+        ]
+        velocity = pd.DataFrame(rows, columns=velocity_columns(dict.fromkeys(self.labels)))
+        velocity.insert(0, "transaction_id", live["transaction_id"].to_numpy())
+        velocity.insert(1, "merchant_id", live["merchant_id"].to_numpy())
+        return velocity
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from Data_Loader import load_dataset
+    from Transaction_Simulator import simulate
+
+    parser = argparse.ArgumentParser(description="Velocity features: batch vs incremental, and batch scale")
+    parser.add_argument("--merchants", type=int, default=100_000)
+    args = parser.parse_args()
+
+    transactions_df = load_dataset("transactions")
+    batch = velocity_features(transactions_df)
+    started = time.perf_counter()
+    online = VelocityState().update_frame(transactions_df)
+    elapsed = time.perf_counter() - started
+    merged = online.merge(batch, on="transaction_id", suffixes=("", "_batch"))
+    print(f"data/raw: {len(online):,} incremental updates in {elapsed:.3f}s")
+    for column in velocity_columns():
+        diff = np.abs(merged[column].to_numpy(float) - merged[f"{column}_batch"].to_numpy(float)).max()
+        print(f"  {column:<16} max |incremental - batch| {diff:.2e}")
+
+    _, _, transactions_df = simulate(args.merchants)
+    started = time.perf_counter()
+    batch = velocity_features(transactions_df)
+    print(f"simulated: {len(batch):,} LIVE transactions, batch velocity in {time.perf_counter() - started:.3f}s")
@@ -7,6 +7,8 @@ CREATE TABLE merchants (
     signup_channel     VARCHAR(50)
 );
 
+-- Full reset only. Daily batches load incrementally against
+-- ingestion_watermarks (python_scripts/Incremental_Ingestion.py).
 TRUNCATE TABLE transactions;
 DELETE FROM merchants;
 TRUNCATE TABLE api_keys;
@@ -62,6 +64,20 @@ CREATE TABLE transactions (
         CHECK (status IN ('SUCCESS', 'FAILED'))
 );
 
+CREATE INDEX ix_transactions_watermark
+    ON transactions (transaction_timestamp, transaction_id);
+
+CREATE TABLE ingestion_watermarks (
+    source          VARCHAR(50) NOT NULL,
+    table_name      VARCHAR(50) NOT NULL,
+    last_timestamp  DATETIME2 NOT NULL,
+    last_id         VARCHAR(50) NOT NULL,
+    updated_at      DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+
+    CONSTRAINT pk_ingestion_watermarks
+        PRIMARY KEY (source, table_name)
+);
+
 
 CREATE VIEW merchant_onboarding AS
 WITH txn_agg AS (